@@ -11,6 +11,7 @@ from datetime import timedelta
 from datetime import datetime
 import logging
 import time
+import Queue
 
 from mydata import __version__ as VERSION
 from mydata import LATEST_COMMIT
@@ -311,6 +312,15 @@ class MyData(wx.App):
         self.scanningFolders = threading.Event()
         self.performingLookupsAndUploads = threading.Event()
 
+        # Progress updates from worker threads are coalesced, and shown
+        # in the data views and status bar by this timer, rather than
+        # being sent to the main thread one chunk at a time.
+        self.guiRefreshTimer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.OnGuiRefreshTimer,
+                  self.guiRefreshTimer)
+        self.guiRefreshTimer.Start(
+            1000 / max(1, self.settingsModel.GetGuiRefreshRate()))
+
         event = None
         if self.settingsModel.RequiredFieldIsBlank():
             self.OnSettings(event)
@@ -325,6 +335,12 @@ class MyData(wx.App):
 
         return True
 
+    def OnGuiRefreshTimer(self, event):
+        self.foldersModel.FlushDirtyCells()
+        self.verificationsModel.FlushDirtyCells()
+        self.uploadsModel.FlushDirtyCells()
+        self.foldersController.FlushConnectionStatus()
+
     def OnUndo(self, event):
         print "OnUndo"
         textCtrl = wx.Window.FindFocus()
@@ -725,14 +741,28 @@ class MyData(wx.App):
                 userOrGroup)
             self.frame.SetStatusMessage(message)
 
-        # SECTION 4: Start FoldersModel.ScanFolders(),
-        # followed by FoldersController.StartDataUploads().
+        # SECTION 4: Start FoldersModel.ScanFolders(), streaming each
+        # folder to FoldersController.StartDataUploads() as it is found.
 
         def scanDataDirs():
             logger.debug("Starting run() method for thread %s"
                          % threading.current_thread().name)
             wx.CallAfter(self.frame.SetStatusMessage,
                          "Scanning data folders...")
+            foldersQueue = None
+            if self.usersModel.GetNumUserOrGroupFolders() > 0:
+                # Folders are set up and verified while the rest of the
+                # data directory is being scanned.  The queue is bounded,
+                # so that the scan can't get too far ahead.
+                foldersQueue = Queue.Queue(maxsize=100)  # FIXME: magic number
+                self.foldersModel.SetFoldersQueue(foldersQueue)
+                startDataUploadsEvent = \
+                    mde.MyDataEvent(mde.EVT_START_DATA_UPLOADS,
+                                    foldersController=self.foldersController,
+                                    foldersQueue=foldersQueue)
+                logger.debug("Posting startDataUploadsEvent")
+                wx.PostEvent(wx.GetApp().GetMainFrame(),
+                             startDataUploadsEvent)
             try:
                 self.SetScanningFolders(True)
                 self.toolbar.EnableTool(self.stopTool.GetId(), True)
@@ -748,6 +778,11 @@ class MyData(wx.App):
                 wx.CallAfter(showMessageDialog)
                 self.frame.SetStatusMessage(str(ifs))
                 return
+            finally:
+                if foldersQueue is not None:
+                    # Tell StartDataUploads that the scan has finished.
+                    self.foldersModel.SetFoldersQueue(None)
+                    foldersQueue.put(None)
 
             def endBusyCursorIfRequired():
                 try:
@@ -761,14 +796,7 @@ class MyData(wx.App):
                 wx.CallAfter(endBusyCursorIfRequired)
                 return
 
-            if self.usersModel.GetNumUserOrGroupFolders() > 0:
-                startDataUploadsEvent = \
-                    mde.MyDataEvent(mde.EVT_START_DATA_UPLOADS,
-                                    foldersController=self.foldersController)
-                logger.debug("Posting startDataUploadsEvent")
-                wx.PostEvent(wx.GetApp().GetMainFrame(),
-                             startDataUploadsEvent)
-            else:
+            if foldersQueue is None:
                 message = "No user/group folders to upload from."
                 logger.debug(message)
                 self.frame.SetStatusMessage(message)
@@ -0,0 +1 @@
+LATEST_COMMIT = "e95fbef9895c9dd2c8a8a4fb681226e12aefe49e"
@@ -2,22 +2,29 @@ import os
 import sys
 import threading
 import urllib
-import urllib2
 import requests
 import json
 import Queue
 import io
+import errno
 import traceback
 from datetime import datetime
 import mimetypes
 import time
 import subprocess
 import hashlib
-import poster
 
-from mydata.utils.openssh import GetBytesUploadedToStaging
+from mydata.utils.multipart import MultipartFileStream
+from mydata.utils.openssh import StagingFileSizeCache
+from mydata.utils.openssh import StagingDirectoryCache
 from mydata.utils.openssh import UploadFile
 from mydata.utils.openssh import openSSH
+from mydata.utils.scheduler import PriorityTaskQueue
+from mydata.utils.scheduler import ParseWeights
+from mydata.utils.concurrency import AdaptiveConcurrencyLimit
+from mydata.utils.ratelimit import BandwidthLimiter
+from mydata.utils.retry import RetryQueue
+from mydata.utils.watcher import DataDirectoryWatcher
 
 from mydata.models.experiment import ExperimentModel
 from mydata.models.dataset import DatasetModel
@@ -28,10 +35,12 @@ from mydata.models.upload import UploadModel
 from mydata.models.upload import UploadStatus
 from mydata.models.folder import FolderModel
 from mydata.models.datafile import DataFileModel
+from mydata.models.journal import UploadJournalState
 from mydata.utils.exceptions import DoesNotExist
 from mydata.utils.exceptions import MultipleObjectsReturned
 from mydata.utils.exceptions import Unauthorized
 from mydata.utils.exceptions import InternalServerError
+from mydata.utils.exceptions import SshException
 from mydata.utils.exceptions import StagingHostRefusedSshConnection
 from mydata.utils.exceptions import StagingHostSshPermissionDenied
 from mydata.utils.exceptions import ScpException
@@ -50,6 +59,14 @@ class ConnectionStatus():
     DISCONNECTED = 1
 
 
+# Network errors (e.g. writing to an SSH process whose connection was
+# reset) which are worth retrying.
+TRANSIENT_ERRNOS = (errno.ECONNRESET, errno.ECONNREFUSED,
+                    errno.ECONNABORTED, errno.ETIMEDOUT, errno.EPIPE,
+                    errno.EHOSTUNREACH, errno.ENETUNREACH, errno.ENETDOWN,
+                    errno.ENETRESET, errno.EAGAIN, errno.EINTR)
+
+
 class UploadMethod():
     HTTP_POST = 0
     VIA_STAGING = 1
@@ -81,6 +98,30 @@ class FoldersController():
         self.verificationWorkerThreads = []
         self.numUploadWorkerThreads = 0
         self.uploadWorkerThreads = []
+        self.numLargeUploadWorkerThreads = 0
+        self.largeUploadWorkerThreads = []
+        self.uploadConcurrencyLimit = None
+        self.largeUploadConcurrencyLimit = None
+        self.bandwidthLimiter = None
+        self.uploadRetryQueue = None
+        self.largeFileSize = \
+            settingsModel.GetLargeFileThresholdMb() * 1024 * 1024
+        self.numHashWorkerThreads = 0
+        self.hashWorkerThreads = []
+        self.dataDirectoryWatcher = None
+        # Guards verifyDatafileRunnable and numVerificationsToBePerformed,
+        # which the data directory watcher's thread updates while the
+        # main thread is counting completed verifications.
+        self.verificationsLock = threading.Lock()
+        self.stagingFileSizeCache = None
+        self.stagingFileSizeCacheLock = threading.Lock()
+        self.stagingDirectoryCache = None
+        self.stagingDirectoryCacheLock = threading.Lock()
+
+        # The most recent (myTardisUrl, connectionStatus) reported by a
+        # worker thread, which hasn't been shown in the status bar yet.
+        self.pendingConnectionStatus = None
+        self.connectionStatusLock = threading.Lock()
 
         self.foldersView.Bind(wx.EVT_BUTTON, self.OnOpenFolder,
                               self.foldersView.GetOpenFolderButton())
@@ -95,9 +136,6 @@ class FoldersController():
             wx.lib.newevent.NewEvent()
         self.notifyWindow.Bind(eventBinder, self.UploadDatafile)
 
-        self.ConnectionStatusEvent, eventBinder = wx.lib.newevent.NewEvent()
-        self.notifyWindow.Bind(eventBinder,  self.UpdateStatusBar)
-
         self.ShowMessageDialogEvent, eventBinder = wx.lib.newevent.NewEvent()
         self.notifyWindow.Bind(eventBinder, self.ShowMessageDialog)
 
@@ -186,11 +224,28 @@ class FoldersController():
         self.lastErrorMessage = message
         self.threadingLock.release()
 
-    def UpdateStatusBar(self, event):
-        if event.connectionStatus == ConnectionStatus.CONNECTED:
-            self.notifyWindow.SetConnected(event.myTardisUrl, True)
-        else:
-            self.notifyWindow.SetConnected(event.myTardisUrl, False)
+    def SetConnectionStatus(self, myTardisUrl, connectionStatus):
+        """
+        Can be called from any thread.  Rather than updating the status
+        bar immediately (which worker threads would otherwise do for every
+        chunk they upload or checksum), we record the most recent status,
+        and the main thread's GUI refresh timer calls
+        FlushConnectionStatus.
+        """
+        with self.connectionStatusLock:
+            self.pendingConnectionStatus = (myTardisUrl, connectionStatus)
+
+    def FlushConnectionStatus(self):
+        """
+        Should only be called from the main thread.
+        """
+        with self.connectionStatusLock:
+            pendingConnectionStatus = self.pendingConnectionStatus
+            self.pendingConnectionStatus = None
+        if pendingConnectionStatus is not None:
+            myTardisUrl, connectionStatus = pendingConnectionStatus
+            self.notifyWindow.SetConnected(
+                myTardisUrl, connectionStatus == ConnectionStatus.CONNECTED)
 
     def ShowMessageDialog(self, event):
         if self.IsShowingErrorDialog():
@@ -263,15 +318,21 @@ class FoldersController():
         existingUnverifiedDatafile = False
         if hasattr(event, "existingUnverifiedDatafile"):
             existingUnverifiedDatafile = event.existingUnverifiedDatafile
+        resumedFromJournal = getattr(event, "resumedFromJournal", False)
         foldersController.uploadDatafileRunnable[folderModel][dfi] = \
             UploadDatafileRunnable(self, self.foldersModel, folderModel,
                                    dfi, self.uploadsModel, uploadModel,
                                    self.settingsModel,
-                                   existingUnverifiedDatafile)
+                                   existingUnverifiedDatafile,
+                                   resumedFromJournal)
         if self.IsShuttingDown():
             return
-        self.uploadsQueue.put(foldersController
-                              .uploadDatafileRunnable[folderModel][dfi])
+        uploadDatafileRunnable = \
+            foldersController.uploadDatafileRunnable[folderModel][dfi]
+        if uploadDatafileRunnable.NeedsChecksum():
+            self.hashesQueue.put(uploadDatafileRunnable)
+        else:
+            self.QueueUpload(uploadDatafileRunnable)
         after = datetime.now()
         duration = after - before
         if duration.total_seconds() >= 1:
@@ -280,7 +341,13 @@ class FoldersController():
                            " blocked the main GUI thread for %d seconds." +
                            duration.total_seconds())
 
-    def StartDataUploads(self):
+    def StartDataUploads(self, foldersQueue=None):
+        """
+        If a folders queue is provided, folders are set up and verified
+        as soon as FoldersModel.ScanFolders puts them on the queue, until
+        None is received.  Otherwise, the folders already in the
+        FoldersModel are used.
+        """
         fc = self
         fc.SetStarted()
         settingsModel = fc.settingsModel
@@ -288,7 +355,12 @@ class FoldersController():
         fc.verificationsModel.DeleteAllRows()
         fc.uploadsModel.DeleteAllRows()
         fc.verifyDatafileRunnable = {}
-        fc.verificationsQueue = Queue.Queue()
+        schedulingPolicy = settingsModel.GetUploadSchedulingPolicy()
+        schedulingWeights = \
+            ParseWeights(settingsModel.GetUploadSchedulingWeights())
+        logger.debug("Upload scheduling policy: " + schedulingPolicy)
+        fc.verificationsQueue = \
+            PriorityTaskQueue(schedulingPolicy, schedulingWeights)
         # For now, the max number of verification threads is set to be the
         # same as the max number of upload threads.
         fc.numVerificationWorkerThreads = settingsModel.GetMaxUploadThreads()
@@ -301,8 +373,59 @@ class FoldersController():
             fc.verificationWorkerThreads.append(t)
             t.start()
         fc.uploadDatafileRunnable = {}
-        fc.uploadsQueue = Queue.Queue()
-        fc.numUploadWorkerThreads = settingsModel.GetMaxUploadThreads()
+        # Remote file sizes and directories are only cached for one
+        # upload run.
+        fc.stagingFileSizeCache = None
+        fc.stagingDirectoryCache = None
+        fc.uploadsQueue = \
+            PriorityTaskQueue(schedulingPolicy, schedulingWeights)
+        # Data files larger than largeFileSize are uploaded by a separate
+        # lane of upload workers, so that a few huge files can't occupy
+        # every upload worker while many small files are waiting.  The
+        # large-file lane's workers are taken from max_upload_threads
+        # (leaving at least one worker for small files), so the total
+        # number of concurrent uploads doesn't exceed max_upload_threads.
+        # The large-file lane's workers take small files from the other
+        # lane's queue while they have no large files to upload, so
+        # sites with only small files still use max_upload_threads.
+        maxUploadThreads = settingsModel.GetMaxUploadThreads()
+        fc.numLargeUploadWorkerThreads = \
+            min(settingsModel.GetMaxLargeUploadThreads(),
+                max(0, maxUploadThreads - 1))
+        fc.numUploadWorkerThreads = \
+            maxUploadThreads - fc.numLargeUploadWorkerThreads
+        # With adaptive upload threads, numUploadWorkerThreads workers are
+        # started, but only uploadConcurrencyLimit.GetLimit() of them are
+        # allowed to upload at once.  The large-file lane has its own
+        # limit, so that its uploads are measured separately.
+        fc.uploadConcurrencyLimit = None
+        fc.largeUploadConcurrencyLimit = None
+        if settingsModel.AdaptiveUploadThreads():
+            fc.uploadConcurrencyLimit = AdaptiveConcurrencyLimit(
+                min(settingsModel.GetMinUploadThreads(),
+                    fc.numUploadWorkerThreads),
+                fc.numUploadWorkerThreads,
+                onLimitChanged=fc.SetMaxSshConnections)
+            if fc.numLargeUploadWorkerThreads > 0:
+                fc.largeUploadConcurrencyLimit = AdaptiveConcurrencyLimit(
+                    1, fc.numLargeUploadWorkerThreads,
+                    onLimitChanged=fc.SetMaxSshConnections)
+        fc.largeUploadsQueue = \
+            PriorityTaskQueue(schedulingPolicy, schedulingWeights)
+        fc.largeFileSize = \
+            settingsModel.GetLargeFileThresholdMb() * 1024 * 1024
+        fc.SetMaxSshConnections()
+        # Shared by all upload methods and all upload workers.
+        fc.bandwidthLimiter = BandwidthLimiter(settingsModel)
+        # Uploads which failed with a transient error wait here (rather
+        # than in the uploads queues) until they are due to be retried.
+        if settingsModel.GetUploadRetryAttempts() > 0:
+            fc.uploadRetryQueue = \
+                RetryQueue(fc.RequeueUpload,
+                           settingsModel.GetUploadRetryDelay(),
+                           maxDelay=900)  # FIXME: magic number (seconds)
+        else:
+            fc.uploadRetryQueue = None
         fc.uploadMethod = UploadMethod.HTTP_POST
 
         try:
@@ -333,8 +456,7 @@ class FoldersController():
                 "approval from your MyTardis administrator.\n\n" \
                 "A request has been sent, and you will be contacted " \
                 "once the request has been approved. Until then, " \
-                "MyData will upload files using HTTP POST, and will " \
-                "only upload one file at a time.\n\n" \
+                "MyData will upload files using HTTP POST.\n\n" \
                 "HTTP POST is generally only suitable for small " \
                 "files (up to 100 MB each)."
         if message:
@@ -346,117 +468,177 @@ class FoldersController():
                     message=message,
                     icon=wx.ICON_WARNING))
             fc.uploadMethod = UploadMethod.HTTP_POST
-        if fc.uploadMethod == UploadMethod.HTTP_POST and \
-                fc.numUploadWorkerThreads > 1:
-            logger.warning(
-                "Using HTTP POST, so setting "
-                "numUploadWorkerThreads to 1, "
-                "because urllib2 is not thread-safe.")
-            fc.numUploadWorkerThreads = 1
 
         fc.uploadWorkerThreads = []
         for i in range(fc.numUploadWorkerThreads):
             t = threading.Thread(name="UploadWorkerThread-%d" % (i + 1),
-                                 target=fc.uploadWorker, args=())
+                                 target=fc.uploadWorker,
+                                 args=(fc.uploadsQueue,
+                                       fc.uploadConcurrencyLimit))
             fc.uploadWorkerThreads.append(t)
             t.start()
+        fc.largeUploadWorkerThreads = []
+        for i in range(fc.numLargeUploadWorkerThreads):
+            t = threading.Thread(name="LargeUploadWorkerThread-%d" % (i + 1),
+                                 target=fc.uploadWorker,
+                                 args=(fc.largeUploadsQueue,
+                                       fc.largeUploadConcurrencyLimit,
+                                       fc.uploadsQueue))
+            fc.largeUploadWorkerThreads.append(t)
+            t.start()
+        # MD5 checksums are calculated by a separate pool of worker
+        # threads, ahead of the upload workers, so that hashing one file
+        # can overlap with uploading another.
+        fc.hashesQueue = \
+            PriorityTaskQueue(schedulingPolicy, schedulingWeights)
+        fc.numHashWorkerThreads = settingsModel.GetMaxHashThreads()
+        fc.hashWorkerThreads = []
+        for i in range(fc.numHashWorkerThreads):
+            t = threading.Thread(name="HashWorkerThread-%d" % (i + 1),
+                                 target=fc.hashWorker, args=())
+            fc.hashWorkerThreads.append(t)
+            t.start()
         try:
             fc.numVerificationsToBePerformed = 0
             fc.finishedCountingNumVerificationsToBePerformed = \
                 threading.Event()
-            for row in range(0, self.foldersModel.GetRowCount()):
-                if self.IsShuttingDown():
-                    return
-                folderModel = self.foldersModel.GetFolderRecord(row)
-                fc.numVerificationsToBePerformed += folderModel.GetNumFiles()
-                logger.debug(
-                    "UploadDataThread: Starting verifications "
-                    "and uploads for folder: " +
-                    folderModel.GetFolder())
+            for folderModel in self.GetFoldersToUpload(foldersQueue):
                 if self.IsShuttingDown():
                     return
-                try:
-                    # Save MyTardis URL, so if it's changing in the
-                    # Settings Dialog while this thread is
-                    # attempting to connect, we ensure that any
-                    # exception thrown by this thread refers to the
-                    # old version of the URL.
-                    myTardisUrl = \
-                        settingsModel.GetMyTardisUrl()
-                    try:
-                        experimentModel = ExperimentModel\
-                            .GetOrCreateExperimentForFolder(folderModel)
-                    except Exception, e:
-                        logger.error(traceback.format_exc())
-                        wx.PostEvent(
-                            self.notifyWindow,
-                            self.ShowMessageDialogEvent(
-                                title="MyData",
-                                message=str(e),
-                                icon=wx.ICON_ERROR))
-                        return
-                    folderModel.SetExperiment(experimentModel)
-                    CONNECTED = ConnectionStatus.CONNECTED
-                    wx.PostEvent(
-                        self.notifyWindow,
-                        self.ConnectionStatusEvent(
-                            myTardisUrl=myTardisUrl,
-                            connectionStatus=CONNECTED))
-                    try:
-                        datasetModel = DatasetModel\
-                            .CreateDatasetIfNecessary(folderModel)
-                    except Exception, e:
-                        logger.error(traceback.format_exc())
-                        wx.PostEvent(
-                            self.notifyWindow,
-                            self.ShowMessageDialogEvent(
-                                title="MyData",
-                                message=str(e),
-                                icon=wx.ICON_ERROR))
-                        return
-                    folderModel.SetDatasetModel(datasetModel)
-                    self.VerifyDatafiles(folderModel)
-                except requests.exceptions.ConnectionError, e:
-                    if not self.IsShuttingDown():
-                        DISCONNECTED = \
-                            ConnectionStatus.DISCONNECTED
-                        wx.PostEvent(
-                            self.notifyWindow,
-                            self.ConnectionStatusEvent(
-                                myTardisUrl=myTardisUrl,
-                                connectionStatus=DISCONNECTED))
-                    return
-                except ValueError, e:
-                    logger.debug("Failed to retrieve experiment "
-                                 "for folder " +
-                                 str(folderModel.GetFolder()))
-                    logger.debug(traceback.format_exc())
-                    return
-                if experimentModel is None:
-                    logger.debug("Failed to acquire a MyTardis "
-                                 "experiment to store data in for"
-                                 "folder " +
-                                 folderModel.GetFolder())
-                    return
-                if self.IsShuttingDown():
+                if not self.StartUploadsForFolder(folderModel):
                     return
             fc.finishedCountingNumVerificationsToBePerformed.set()
-            # End: for row in range(0, self.foldersModel.GetRowCount())
+            # End: for folderModel in self.GetFoldersToUpload(foldersQueue)
+            if settingsModel.WatchDataDirectory():
+                self.StartWatchingDataDirectory()
+            # If every file was skipped (e.g. because the manifest says
+            # they have already been verified), there won't be any
+            # verification events to trigger the completion check.
+            wx.CallAfter(self.CountCompletedUploadsAndVerifications, None)
         except:
             logger.error(traceback.format_exc())
 
-    def uploadWorker(self):
+    def GetFoldersToUpload(self, foldersQueue):
+        if foldersQueue is None:
+            for row in range(0, self.foldersModel.GetRowCount()):
+                yield self.foldersModel.GetFolderRecord(row)
+            return
+        while True:
+            folderModel = foldersQueue.get()
+            if folderModel is None:
+                return
+            yield folderModel
+
+    def StopReceivingScannedFolders(self, foldersQueue):
+        """
+        Called when StartDataUploads is finished with the folders queue
+        (possibly before the scan has finished, e.g. if uploads were
+        canceled), so that the scanning thread won't block on a full
+        queue.
+        """
+        self.foldersModel.SetFoldersQueue(None)
+        try:
+            while True:
+                foldersQueue.get_nowait()
+        except Queue.Empty:
+            pass
+
+    def StartUploadsForFolder(self, folderModel):
+        """
+        Gets or creates the experiment and dataset for a folder, and then
+        queues verifications for its data files.  Returns False if data
+        uploads should be aborted.
+        """
+        settingsModel = self.settingsModel
+        logger.debug(
+            "UploadDataThread: Starting verifications "
+            "and uploads for folder: " +
+            folderModel.GetFolder())
+        if self.IsShuttingDown():
+            return False
+        try:
+            # Save MyTardis URL, so if it's changing in the
+            # Settings Dialog while this thread is
+            # attempting to connect, we ensure that any
+            # exception thrown by this thread refers to the
+            # old version of the URL.
+            myTardisUrl = \
+                settingsModel.GetMyTardisUrl()
+            try:
+                experimentModel = ExperimentModel\
+                    .GetOrCreateExperimentForFolder(folderModel)
+            except Exception, e:
+                logger.error(traceback.format_exc())
+                wx.PostEvent(
+                    self.notifyWindow,
+                    self.ShowMessageDialogEvent(
+                        title="MyData",
+                        message=str(e),
+                        icon=wx.ICON_ERROR))
+                return False
+            folderModel.SetExperiment(experimentModel)
+            CONNECTED = ConnectionStatus.CONNECTED
+            self.SetConnectionStatus(myTardisUrl, CONNECTED)
+            try:
+                datasetModel = DatasetModel\
+                    .CreateDatasetIfNecessary(folderModel)
+            except Exception, e:
+                logger.error(traceback.format_exc())
+                wx.PostEvent(
+                    self.notifyWindow,
+                    self.ShowMessageDialogEvent(
+                        title="MyData",
+                        message=str(e),
+                        icon=wx.ICON_ERROR))
+                return False
+            folderModel.SetDatasetModel(datasetModel)
+            self.VerifyDatafiles(folderModel)
+        except requests.exceptions.ConnectionError, e:
+            if not self.IsShuttingDown():
+                DISCONNECTED = \
+                    ConnectionStatus.DISCONNECTED
+                self.SetConnectionStatus(myTardisUrl, DISCONNECTED)
+            return False
+        except ValueError, e:
+            logger.debug("Failed to retrieve experiment "
+                         "for folder " +
+                         str(folderModel.GetFolder()))
+            logger.debug(traceback.format_exc())
+            return False
+        if experimentModel is None:
+            logger.debug("Failed to acquire a MyTardis "
+                         "experiment to store data in for"
+                         "folder " +
+                         folderModel.GetFolder())
+            return False
+        if self.IsShuttingDown():
+            return False
+        return True
+
+    def uploadWorker(self, uploadsQueue, concurrencyLimit=None,
+                     fallbackQueue=None):
         """
         One worker per thread
         By default, up to 5 threads can run simultaneously
-        for uploading local data files to
-        the MyTardis server.
+        for uploading local data files to the MyTardis
+        server, 2 of which upload large data files first
+        (see QueueUpload).
+        If a concurrencyLimit is provided, the worker waits
+        until it is allowed to upload before taking each task
+        from the queue, so that tasks are left for workers
+        which are allowed to run them.
+        If a fallbackQueue is provided, the worker takes tasks
+        from it while uploadsQueue is empty.
         """
         while True:
             if self.IsShuttingDown():
                 return
-            task = self.uploadsQueue.get()
+            if concurrencyLimit and not concurrencyLimit.Acquire():
+                return
+            taskQueue, task = self.GetUploadTask(uploadsQueue, fallbackQueue)
             if task is None:
+                if concurrencyLimit:
+                    concurrencyLimit.Release()
                 if self.Failed():
                     success, failed, canceled = False, True, False
                 elif self.Canceled():
@@ -464,6 +646,11 @@ class FoldersController():
                 else:
                     success, failed, canceled = True, False, False
                 return
+            if concurrencyLimit:
+                concurrencyLimit.TaskStarted()
+            # The upload reports its throughput and errors to its lane's
+            # limit.
+            task.concurrencyLimit = concurrencyLimit
             try:
                 task.run()
             except ValueError, e:
@@ -472,16 +659,115 @@ class FoldersController():
                         "Ignoring closed file exception - it is normal "
                         "to encounter these exceptions while canceling "
                         "uploads.")
-                    self.uploadsQueue.task_done()
+                    taskQueue.task_done()
                     return
                 else:
                     logger.error(traceback.format_exc())
-                    self.uploadsQueue.task_done()
+                    taskQueue.task_done()
                     return
             except:
                 logger.error(traceback.format_exc())
-                self.uploadsQueue.task_done()
+                taskQueue.task_done()
                 return
+            finally:
+                if concurrencyLimit:
+                    concurrencyLimit.TaskFinished()
+                    concurrencyLimit.Release()
+
+    def GetUploadTask(self, uploadsQueue, fallbackQueue=None):
+        """
+        Waits for the next task from uploadsQueue, or (if uploadsQueue is
+        empty) from fallbackQueue, and returns (queue, task).  Sentinels
+        (None) are only taken from uploadsQueue.
+        """
+        if fallbackQueue is None:
+            return uploadsQueue, uploadsQueue.get()
+        while True:
+            try:
+                return uploadsQueue, uploadsQueue.get(False)
+            except Queue.Empty:
+                pass
+            task = fallbackQueue.GetTaskNoWait()
+            if task is not None:
+                return fallbackQueue, task
+            try:
+                # FIXME: magic number (seconds)
+                return uploadsQueue, uploadsQueue.get(True, 1)
+            except Queue.Empty:
+                pass
+
+    def hashWorker(self):
+        """
+        One worker per thread.
+        By default, up to 2 threads can run simultaneously
+        for calculating MD5 checksums of local data files,
+        before handing them over to the upload workers.
+        """
+        while True:
+            if self.IsShuttingDown():
+                return
+            task = self.hashesQueue.get()
+            if task is None:
+                return
+            try:
+                if task.Prepare():
+                    if not self.IsShuttingDown():
+                        self.QueueUpload(task)
+                elif task.uploadModel.GetStatus() == UploadStatus.FAILED:
+                    task.PostUploadCompleteEvent()
+            except:
+                logger.error(traceback.format_exc())
+
+    def QueueUpload(self, uploadDatafileRunnable):
+        """
+        Puts the upload task into the large-file lane's queue if its data
+        file is larger than the large file threshold (unless the
+        large-file lane has no workers), or into the small-file lane's
+        queue otherwise.
+        """
+        folderModel = uploadDatafileRunnable.folderModel
+        dfi = uploadDatafileRunnable.dataFileIndex
+        if folderModel.GetDataFileSize(dfi) > self.largeFileSize and \
+                self.numLargeUploadWorkerThreads > 0:
+            self.largeUploadsQueue.put(uploadDatafileRunnable)
+        else:
+            self.uploadsQueue.put(uploadDatafileRunnable)
+
+    def RequeueUpload(self, uploadDatafileRunnable):
+        """
+        Called by the upload retry queue's thread when an upload which
+        failed with a transient error is due to be retried.
+        """
+        if self.IsShuttingDown() or \
+                uploadDatafileRunnable.uploadModel.Canceled():
+            return
+        # A task which failed before it was prepared still needs to be
+        # hashed by a hash worker, rather than holding an upload worker.
+        if not uploadDatafileRunnable.prepared and \
+                uploadDatafileRunnable.NeedsChecksum():
+            self.hashesQueue.put(uploadDatafileRunnable)
+        else:
+            self.QueueUpload(uploadDatafileRunnable)
+
+    def GetLargeFileSize(self):
+        return self.largeFileSize
+
+    def SetMaxSshConnections(self, newLimit=None):
+        """
+        Keeps the maximum number of SSH ControlMaster connections in line
+        with the number of upload workers (in both lanes) which are
+        allowed to upload at once.  Also called (with the lane's new
+        limit, which isn't needed) when an adaptive limit changes.
+        """
+        numActiveUploadWorkers = self.numUploadWorkerThreads
+        if self.uploadConcurrencyLimit:
+            numActiveUploadWorkers = self.uploadConcurrencyLimit.GetLimit()
+        numActiveLargeUploadWorkers = self.numLargeUploadWorkerThreads
+        if self.largeUploadConcurrencyLimit:
+            numActiveLargeUploadWorkers = \
+                self.largeUploadConcurrencyLimit.GetLimit()
+        openSSH.SetMaxControlMasterConnections(
+            max(1, numActiveUploadWorkers + numActiveLargeUploadWorkers))
 
     def verificationWorker(self, verificationWorkerId):
         """
@@ -522,14 +808,36 @@ class FoldersController():
         """
         numVerificationsCompleted = self.verificationsModel.GetCompletedCount()
 
-        uploadsToBePerformed = self.uploadsModel.GetRowCount()
+        uploadsToBePerformed = self.uploadsModel.GetTotalCount()
         uploadsCompleted = self.uploadsModel.GetCompletedCount()
         uploadsFailed = self.uploadsModel.GetFailedCount()
         uploadsProcessed = uploadsCompleted + uploadsFailed
+        with self.verificationsLock:
+            numVerificationsToBePerformed = \
+                self.numVerificationsToBePerformed
 
-        if numVerificationsCompleted == self.numVerificationsToBePerformed \
+        if numVerificationsCompleted == numVerificationsToBePerformed \
                 and self.finishedCountingNumVerificationsToBePerformed.isSet() \
                 and uploadsProcessed == uploadsToBePerformed:
+            if self.IsWatchingDataDirectory():
+                # Keep the worker threads running, ready for new data.
+                # ShutDownUploadThreads won't be called until watching
+                # stops, so commit the manifest and upload journal now.
+                manifestModel = self.settingsModel.GetManifestModel()
+                if manifestModel:
+                    manifestModel.Commit()
+                uploadJournalModel = \
+                    self.settingsModel.GetUploadJournalModel()
+                if uploadJournalModel:
+                    uploadJournalModel.Commit()
+                checksumCacheModel = \
+                    self.settingsModel.GetChecksumCacheModel()
+                if checksumCacheModel:
+                    checksumCacheModel.Commit()
+                message = "Watching %s for new data files..." \
+                    % self.settingsModel.GetDataDirectory()
+                wx.GetApp().GetMainFrame().SetStatusMessage(message)
+                return
             logger.debug("All datafile verifications and uploads "
                          "have completed.")
             logger.debug("Shutting down upload and verification threads.")
@@ -550,15 +858,33 @@ class FoldersController():
             self.SetCompleted()
         else:
             self.SetCanceled()
+        self.StopWatchingDataDirectory()
         if hasattr(self, 'uploadDataThread'):
             logger.debug("Joining FoldersController's UploadDataThread...")
             self.uploadDataThread.join()
             logger.debug("Joined FoldersController's UploadDataThread.")
+        logger.debug("Shutting down FoldersController hash worker threads.")
+        for i in range(self.numHashWorkerThreads):
+            self.hashesQueue.put(None)
+        for t in self.hashWorkerThreads:
+            t.join()
+        if self.uploadRetryQueue:
+            logger.debug("Discarding %d upload(s) waiting to be retried."
+                         % len(self.uploadRetryQueue))
+            self.uploadRetryQueue.Stop()
         logger.debug("Shutting down FoldersController upload worker threads.")
+        if self.uploadConcurrencyLimit:
+            self.uploadConcurrencyLimit.Stop()
+        if self.largeUploadConcurrencyLimit:
+            self.largeUploadConcurrencyLimit.Stop()
         for i in range(self.numUploadWorkerThreads):
             self.uploadsQueue.put(None)
         for t in self.uploadWorkerThreads:
             t.join()
+        for i in range(self.numLargeUploadWorkerThreads):
+            self.largeUploadsQueue.put(None)
+        for t in self.largeUploadWorkerThreads:
+            t.join()
         logger.debug("Shutting down FoldersController verification "
                      "worker threads.")
         for i in range(self.numVerificationWorkerThreads):
@@ -569,6 +895,22 @@ class FoldersController():
         self.verifyDatafileRunnable = {}
         self.uploadDatafileRunnable = {}
 
+        if self.stagingDirectoryCache:
+            try:
+                self.stagingDirectoryCache.RemoveChunkFiles()
+            except:
+                logger.error(traceback.format_exc())
+
+        manifestModel = self.settingsModel.GetManifestModel()
+        if manifestModel:
+            manifestModel.Commit()
+        uploadJournalModel = self.settingsModel.GetUploadJournalModel()
+        if uploadJournalModel:
+            uploadJournalModel.Commit()
+        checksumCacheModel = self.settingsModel.GetChecksumCacheModel()
+        if checksumCacheModel:
+            checksumCacheModel.Commit()
+
         if sys.platform == 'darwin':
             sshControlMasterPool = \
                 openSSH.GetSshControlMasterPool(createIfMissing=False)
@@ -599,28 +941,227 @@ class FoldersController():
         logger.debug("")
 
     def VerifyDatafiles(self, folderModel):
-        if folderModel not in self.verifyDatafileRunnable:
-            self.verifyDatafileRunnable[folderModel] = []
+        with self.verificationsLock:
+            if folderModel not in self.verifyDatafileRunnable:
+                self.verifyDatafileRunnable[folderModel] = []
+        manifestModel = self.settingsModel.GetManifestModel()
+        uploadJournalModel = self.settingsModel.GetUploadJournalModel()
+        numUnchangedFiles = 0
+        numResumedFiles = 0
         for dfi in range(0, folderModel.numFiles):
             if self.IsShuttingDown():
                 return
-            thisFileIsAlreadyBeingVerified = False
-            for existingVerifyDatafileRunnable in \
-                    self.verifyDatafileRunnable[folderModel]:
-                if dfi == existingVerifyDatafileRunnable.GetDatafileIndex():
-                    thisFileIsAlreadyBeingVerified = True
-            thisFileIsAlreadyBeingUploaded = False
+            if manifestModel and \
+                    manifestModel.IsUnchangedAndVerified(folderModel, dfi):
+                # Found verified in a previous run and unchanged since,
+                # so there's no need to look it up on MyTardis again.
+                folderModel.SetDataFileUploaded(dfi, True)
+                numUnchangedFiles += 1
+                continue
+            if uploadJournalModel and \
+                    self.ResumeUploadFromJournal(
+                        folderModel, dfi,
+                        uploadJournalModel.GetEntry(folderModel, dfi)):
+                numResumedFiles += 1
+                continue
+            with self.verificationsLock:
+                thisFileIsAlreadyBeingVerified = False
+                for existingVerifyDatafileRunnable in \
+                        self.verifyDatafileRunnable[folderModel]:
+                    if dfi == \
+                            existingVerifyDatafileRunnable.GetDatafileIndex():
+                        thisFileIsAlreadyBeingVerified = True
+                thisFileIsAlreadyBeingUploaded = False
+                if folderModel in self.uploadDatafileRunnable:
+                    if dfi in self.uploadDatafileRunnable[folderModel]:
+                        thisFileIsAlreadyBeingUploaded = True
+                if not thisFileIsAlreadyBeingVerified \
+                        and not thisFileIsAlreadyBeingUploaded:
+                    verifyDatafileRunnable = \
+                        VerifyDatafileRunnable(self, self.foldersModel,
+                                               folderModel, dfi,
+                                               self.settingsModel)
+                    self.verifyDatafileRunnable[folderModel]\
+                        .append(verifyDatafileRunnable)
+                    self.numVerificationsToBePerformed += 1
+                    self.verificationsQueue.put(verifyDatafileRunnable)
+        if numUnchangedFiles > 0:
+            logger.debug("Skipping verification of %d unchanged file(s) "
+                         "in folder: %s"
+                         % (numUnchangedFiles, folderModel.GetFolder()))
+        if numResumedFiles > 0:
+            logger.debug("Found %d interrupted upload(s) in the "
+                         "upload journal in folder: %s"
+                         % (numResumedFiles, folderModel.GetFolder()))
+            self.foldersModel.FolderStatusUpdated(folderModel)
+
+    def ResumeUploadFromJournal(self, folderModel, dfi, journalEntry):
+        """
+        If the upload journal shows that a datafile record was created
+        for this version of the data file in an earlier run, and that
+        run was interrupted before the data file was verified, queue the
+        upload straight away, without searching for the datafile on
+        MyTardis or calculating its checksum again.  Returns False if the
+        data file needs to be verified as usual.
+
+        The datafile record is still fetched (by its ID) first, because
+        MyTardis may have verified it since the journal was written (e.g.
+        if the upload had actually finished), in which case the data file
+        is marked as verified instead of being uploaded again.
+
+        The number of bytes already in staging is still checked before
+        resuming (see UploadFile), because the journaled bytes_sent may be
+        behind, and the remote file is appended to.
+
+        Data files which were fully uploaded (UPLOADED) are verified as
+        usual, because MyTardis may have verified them (and moved them out
+        of staging) since, and verifying them is what marks them VERIFIED
+        in the journal and adds them to the manifest.
+        """
+        if journalEntry is None or \
+                journalEntry.GetState() != UploadJournalState.CREATED:
+            return False
+        if self.uploadMethod != UploadMethod.VIA_STAGING:
+            return False
+        if folderModel in self.uploadDatafileRunnable and \
+                dfi in self.uploadDatafileRunnable[folderModel]:
+            return False
+        try:
+            datafile = DataFileModel.GetDataFileFromId(
+                self.settingsModel, folderModel.GetDatasetModel(),
+                journalEntry.GetDatafileId())
+        except DoesNotExist:
+            return False
+        except:
+            logger.error(traceback.format_exc())
+            return False
+        if datafile is None:
+            return False
+        if datafile.IsVerified():
+            logger.debug("Found verified datafile record for \"%s\", "
+                         "so its journaled upload won't be resumed."
+                         % folderModel.GetDataFilePath(dfi))
+            folderModel.SetDataFileUploaded(dfi, True)
+            manifestModel = self.settingsModel.GetManifestModel()
+            if manifestModel:
+                manifestModel.SetVerified(folderModel, dfi)
+            self.settingsModel.GetUploadJournalModel()\
+                .SetVerified(folderModel, dfi)
+            return True
+        existingUnverifiedDatafile = \
+            self.GetUnverifiedDatafileModel(folderModel, dfi,
+                                            journalEntry.GetDatafileId(),
+                                            journalEntry.GetStagingPath())
+        if existingUnverifiedDatafile is None:
+            return False
+        wx.PostEvent(
+            self.notifyWindow,
+            self.UnverifiedDatafileOnServerEvent(
+                foldersController=self,
+                folderModel=folderModel,
+                dataFileIndex=dfi,
+                existingUnverifiedDatafile=existingUnverifiedDatafile,
+                resumedFromJournal=True,
+                bytesUploadedToStaging=None,
+                verificationModel=None))
+        return True
+
+    def GetUnverifiedDatafileModel(self, folderModel, dfi, datafileId,
+                                   stagingPath):
+        """
+        Returns a DataFileModel for a datafile record which MyData
+        created (in this run or an earlier one) with a replica in
+        staging at stagingPath, so that uploading to it can be resumed
+        without creating another datafile record.  Returns None if
+        stagingPath isn't within the staging location.
+        """
+        try:
+            location = self.settingsModel.GetUploadToStagingRequest()\
+                .GetLocation().rstrip('/') + '/'
+        except:
+            logger.error(traceback.format_exc())
+            return None
+        if not stagingPath or not stagingPath.startswith(location):
+            return None
+        datafileJson = {
+            "id": datafileId,
+            "filename": folderModel.GetDataFileName(dfi),
+            "directory": folderModel.GetDataFileDirectory(dfi),
+            "size": folderModel.GetDataFileSize(dfi),
+            "replicas": [{"uri": stagingPath[len(location):],
+                          "verified": False,
+                          "datafile": "/api/v1/dataset_file/%s/"
+                                      % datafileId}]}
+        return DataFileModel(self.settingsModel,
+                             folderModel.GetDatasetModel(), datafileJson)
+
+    def VerifyDatafile(self, folderModel, dfi):
+        """
+        Queues a verification for a single data file which has been added
+        to (or rewritten within) a folder since it was scanned.  Any
+        earlier verification or upload of the same data file is
+        forgotten, so that the new version of the file is verified.
+        """
+        if self.IsShuttingDown():
+            return
+        with self.verificationsLock:
+            if folderModel not in self.verifyDatafileRunnable:
+                self.verifyDatafileRunnable[folderModel] = []
+            self.verifyDatafileRunnable[folderModel] = \
+                [existingVerifyDatafileRunnable
+                 for existingVerifyDatafileRunnable
+                 in self.verifyDatafileRunnable[folderModel]
+                 if existingVerifyDatafileRunnable.GetDatafileIndex() != dfi]
             if folderModel in self.uploadDatafileRunnable:
-                if dfi in self.uploadDatafileRunnable[folderModel]:
-                    thisFileIsAlreadyBeingUploaded = True
-            if not thisFileIsAlreadyBeingVerified \
-                    and not thisFileIsAlreadyBeingUploaded:
-                self.verifyDatafileRunnable[folderModel]\
-                    .append(VerifyDatafileRunnable(self, self.foldersModel,
-                                                   folderModel, dfi,
-                                                   self.settingsModel))
-                self.verificationsQueue\
-                    .put(self.verifyDatafileRunnable[folderModel][dfi])
+                self.uploadDatafileRunnable[folderModel].pop(dfi, None)
+            # The dataset's file listing may be older than this version
+            # of the data file, so it is looked up individually.
+            verifyDatafileRunnable = \
+                VerifyDatafileRunnable(self, self.foldersModel,
+                                       folderModel, dfi,
+                                       self.settingsModel,
+                                       useDatasetListing=False)
+            self.verifyDatafileRunnable[folderModel]\
+                .append(verifyDatafileRunnable)
+            self.numVerificationsToBePerformed += 1
+            self.verificationsQueue.put(verifyDatafileRunnable)
+        self.foldersModel.FolderStatusUpdated(folderModel)
+
+    def StartWatchingDataDirectory(self):
+        if not DataDirectoryWatcher.IsSupported():
+            logger.warning("Can't watch the data directory for new data "
+                           "files, because pyinotify is not available.")
+            return
+        self.dataDirectoryWatcher = \
+            DataDirectoryWatcher(self.settingsModel, self.foldersModel, self)
+        self.dataDirectoryWatcher.Start()
+
+    def StopWatchingDataDirectory(self):
+        if self.dataDirectoryWatcher:
+            self.dataDirectoryWatcher.Stop()
+            self.dataDirectoryWatcher = None
+
+    def IsWatchingDataDirectory(self):
+        return self.dataDirectoryWatcher is not None and \
+            self.dataDirectoryWatcher.IsRunning()
+
+    def GetStagingFileSizeCache(self, username, privateKeyFilePath,
+                                hostname):
+        with self.stagingFileSizeCacheLock:
+            if self.stagingFileSizeCache is None:
+                self.stagingFileSizeCache = \
+                    StagingFileSizeCache(username, privateKeyFilePath,
+                                         hostname)
+            return self.stagingFileSizeCache
+
+    def GetStagingDirectoryCache(self, username, privateKeyFilePath,
+                                 hostname):
+        with self.stagingDirectoryCacheLock:
+            if self.stagingDirectoryCache is None:
+                self.stagingDirectoryCache = \
+                    StagingDirectoryCache(username, privateKeyFilePath,
+                                          hostname)
+            return self.stagingDirectoryCache
 
     def OnDeleteFolders(self, evt):
         # Remove the selected row(s) from the model. The model will take care
@@ -707,6 +1248,11 @@ class FoldersController():
                     return None
                 md5.update(chunk)
                 bytesProcessed += len(chunk)
+                if self.bandwidthLimiter:
+                    self.bandwidthLimiter.ConsumeDiskRead(
+                        len(chunk),
+                        abortCheck=lambda: (self.IsShuttingDown() or
+                                            uploadModel.Canceled()))
                 del chunk
                 if ProgressCallback:
                     ProgressCallback(bytesProcessed)
@@ -716,16 +1262,51 @@ class FoldersController():
 class VerifyDatafileRunnable():
 
     def __init__(self, foldersController, foldersModel, folderModel,
-                 dataFileIndex, settingsModel):
+                 dataFileIndex, settingsModel, useDatasetListing=True):
         self.foldersController = foldersController
         self.foldersModel = foldersModel
         self.folderModel = folderModel
         self.dataFileIndex = dataFileIndex
         self.settingsModel = settingsModel
+        # If False, the datafile is always looked up individually, rather
+        # than in the dataset's file listing, e.g. for a data file which
+        # has been modified since the listing was retrieved.
+        self.useDatasetListing = useDatasetListing
 
     def GetDatafileIndex(self):
         return self.dataFileIndex
 
+    def LookUpDatafileInIndex(self, dataFileName, dataFileDirectory):
+        """
+        Looks for the datafile in the dataset's file listing, which is
+        retrieved from MyTardis once per dataset, rather than once per
+        file.  Returns None if the datafile isn't in the listing (or
+        the listing couldn't be retrieved), in which case, the caller
+        should query MyTardis for this datafile individually.
+        """
+        datasetModel = self.folderModel.GetDatasetModel()
+        try:
+            dataFileIndex = datasetModel.GetDataFileIndex()
+        except:
+            logger.error(traceback.format_exc())
+            return None
+        return dataFileIndex.get((dataFileDirectory, dataFileName), None)
+
+    def GetUnverifiedReplicaPaths(self, location):
+        """
+        Returns the staging paths of the unverified replicas of the
+        datafiles which have already been listed for this folder's
+        dataset.
+        """
+        remoteFilePaths = []
+        datasetModel = self.folderModel.GetDatasetModel()
+        for datafile in datasetModel.GetListedDataFiles():
+            replicas = datafile.GetReplicas()
+            if len(replicas) > 0 and not replicas[0].IsVerified():
+                remoteFilePaths.append("%s/%s" % (location.rstrip('/'),
+                                                  replicas[0].GetUri()))
+        return remoteFilePaths
+
     def run(self):
         dataFilePath = self.folderModel.GetDataFilePath(self.dataFileIndex)
         dataFileDirectory = \
@@ -750,11 +1331,16 @@ class VerifyDatafileRunnable():
 
         existingDatafile = None
         try:
-            existingDatafile = DataFileModel.GetDataFile(
-                settingsModel=self.settingsModel,
-                dataset=self.folderModel.GetDatasetModel(),
-                filename=dataFileName,
-                directory=dataFileDirectory)
+            if self.useDatasetListing:
+                existingDatafile = \
+                    self.LookUpDatafileInIndex(dataFileName,
+                                               dataFileDirectory)
+            if existingDatafile is None:
+                existingDatafile = DataFileModel.GetDataFile(
+                    settingsModel=self.settingsModel,
+                    dataset=self.folderModel.GetDatasetModel(),
+                    filename=dataFileName,
+                    directory=dataFileDirectory)
             self.verificationModel.SetMessage("Found datafile on "
                                               "MyTardis server.")
             self.verificationModel.SetStatus(VerificationStatus.FOUND_VERIFIED)
@@ -845,11 +1431,17 @@ class VerifyDatafileRunnable():
                                                 replicas[0].GetUri())
                     bytesUploadedToStaging = 0
                     try:
-                        bytesUploadedToStaging = \
-                            GetBytesUploadedToStaging(
+                        # Check the sizes of the dataset's other
+                        # unverified replicas in the same SSH command
+                        # (if this size isn't already cached).
+                        bytesUploadedToStaging = fc\
+                            .GetStagingFileSizeCache(username,
+                                                     privateKeyFilePath,
+                                                     host)\
+                            .GetBytesUploadedToStaging(
                                 remoteFilePath,
-                                username, privateKeyFilePath, host,
-                                self.verificationModel)
+                                lambda: self.GetUnverifiedReplicaPaths(
+                                    location))
                         logger.debug("%d bytes uploaded to staging for %s"
                                      % (bytesUploadedToStaging,
                                         replicas[0].GetUri()))
@@ -946,6 +1538,15 @@ class VerifyDatafileRunnable():
                 self.folderModel.SetDataFileUploaded(self.dataFileIndex,
                                                      True)
                 self.foldersModel.FolderStatusUpdated(self.folderModel)
+                manifestModel = self.settingsModel.GetManifestModel()
+                if manifestModel:
+                    manifestModel.SetVerified(self.folderModel,
+                                              self.dataFileIndex)
+                uploadJournalModel = \
+                    self.settingsModel.GetUploadJournalModel()
+                if uploadJournalModel:
+                    uploadJournalModel.SetVerified(self.folderModel,
+                                                   self.dataFileIndex)
                 wx.PostEvent(
                     self.foldersController.notifyWindow,
                     self.foldersController.FoundVerifiedDatafileEvent(
@@ -960,7 +1561,7 @@ class UploadDatafileRunnable():
 
     def __init__(self, foldersController, foldersModel, folderModel,
                  dataFileIndex, uploadsModel, uploadModel, settingsModel,
-                 existingUnverifiedDatafile):
+                 existingUnverifiedDatafile, requestVerification=False):
         self.foldersController = foldersController
         self.foldersModel = foldersModel
         self.folderModel = folderModel
@@ -969,65 +1570,147 @@ class UploadDatafileRunnable():
         self.uploadModel = uploadModel
         self.settingsModel = settingsModel
         self.existingUnverifiedDatafile = existingUnverifiedDatafile
+        # If the datafile record was found in the upload journal (rather
+        # than on MyTardis), or was created by an earlier attempt of this
+        # upload, MyData still needs to ask MyTardis to verify it after
+        # uploading.
+        self.requestVerification = requestVerification
+        self.dataFileSize = None
+        self.dataFileMd5Sum = None
+        self.prepared = False
+        # The number of times this upload has been put in the upload
+        # retry queue (see ScheduleRetry), and the datafile record
+        # created by the latest attempt (if any), which a retry reuses.
+        self.retryAttempts = 0
+        # The adaptive concurrency limit of the upload lane running this
+        # upload (if any), set by uploadWorker.
+        self.concurrencyLimit = None
+        self.createdDatafileId = None
+        self.createdStagingPath = None
+        # Set when this upload POSTs a new datafile record (or POSTs the
+        # file itself).  If that attempt fails (e.g. with a read timeout
+        # or an Internal Server Error), MyTardis may still have created
+        # the record, so a retry looks it up before POSTing again.
+        self.datafilePostSent = False
 
     def GetDatafileIndex(self):
         return self.dataFileIndex
 
-    def run(self):
+    def FindDatafileFromEarlierAttempt(self):
+        """
+        Looks up the datafile record which an earlier attempt of this
+        upload may have created, even though its POST appeared to fail.
+        Returns None if there is no such record.  If there is an
+        unverified record, the upload will be resumed with it (if
+        uploading via staging), rather than creating a duplicate record.
+        """
+        dataset = self.folderModel.GetDatasetModel()
+        try:
+            existingDatafile = DataFileModel.GetDataFile(
+                settingsModel=self.settingsModel, dataset=dataset,
+                filename=self.folderModel.GetDataFileName(self.dataFileIndex),
+                directory=self.folderModel.GetDataFileDirectory(
+                    self.dataFileIndex))
+        except DoesNotExist:
+            return None
+        if existingDatafile is None:
+            raise Exception("Couldn't check whether a datafile record was "
+                            "created for %s in dataset \"%s\"."
+                            % (self.folderModel.GetDataFileName(
+                                self.dataFileIndex),
+                               dataset.GetDescription()))
+        if existingDatafile.IsVerified():
+            return existingDatafile
+        if self.foldersController.uploadMethod == UploadMethod.HTTP_POST or \
+                len(existingDatafile.GetReplicas()) == 0:
+            raise Exception("Found unverified datafile record. "
+                            "You can wait for MyTardis to verify the "
+                            "file, or if necessary, you can ask your "
+                            "MyTardis administrator to delete the "
+                            "file from the server, so you can "
+                            "re-upload it.")
+        logger.debug("Resuming upload of %s to the datafile record created "
+                     "by an earlier attempt."
+                     % self.folderModel.GetDataFilePath(self.dataFileIndex))
+        self.existingUnverifiedDatafile = existingDatafile
+        self.requestVerification = True
+        return existingDatafile
+
+    def NeedsChecksum(self):
+        """
+        The HTTP POST upload method doesn't support resuming uploads,
+        so we always (re-)create the JSON to be POSTed (including the
+        MD5 checksum) when we find a file whose datafile record is
+        unverified.
+        """
+        return self.foldersController.uploadMethod == \
+            UploadMethod.HTTP_POST or not self.existingUnverifiedDatafile
+
+    def Prepare(self):
+        """
+        Checks that the file isn't still being modified, gets its size
+        and (if required) calculates its MD5 checksum.  This is normally
+        called from one of FoldersController's hash worker threads, so
+        that hashing one file can overlap with uploading another.
+
+        Returns True if the file is ready to be uploaded.
+        """
         if self.uploadModel.Canceled():
             # self.foldersController.SetCanceled()
             logger.debug("Upload for \"%s\" was canceled "
                          "before it began uploading." %
                          self.uploadModel.GetRelativePathToUpload())
-            return
+            return False
         dataFilePath = self.folderModel.GetDataFilePath(self.dataFileIndex)
-        dataFileName = os.path.basename(dataFilePath)
-        dataFileDirectory = \
-            self.folderModel.GetDataFileDirectory(self.dataFileIndex)
-        datasetId = self.folderModel.GetDatasetModel().GetId()
+        uploadJournalModel = self.settingsModel.GetUploadJournalModel()
+        if uploadJournalModel:
+            uploadJournalModel.SetQueued(self.folderModel, self.dataFileIndex)
 
         thirtySeconds = 30
-        if (time.time() - os.path.getmtime(dataFilePath)) <= thirtySeconds:
+        cachedModifiedTime = \
+            self.folderModel.GetDataFileModifiedTime(self.dataFileIndex)
+        if (time.time() - cachedModifiedTime) <= thirtySeconds:
             message = "Not uploading file, in case it is still being modified."
             self.uploadModel.SetMessage(message)
             self.uploadsModel.UploadMessageUpdated(self.uploadModel)
             self.uploadModel.SetStatus(UploadStatus.FAILED)
             self.uploadsModel.UploadStatusUpdated(self.uploadModel)
-            return
-
-        logger.debug("Uploading " +
-                     self.folderModel.GetDataFileName(self.dataFileIndex) +
-                     "...")
-
-        if self.foldersController.uploadMethod == UploadMethod.HTTP_POST or \
-                not self.existingUnverifiedDatafile:
-            myTardisUrl = self.settingsModel.GetMyTardisUrl()
-            myTardisUsername = self.settingsModel.GetUsername()
-            myTardisApiKey = self.settingsModel.GetApiKey()
-            if self.foldersController.uploadMethod == \
-                    UploadMethod.VIA_STAGING:
-                url = myTardisUrl + "/api/v1/mydata_dataset_file/"
-            else:
-                url = myTardisUrl + "/api/v1/dataset_file/"
-            headers = {"Authorization": "ApiKey " + myTardisUsername + ":" +
-                       myTardisApiKey}
+            return False
 
         if self.foldersController.IsShuttingDown():
-            return
+            return False
 
         self.uploadModel.SetMessage("Getting data file size...")
+        # Everything up to this point has used the size and timestamps
+        # cached during the folder scan.  Now that we are about to upload,
+        # re-stat the file, in case it has changed since it was scanned.
+        try:
+            self.folderModel.RefreshDataFileStat(self.dataFileIndex)
+        except OSError:
+            logger.error(traceback.format_exc())
+            message = "Couldn't access %s" % dataFilePath
+            self.uploadModel.SetMessage(message)
+            self.uploadsModel.UploadMessageUpdated(self.uploadModel)
+            self.uploadModel.SetStatus(UploadStatus.FAILED)
+            self.uploadsModel.UploadStatusUpdated(self.uploadModel)
+            return False
+        modifiedTime = \
+            self.folderModel.GetDataFileModifiedTime(self.dataFileIndex)
+        if modifiedTime != cachedModifiedTime and \
+                (time.time() - modifiedTime) <= thirtySeconds:
+            message = "Not uploading file, in case it is still being modified."
+            self.uploadModel.SetMessage(message)
+            self.uploadsModel.UploadMessageUpdated(self.uploadModel)
+            self.uploadModel.SetStatus(UploadStatus.FAILED)
+            self.uploadsModel.UploadStatusUpdated(self.uploadModel)
+            return False
         dataFileSize = self.folderModel.GetDataFileSize(self.dataFileIndex)
         self.uploadModel.SetFileSize(dataFileSize)
 
         if self.foldersController.IsShuttingDown():
-            return
-
-        # The HTTP POST upload method doesn't support resuming uploads,
-        # so we always (re-)create the JSON to be POSTed when we find
-        # a file whose datafile record is unverified.
+            return False
 
-        if self.foldersController.uploadMethod == UploadMethod.HTTP_POST or \
-                not self.existingUnverifiedDatafile:
+        if self.NeedsChecksum():
             self.uploadModel.SetMessage("Calculating MD5 checksum...")
 
             def Md5ProgressCallback(bytesProcessed):
@@ -1049,25 +1732,176 @@ class UploadDatafileRunnable():
                                                 % int(percentComplete))
                 self.uploadsModel.UploadMessageUpdated(self.uploadModel)
                 myTardisUrl = self.settingsModel.GetMyTardisUrl()
-                wx.PostEvent(
-                    self.foldersController.notifyWindow,
-                    self.foldersController.ConnectionStatusEvent(
-                        myTardisUrl=myTardisUrl,
-                        connectionStatus=ConnectionStatus.CONNECTED))
-            dataFileMd5Sum = \
-                self.foldersController\
-                    .CalculateMd5Sum(dataFilePath, dataFileSize,
-                                     self.uploadModel,
-                                     ProgressCallback=Md5ProgressCallback)
+                self.foldersController.SetConnectionStatus(
+                    myTardisUrl, ConnectionStatus.CONNECTED)
+            # Avoid re-reading the whole file if its checksum was
+            # calculated before (e.g. before an upload was retried,
+            # canceled, or interrupted by restarting MyData).
+            if uploadJournalModel:
+                journalEntry = \
+                    uploadJournalModel.GetEntry(self.folderModel,
+                                                self.dataFileIndex)
+                if journalEntry:
+                    self.dataFileMd5Sum = journalEntry.GetMd5Sum()
+            checksumCacheModel = self.settingsModel.GetChecksumCacheModel()
+            if checksumCacheModel and not self.dataFileMd5Sum:
+                self.dataFileMd5Sum = \
+                    checksumCacheModel.GetMd5Sum(self.folderModel,
+                                                 self.dataFileIndex)
+            if self.dataFileMd5Sum:
+                logger.debug("Using cached MD5 checksum for %s"
+                             % dataFilePath)
+            else:
+                self.dataFileMd5Sum = \
+                    self.foldersController\
+                        .CalculateMd5Sum(dataFilePath, dataFileSize,
+                                         self.uploadModel,
+                                         ProgressCallback=Md5ProgressCallback)
+                if self.dataFileMd5Sum and checksumCacheModel:
+                    checksumCacheModel.SetChecksums(self.folderModel,
+                                                    self.dataFileIndex,
+                                                    self.dataFileMd5Sum)
 
             if self.uploadModel.Canceled():
                 # self.foldersController.SetCanceled()
                 logger.debug("Upload for \"%s\" was canceled "
                              "before it began uploading." %
                              self.uploadModel.GetRelativePathToUpload())
-                return
+                return False
+            if self.dataFileMd5Sum is None:
+                # MD5 calculation was aborted, because we're shutting down.
+                return False
+            if uploadJournalModel:
+                uploadJournalModel.SetHashed(self.folderModel,
+                                             self.dataFileIndex,
+                                             self.dataFileMd5Sum)
         else:
             dataFileSize = int(self.existingUnverifiedDatafile.GetSize())
+        self.dataFileSize = dataFileSize
+        self.prepared = True
+        return True
+
+    def IsRetryable(self, e):
+        """
+        Transient errors, e.g. a connection reset, a timeout, an Internal
+        Server Error from MyTardis or an SCP error, are worth retrying.
+        Errors which need the user or the MyTardis administrator to fix
+        something aren't, and neither are local file errors, e.g. a data
+        file which has been deleted or can't be read since it was
+        scanned.
+        """
+        if isinstance(e, StagingHostSshPermissionDenied):
+            return False
+        if isinstance(e, (requests.exceptions.ConnectionError,
+                          requests.exceptions.Timeout,
+                          SshException, InternalServerError)):
+            return True
+        if isinstance(e, IOError):
+            # e.g. socket.timeout has no errno.
+            return e.errno is None or e.errno in TRANSIENT_ERRNOS
+        return False
+
+    def ScheduleRetry(self, errorMessage):
+        """
+        Puts this upload in the upload retry queue, to be retried after
+        an exponentially increasing delay.  Returns False if the upload
+        shouldn't be retried (e.g. because it has already been retried
+        upload_retry_attempts times), in which case the caller should
+        mark it as failed.
+        """
+        fc = self.foldersController
+        if fc.uploadRetryQueue is None or fc.IsShuttingDown() or \
+                self.uploadModel.Canceled():
+            return False
+        maxAttempts = self.settingsModel.GetUploadRetryAttempts()
+        if self.retryAttempts >= maxAttempts:
+            return False
+        if self.createdDatafileId is not None and \
+                not self.existingUnverifiedDatafile:
+            # Don't create a second datafile record for the same file.
+            existingUnverifiedDatafile = \
+                fc.GetUnverifiedDatafileModel(self.folderModel,
+                                              self.dataFileIndex,
+                                              self.createdDatafileId,
+                                              self.createdStagingPath)
+            if existingUnverifiedDatafile is None:
+                return False
+            self.existingUnverifiedDatafile = existingUnverifiedDatafile
+            self.requestVerification = True
+        if self.uploadModel.GetBufferedReader() is not None:
+            try:
+                self.uploadModel.GetBufferedReader().close()
+            except:
+                logger.error(traceback.format_exc())
+        delay = fc.uploadRetryQueue.GetDelay(self.retryAttempts)
+        self.retryAttempts += 1
+        logger.info("Retrying upload of %s in %d seconds (attempt %d of "
+                    "%d): %s"
+                    % (self.folderModel.GetDataFilePath(self.dataFileIndex),
+                       delay, self.retryAttempts, maxAttempts, errorMessage))
+        # The size of the partial upload in staging is checked again
+        # before retrying.
+        self.uploadModel.SetBytesUploadedToStaging(None)
+        self.uploadModel.SetProgress(0)
+        self.uploadsModel.UploadProgressUpdated(self.uploadModel)
+        self.uploadModel.SetMessage("Retrying in %d seconds: %s"
+                                    % (delay, errorMessage))
+        self.uploadsModel.UploadMessageUpdated(self.uploadModel)
+        # Uploads waiting to be retried aren't counted as completed or
+        # failed, so the upload run isn't finished until they are.
+        self.uploadModel.SetStatus(UploadStatus.PAUSED)
+        self.uploadsModel.UploadStatusUpdated(self.uploadModel)
+        fc.uploadRetryQueue.Put(self, delay)
+        return True
+
+    def PostUploadCompleteEvent(self):
+        """
+        Asks the FoldersController to check whether all uploads and
+        verifications have finished.  An upload which fails after the
+        verifications have finished (e.g. while being prepared by a hash
+        worker, or after being retried) must call this, because nothing
+        else will check whether the run is complete.
+        """
+        wx.PostEvent(
+            self.foldersController.notifyWindow,
+            self.foldersController.UploadCompleteEvent(
+                id=self.foldersController.EVT_UPLOAD_COMPLETE,
+                folderModel=self.folderModel,
+                dataFileIndex=self.dataFileIndex,
+                uploadModel=self.uploadModel))
+
+    def run(self):
+        if not self.prepared and not self.Prepare():
+            if self.uploadModel.GetStatus() == UploadStatus.FAILED:
+                self.PostUploadCompleteEvent()
+            return
+        dataFilePath = self.folderModel.GetDataFilePath(self.dataFileIndex)
+        dataFileName = os.path.basename(dataFilePath)
+        dataFileDirectory = \
+            self.folderModel.GetDataFileDirectory(self.dataFileIndex)
+        dataFileSize = self.dataFileSize
+        dataFileMd5Sum = self.dataFileMd5Sum
+        # Used to measure the aggregate upload throughput and error rate,
+        # if the number of upload workers is being adjusted at runtime.
+        concurrencyLimit = self.concurrencyLimit
+        uploadJournalModel = self.settingsModel.GetUploadJournalModel()
+
+        logger.debug("Uploading " +
+                     self.folderModel.GetDataFileName(self.dataFileIndex) +
+                     "...")
+
+        if self.foldersController.uploadMethod == UploadMethod.HTTP_POST or \
+                not self.existingUnverifiedDatafile:
+            myTardisUrl = self.settingsModel.GetMyTardisUrl()
+            myTardisUsername = self.settingsModel.GetUsername()
+            if self.foldersController.uploadMethod == \
+                    UploadMethod.VIA_STAGING:
+                url = myTardisUrl + "/api/v1/mydata_dataset_file/"
+            else:
+                url = myTardisUrl + "/api/v1/dataset_file/"
+
+        if self.foldersController.IsShuttingDown():
+            return
 
         self.uploadModel.SetProgress(0)
         self.uploadsModel.UploadProgressUpdated(self.uploadModel)
@@ -1114,10 +1948,24 @@ class UploadDatafileRunnable():
             datafileBufferedReader = io.open(dataFilePath, 'rb')
             self.uploadModel.SetBufferedReader(datafileBufferedReader)
 
+        # The first progress update may include bytes uploaded by an
+        # earlier (interrupted) upload, which shouldn't be counted in
+        # the throughput.
+        bytesReported = [None]
+
         def ProgressCallback(param, current, total, message=None):
             if self.uploadModel.Canceled():
                 # self.foldersController.SetCanceled()
                 return
+            if concurrencyLimit:
+                if bytesReported[0] is not None and \
+                        current > bytesReported[0]:
+                    concurrencyLimit.RecordBytes(current - bytesReported[0])
+                bytesReported[0] = current
+            if uploadJournalModel and self.foldersController.uploadMethod \
+                    == UploadMethod.VIA_STAGING:
+                uploadJournalModel.SetBytesSent(self.folderModel,
+                                                self.dataFileIndex, current)
             percentComplete = \
                 100.0 - ((total - current) * 100.0) / total
             self.uploadModel.SetBytesUploaded(current)
@@ -1135,51 +1983,59 @@ class UploadDatafileRunnable():
                                                 % int(percentComplete))
             self.uploadsModel.UploadMessageUpdated(self.uploadModel)
             myTardisUrl = self.settingsModel.GetMyTardisUrl()
-            wx.PostEvent(
-                self.foldersController.notifyWindow,
-                self.foldersController.ConnectionStatusEvent(
-                    myTardisUrl=myTardisUrl,
-                    connectionStatus=ConnectionStatus.CONNECTED))
+            self.foldersController.SetConnectionStatus(
+                myTardisUrl, ConnectionStatus.CONNECTED)
 
         # FIXME: The database interactions below should go in a model class.
 
         if self.foldersController.uploadMethod == UploadMethod.HTTP_POST:
-            datagen, headers = poster.encode.multipart_encode(
-                {"json_data": json.dumps(dataFileJson),
-                 "attached_file": datafileBufferedReader},
-                cb=ProgressCallback)
-            opener = poster.streaminghttp.register_openers()
-            opener.addheaders = [("Authorization", "ApiKey " +
-                                  myTardisUsername +
-                                  ":" + myTardisApiKey),
-                                 ("Content-Type", "application/json"),
-                                 ("Accept", "application/json")]
+            multipartFileStream = MultipartFileStream(
+                {"json_data": json.dumps(dataFileJson)},
+                "attached_file", dataFileName, datafileBufferedReader,
+                dataFileSize, progressCallback=ProgressCallback,
+                bandwidthLimiter=self.foldersController.bandwidthLimiter)
         elif not self.existingUnverifiedDatafile:
-            headers = {"Authorization": "ApiKey " +
-                       myTardisUsername + ":" + myTardisApiKey,
-                       "Content-Type": "application/json",
-                       "Accept": "application/json"}
             data = json.dumps(dataFileJson)
 
         self.uploadModel.SetMessage("Uploading...")
         postSuccess = False
         uploadSuccess = False
 
-        request = None
         response = None
+        # Set if the upload failed in a way that is worth retrying, but
+        # which isn't raised as far as the outer exception handler.
+        retryableError = None
         try:
-            if self.foldersController.uploadMethod == UploadMethod.HTTP_POST:
-                request = urllib2.Request(url, datagen, headers)
             try:
-                if self.foldersController.uploadMethod == \
-                        UploadMethod.HTTP_POST:
-                    response = urllib2.urlopen(request)
+                existingDatafile = None
+                if self.datafilePostSent and \
+                        not self.existingUnverifiedDatafile:
+                    existingDatafile = self.FindDatafileFromEarlierAttempt()
+                if existingDatafile and existingDatafile.IsVerified():
+                    logger.debug("Found verified datafile record for %s "
+                                 "created by an earlier attempt."
+                                 % dataFilePath)
                     postSuccess = True
                     uploadSuccess = True
+                elif self.foldersController.uploadMethod == \
+                        UploadMethod.HTTP_POST:
+                    # The ApiClient's connection pool is shared by all of
+                    # the upload worker threads, so (unlike poster and
+                    # urllib2) we can POST several files at once.
+                    self.datafilePostSent = True
+                    response = self.settingsModel.GetApiClient().Post(
+                        url, data=multipartFileStream,
+                        contentType=multipartFileStream.GetContentType(),
+                        headers={"Accept": "application/json"})
+                    postSuccess = response.status_code >= 200 and \
+                        response.status_code < 300
+                    uploadSuccess = postSuccess
+                    logger.debug(response.text)
                 else:
                     if not self.existingUnverifiedDatafile:
-                        response = requests.post(headers=headers, url=url,
-                                                 data=data)
+                        self.datafilePostSent = True
+                        response = self.settingsModel.GetApiClient()\
+                            .Post(url, data=data)
                         postSuccess = response.status_code >= 200 and \
                             response.status_code < 300
                         logger.debug(response.text)
@@ -1196,6 +2052,8 @@ class UploadDatafileRunnable():
                                 .GetReplicas()[0].GetUri()
                             remoteFilePath = "%s/%s" % (location.rstrip('/'),
                                                         uri)
+                            datafileId = \
+                                self.existingUnverifiedDatafile.GetId()
                         else:
                             # DataFile creation via the MyTardis API doesn't
                             # return JSON, but if a DataFile record is created
@@ -1204,6 +2062,15 @@ class UploadDatafileRunnable():
                             # to copy/upload the file to.
                             temp_url = response.text
                             remoteFilePath = temp_url
+                            datafileId = \
+                                response.headers['location'].split("/")[-2]
+                        self.createdDatafileId = datafileId
+                        self.createdStagingPath = remoteFilePath
+                        if uploadJournalModel:
+                            uploadJournalModel.SetCreated(self.folderModel,
+                                                          self.dataFileIndex,
+                                                          datafileId,
+                                                          remoteFilePath)
                         while True:
                             try:
                                 UploadFile(dataFilePath,
@@ -1237,70 +2104,69 @@ class UploadDatafileRunnable():
                         bytesUploaded = self.uploadModel.GetBytesUploaded()
                         if bytesUploaded == dataFileSize:
                             uploadSuccess = True
-                            if not self.existingUnverifiedDatafile:
-                                location = response.headers['location']
-                                datafileId = location.split("/")[-2]
+                            if not self.existingUnverifiedDatafile or \
+                                    self.requestVerification:
                                 DataFileModel.Verify(self.settingsModel,
                                                      datafileId)
                         else:
                             raise Exception(
                                 "Only %d of %d bytes were uploaded for %s"
                                 % (bytesUploaded, dataFileSize, dataFilePath))
-                    if not postSuccess and not self.existingUnverifiedDatafile:
-                        if response.status_code == 401:
-                            message = "Couldn't create datafile \"%s\" " \
-                                      "for folder \"%s\"." \
-                                      % (dataFileName,
-                                         self.folderModel.GetFolder())
-                            message += "\n\n"
-                            message += \
-                                "Please ask your MyTardis administrator to " \
-                                "check the permissions of the \"%s\" user " \
-                                "account." % myTardisDefaultUsername
-                            raise Unauthorized(message)
-                        elif response.status_code == 404:
-                            message = "Encountered a 404 (Not Found) error " \
-                                "while attempting to create a datafile " \
-                                "record for \"%s\" in folder \"%s\"." \
-                                      % (dataFileName,
-                                         self.folderModel.GetFolder())
-                            message += "\n\n"
-                            message += \
-                                "Please ask your MyTardis administrator to " \
-                                "check whether an appropriate staging " \
-                                "storage box exists."
-                            raise DoesNotExist(message)
-                        elif response.status_code == 500:
-                            message = "Couldn't create datafile \"%s\" " \
-                                      "for folder \"%s\"." \
-                                      % (dataFileName,
-                                         self.folderModel.GetFolder())
-                            message += "\n\n"
-                            message += "An Internal Server Error occurred."
-                            message += "\n\n"
-                            message += \
-                                "If running MyTardis in DEBUG mode, " \
-                                "more information may be available below. " \
-                                "Otherwise, please ask your MyTardis " \
-                                "administrator to check in their logs " \
-                                "for more information."
-                            message += "\n\n"
-                            try:
-                                message += "ERROR: \"%s\"" \
-                                    % response.json()['error_message']
-                            except:
-                                message = "Internal Server Error: " \
-                                    "See MyData's log for further " \
-                                    "information."
-                            raise InternalServerError(message)
-                        else:
-                            # FIXME: If POST fails for some other reason,
-                            # for now, we will just populate the upload's
-                            # message field with an error message, and
-                            # allow the other uploads to continue.  There
-                            # may be other critical errors where we should
-                            # raise an exception and abort all uploads.
-                            pass
+                if not postSuccess and response is not None:
+                    if response.status_code == 401:
+                        message = "Couldn't create datafile \"%s\" " \
+                                  "for folder \"%s\"." \
+                                  % (dataFileName,
+                                     self.folderModel.GetFolder())
+                        message += "\n\n"
+                        message += \
+                            "Please ask your MyTardis administrator to " \
+                            "check the permissions of the \"%s\" user " \
+                            "account." % myTardisUsername
+                        raise Unauthorized(message)
+                    elif response.status_code == 404:
+                        message = "Encountered a 404 (Not Found) error " \
+                            "while attempting to create a datafile " \
+                            "record for \"%s\" in folder \"%s\"." \
+                                  % (dataFileName,
+                                     self.folderModel.GetFolder())
+                        message += "\n\n"
+                        message += \
+                            "Please ask your MyTardis administrator to " \
+                            "check whether an appropriate staging " \
+                            "storage box exists."
+                        raise DoesNotExist(message)
+                    elif response.status_code == 500:
+                        message = "Couldn't create datafile \"%s\" " \
+                                  "for folder \"%s\"." \
+                                  % (dataFileName,
+                                     self.folderModel.GetFolder())
+                        message += "\n\n"
+                        message += "An Internal Server Error occurred."
+                        message += "\n\n"
+                        message += \
+                            "If running MyTardis in DEBUG mode, " \
+                            "more information may be available below. " \
+                            "Otherwise, please ask your MyTardis " \
+                            "administrator to check in their logs " \
+                            "for more information."
+                        message += "\n\n"
+                        try:
+                            message += "ERROR: \"%s\"" \
+                                % response.json()['error_message']
+                        except:
+                            message = "Internal Server Error: " \
+                                "See MyData's log for further " \
+                                "information."
+                        raise InternalServerError(message)
+                    else:
+                        # FIXME: If POST fails for some other reason,
+                        # for now, we will just populate the upload's
+                        # message field with an error message, and
+                        # allow the other uploads to continue.  There
+                        # may be other critical errors where we should
+                        # raise an exception and abort all uploads.
+                        pass
             except DoesNotExist, e:
                 # This generally means that MyTardis's API couldn't assign
                 # a staging storage box, possibly because the MyTardis
@@ -1323,6 +2189,14 @@ class UploadDatafileRunnable():
                             icon=wx.ICON_ERROR))
                 return
             except StagingHostRefusedSshConnection, e:
+                if concurrencyLimit and concurrencyLimit.GetLimit() > \
+                        concurrencyLimit.GetMinLimit():
+                    # The staging host is probably refusing connections
+                    # because of sshd's MaxStartups, so rather than
+                    # aborting all uploads, fewer upload workers will be
+                    # used, and this upload is counted as failed.
+                    concurrencyLimit.RecordError(refused=True)
+                    raise
                 wx.PostEvent(
                     self.foldersController.notifyWindow,
                     self.foldersController.ShutdownUploadsEvent(
@@ -1357,6 +2231,7 @@ class UploadDatafileRunnable():
                 message = str(e)
                 message += "\n\n" + e.command
                 logger.error(message)
+                retryableError = str(e)
             except ValueError, e:
                 if str(e) == "read of closed file" or \
                         str(e) == "seek of closed file":
@@ -1394,39 +2269,17 @@ class UploadDatafileRunnable():
                             message=message,
                             icon=wx.ICON_ERROR))
                 return
-        except urllib2.HTTPError, e:
-            logger.error("url: " + url)
-            logger.error(traceback.format_exc())
-            errorResponse = e.read()
-            logger.error(errorResponse)
-            wx.PostEvent(
-                self.foldersController.notifyWindow,
-                self.foldersController.ShutdownUploadsEvent(
-                    failed=True))
-            message = "An error occured while trying to POST data to " \
-                "the MyTardis server.\n\n"
-            try:
-                # If running MyTardis in DEBUG mode, there should
-                # be an error_message returned in JSON format.
-                message += "ERROR: \"%s\"" \
-                    % json.loads(errorResponse)['error_message']
-            except:
-                message += str(e)
-            wx.PostEvent(
-                self.foldersController.notifyWindow,
-                self.foldersController
-                    .ShowMessageDialogEvent(
-                        title="MyData",
-                        message=message,
-                        icon=wx.ICON_ERROR))
-            return
         except Exception, e:
+            if concurrencyLimit and \
+                    not isinstance(e, StagingHostRefusedSshConnection):
+                concurrencyLimit.RecordError()
             if not self.foldersController.IsShuttingDown():
-                wx.PostEvent(
-                    self.foldersController.notifyWindow,
-                    self.foldersController.ConnectionStatusEvent(
-                        myTardisUrl=self.settingsModel.GetMyTardisUrl(),
-                        connectionStatus=ConnectionStatus.DISCONNECTED))
+                self.foldersController.SetConnectionStatus(
+                    self.settingsModel.GetMyTardisUrl(),
+                    ConnectionStatus.DISCONNECTED)
+            if self.IsRetryable(e) and self.ScheduleRetry(str(e)):
+                logger.debug(traceback.format_exc())
+                return
 
             self.uploadModel.SetMessage(str(e))
             self.uploadsModel.UploadMessageUpdated(self.uploadModel)
@@ -1444,16 +2297,10 @@ class UploadDatafileRunnable():
                 if hasattr(e, "code"):
                     logger.error(e.code)
                 logger.error(str(e))
-                if self.foldersController.uploadMethod == \
-                        UploadMethod.HTTP_POST:
-                    if request is not None:
-                        logger.error(str(request.header_items()))
-                    else:
-                        logger.error("request is None.")
                 if response is not None:
                     if self.foldersController.uploadMethod == \
                             UploadMethod.HTTP_POST:
-                        logger.debug(response.read())
+                        logger.debug(response.text)
                     else:
                         # logger.debug(response.text)
                         pass
@@ -1465,10 +2312,17 @@ class UploadDatafileRunnable():
                     # logger.debug(str(response.headers))
                     pass
             logger.debug(traceback.format_exc())
+            if self.retryAttempts > 0:
+                self.PostUploadCompleteEvent()
             return
 
         if uploadSuccess:
             logger.debug("Upload succeeded for " + dataFilePath)
+            if uploadJournalModel:
+                uploadJournalModel.SetUploaded(self.folderModel,
+                                               self.dataFileIndex)
+            if concurrencyLimit:
+                concurrencyLimit.RecordSuccess()
             self.uploadModel.SetStatus(UploadStatus.COMPLETED)
             self.uploadsModel.UploadStatusUpdated(self.uploadModel)
             self.uploadModel.SetMessage("Upload complete!")
@@ -1490,6 +2344,14 @@ class UploadDatafileRunnable():
                     self.uploadModel.Canceled():
                 return
             logger.error("Upload failed for " + dataFilePath)
+            if concurrencyLimit:
+                concurrencyLimit.RecordError()
+            if not postSuccess and response is not None and \
+                    response.status_code >= 500:
+                retryableError = "The MyTardis server responded with " \
+                    "HTTP status %d." % response.status_code
+            if retryableError and self.ScheduleRetry(retryableError):
+                return
             self.uploadModel.SetStatus(UploadStatus.FAILED)
             self.uploadsModel.UploadStatusUpdated(self.uploadModel)
             if not postSuccess and response is not None:
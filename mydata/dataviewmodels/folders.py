@@ -1,6 +1,7 @@
 import wx
 import wx.dataview
 import threading
+import Queue
 import os
 import sys
 import traceback
@@ -10,6 +11,8 @@ from mydata.models.folder import FolderModel
 from mydata.models.user import UserModel
 from mydata.models.group import GroupModel
 from mydata.models.experiment import ExperimentModel
+from mydata.dataviewmodels.rowstore import RowStoreModel
+from mydata.dataviewmodels.rowstore import RowList
 from mydata.logs import logger
 from mydata.utils.exceptions import InvalidFolderStructure
 from mydata.utils.exceptions import DoesNotExist
@@ -28,11 +31,11 @@ from mydata.utils.exceptions import DoesNotExist
 # Our data is stored in a list of FolderModel objects.
 
 
-class FoldersModel(wx.dataview.PyDataViewIndexListModel):
+class FoldersModel(RowStoreModel):
 
     def __init__(self, usersModel, groupsModel, settingsModel):
 
-        self.foldersData = []
+        self.foldersData = RowList()
 
         # Earlier prototypes loaded the last used folder view from an Sqlite
         # database on disk, recording the folders which the user had
@@ -40,8 +43,7 @@ class FoldersModel(wx.dataview.PyDataViewIndexListModel):
         # it scans the root data directory and constructs the folder list from
         # scratch every time.
 
-        wx.dataview.PyDataViewIndexListModel.__init__(self,
-                                                      len(self.foldersData))
+        RowStoreModel.__init__(self, self.foldersData)
 
         self.usersModel = usersModel
         self.groupsModel = groupsModel
@@ -65,10 +67,15 @@ class FoldersModel(wx.dataview.PyDataViewIndexListModel):
         else:
             self.defaultColumnWidths = (40, 185, 200, 80, 160, 160, 90, 150)
 
-        # This is the largest ID value which has been used in this model.
-        # It may no longer exist, i.e. if we delete the row with the
-        # largest ID, we don't decrement the maximum ID.
-        self.maxDataViewId = 0
+
+        # Owners and groups looked up for user and group folders which
+        # have appeared since the data directory was scanned.
+        self.ownersForNewUserFolders = {}
+        self.groupsForNewGroupFolders = {}
+
+        # While scanning, each folder is also put on this queue (if set),
+        # so that the FoldersController can start on it straight away.
+        self.foldersQueue = None
 
     def DeleteAllRows(self):
         rowsDeleted = []
@@ -309,21 +316,10 @@ class FoldersModel(wx.dataview.PyDataViewIndexListModel):
                 return True
         return False
 
-    def GetMaxDataViewIdFromExistingRows(self):
-        maxDataViewId = 0
-        for row in range(0, self.GetCount()):
-            if self.foldersData[row].GetDataViewId() > maxDataViewId:
-                maxDataViewId = self.foldersData[row].GetDataViewId()
-        return maxDataViewId
-
-    def GetMaxDataViewId(self):
-        if self.GetMaxDataViewIdFromExistingRows() > self.maxDataViewId:
-            self.maxDataViewId = self.GetMaxDataViewIdFromExistingRows()
-        return self.maxDataViewId
-
     def AddRow(self, value):
         self.Filter("")
         self.foldersData.append(value)
+        self.IndexAppendedRow(value)
         # Notify views
         if threading.current_thread().name == "MainThread":
             self.RowAppended()
@@ -334,14 +330,31 @@ class FoldersModel(wx.dataview.PyDataViewIndexListModel):
         self.ffd = list()
         self.Filter(self.searchString)
 
+    def SetFoldersQueue(self, foldersQueue):
+        self.foldersQueue = foldersQueue
+
+    def AddScannedFolder(self, folderModel):
+        """
+        Adds a folder found by ScanFolders, and passes it on to the
+        FoldersController (via the folders queue, if there is one), so
+        that its experiment and dataset can be set up and its data files
+        verified without waiting for the rest of the data directory to be
+        scanned.  If the queue is full, this blocks the scanning thread
+        until the FoldersController catches up.
+        """
+        self.AddRow(folderModel)
+        foldersQueue = self.foldersQueue
+        if foldersQueue is not None:
+            foldersQueue.put(folderModel)
+
     def FolderStatusUpdated(self, folderModel):
-        for row in range(0, self.GetCount()):
-            if self.foldersData[row] == folderModel:
-                col = self.columnNames.index("Status")
-                if threading.current_thread().name == "MainThread":
-                    self.RowValueChanged(row, col)
-                else:
-                    wx.CallAfter(self.RowValueChanged, row, col)
+        col = self.columnNames.index("Status")
+        if threading.current_thread().name == "MainThread":
+            row = self.GetRowForRecord(folderModel)
+            if row is not None:
+                self.RowValueChanged(row, col)
+        else:
+            self.MarkCellDirty(folderModel, col)
 
     def ScanFolders(self, incrementProgressDialog, shouldAbort):
         if self.GetCount() > 0:
@@ -350,6 +363,8 @@ class FoldersModel(wx.dataview.PyDataViewIndexListModel):
             self.usersModel.DeleteAllRows()
         if self.groupsModel.GetCount() > 0:
             self.groupsModel.DeleteAllRows()
+        self.ownersForNewUserFolders = {}
+        self.groupsForNewGroupFolders = {}
         dataDir = self.settingsModel.GetDataDirectory()
         folderStructure = self.settingsModel.GetFolderStructure()
         self.ignoreOldDatasets = self.settingsModel.IgnoreOldDatasets()
@@ -381,145 +396,221 @@ class FoldersModel(wx.dataview.PyDataViewIndexListModel):
 
     def ScanForUserFolders(self, incrementProgressDialog, shouldAbort):
         dataDir = self.settingsModel.GetDataDirectory()
-        folderStructure = self.settingsModel.GetFolderStructure()
         userFolderNames = os.walk(dataDir).next()[1]
-        for userFolderName in userFolderNames:
+        for userFolderName, (userRecord, folderModels) in \
+                self.ScanFoldersInParallel(userFolderNames,
+                                           self.ScanUserFolder,
+                                           shouldAbort):
             if shouldAbort():
                 wx.CallAfter(wx.GetApp().GetMainFrame().SetStatusMessage,
                              "Data uploads canceled")
                 return
+            userRecord.SetDataViewId(self.usersModel.GetMaxDataViewId() + 1)
+            self.usersModel.AddRow(userRecord)
+            self.AddScannedFolders(folderModels)
+            if threading.current_thread().name == "MainThread":
+                incrementProgressDialog()
+            else:
+                wx.CallAfter(incrementProgressDialog)
+        if shouldAbort():
+            wx.CallAfter(wx.GetApp().GetMainFrame().SetStatusMessage,
+                         "Data uploads canceled")
+
+    def ScanUserFolder(self, userFolderName):
+        """
+        Looks up the MyTardis user record for a user folder and scans the
+        user folder for dataset folders.  This can run in any of the
+        scanning threads (see ScanFoldersInParallel), so it doesn't add
+        anything to the users model or the folders model.
+
+        Returns (userRecord, folderModels).
+        """
+        dataDir = self.settingsModel.GetDataDirectory()
+        folderStructure = self.settingsModel.GetFolderStructure()
+        if folderStructure.startswith("Username"):
+            logger.debug("Found folder assumed to be username: " +
+                         userFolderName)
+        elif folderStructure.startswith("Email"):
+            logger.debug("Found folder assumed to be email: " +
+                         userFolderName)
+        try:
             if folderStructure.startswith("Username"):
-                logger.debug("Found folder assumed to be username: " +
-                             userFolderName)
+                userRecord = \
+                    UserModel.GetUserByUsername(self.settingsModel,
+                                                userFolderName)
             elif folderStructure.startswith("Email"):
-                logger.debug("Found folder assumed to be email: " +
-                             userFolderName)
-            usersDataViewId = self.usersModel.GetMaxDataViewId() + 1
-            try:
-                if folderStructure.startswith("Username"):
-                    userRecord = \
-                        UserModel.GetUserByUsername(self.settingsModel,
-                                                    userFolderName)
-                elif folderStructure.startswith("Email"):
-                    userRecord = \
-                        UserModel.GetUserByEmail(self.settingsModel,
-                                                 userFolderName)
-
-            except DoesNotExist:
-                userRecord = None
-            if shouldAbort():
-                wx.CallAfter(wx.GetApp().GetMainFrame().SetStatusMessage,
-                             "Data uploads canceled")
-                return
-            if userRecord is not None:
-                userRecord.SetDataViewId(usersDataViewId)
-                self.usersModel.AddRow(userRecord)
-                userFolderPath = os.path.join(dataDir, userFolderName)
-                if folderStructure == 'Username / Dataset' or \
-                        folderStructure == 'Email / Dataset':
+                userRecord = \
+                    UserModel.GetUserByEmail(self.settingsModel,
+                                             userFolderName)
+        except DoesNotExist:
+            userRecord = None
+        userFolderPath = os.path.join(dataDir, userFolderName)
+        if userRecord is not None:
+            if folderStructure == 'Username / Dataset' or \
+                    folderStructure == 'Email / Dataset':
+                folderModels = \
                     self.ScanForDatasetFolders(userFolderPath, userRecord,
                                                userFolderName)
-                elif folderStructure == \
-                        'Username / Experiment / Dataset' or \
-                        folderStructure == 'Email / Experiment / Dataset':
+            elif folderStructure == \
+                    'Username / Experiment / Dataset' or \
+                    folderStructure == 'Email / Experiment / Dataset':
+                folderModels = \
                     self.ScanForExperimentFolders(userFolderPath, userRecord,
                                                   userFolderName)
-                elif folderStructure == \
-                        'Username / "MyTardis" / Experiment / Dataset':
-                    userFolderContents = os.listdir(userFolderPath)
-                    myTardisFolderName = None
-                    for item in userFolderContents:
-                        if item.lower() == 'mytardis':
-                            myTardisFolderName = item
-                    if not myTardisFolderName:
-                        message = 'Didn\'t find "MyTardis" folder in ' \
-                            '"%s"' % userFolderPath
-                        logger.error(message)
-                        raise InvalidFolderStructure(message)
-                    myTardisFolderPath = os.path.join(userFolderPath,
-                                                      myTardisFolderName)
+            elif folderStructure == \
+                    'Username / "MyTardis" / Experiment / Dataset':
+                userFolderContents = os.listdir(userFolderPath)
+                myTardisFolderName = None
+                for item in userFolderContents:
+                    if item.lower() == 'mytardis':
+                        myTardisFolderName = item
+                if not myTardisFolderName:
+                    message = 'Didn\'t find "MyTardis" folder in ' \
+                        '"%s"' % userFolderPath
+                    logger.error(message)
+                    raise InvalidFolderStructure(message)
+                myTardisFolderPath = os.path.join(userFolderPath,
+                                                  myTardisFolderName)
+                folderModels = \
                     self.ScanForExperimentFolders(myTardisFolderPath,
                                                   userRecord,
                                                   userFolderName)
-                if shouldAbort():
-                    wx.CallAfter(wx.GetApp().GetMainFrame()
-                                 .SetStatusMessage,
-                                 "Data uploads canceled")
-                    return
-            else:
-                message = "Didn't find a MyTardis user record for folder " \
-                    "\"%s\" in %s" % (userFolderName, dataDir)
-                logger.warning(message)
-                if shouldAbort():
-                    wx.CallAfter(wx.GetApp().GetMainFrame().SetStatusMessage,
-                                 "Data uploads canceled")
-                    return
-                if folderStructure.startswith("Username"):
-                    userRecord = UserModel(settingsModel=self.settingsModel,
-                                           username=userFolderName,
-                                           userNotFoundInMyTardis=True)
-                elif folderStructure.startswith("Email"):
-                    userRecord = \
-                        UserModel(settingsModel=self.settingsModel,
-                                  email=userFolderName,
-                                  userNotFoundInMyTardis=True)
-                userRecord.SetDataViewId(usersDataViewId)
-                self.usersModel.AddRow(userRecord)
-                if shouldAbort():
-                    wx.CallAfter(wx.GetApp().GetMainFrame().SetStatusMessage,
-                                 "Data uploads canceled")
-                    return
-                self.ScanForDatasetFolders(os.path.join(dataDir,
-                                                        userFolderName),
-                                           userRecord, userFolderName)
-            if threading.current_thread().name == "MainThread":
-                incrementProgressDialog()
-            else:
-                wx.CallAfter(incrementProgressDialog)
+        else:
+            message = "Didn't find a MyTardis user record for folder " \
+                "\"%s\" in %s" % (userFolderName, dataDir)
+            logger.warning(message)
+            if folderStructure.startswith("Username"):
+                userRecord = UserModel(settingsModel=self.settingsModel,
+                                       username=userFolderName,
+                                       userNotFoundInMyTardis=True)
+            elif folderStructure.startswith("Email"):
+                userRecord = \
+                    UserModel(settingsModel=self.settingsModel,
+                              email=userFolderName,
+                              userNotFoundInMyTardis=True)
+            folderModels = self.ScanForDatasetFolders(userFolderPath,
+                                                      userRecord,
+                                                      userFolderName)
+        return (userRecord, folderModels)
 
     def ScanForGroupFolders(self, incrementProgressDialog, shouldAbort):
         dataDir = self.settingsModel.GetDataDirectory()
         groupFolderNames = os.walk(dataDir).next()[1]
-        for groupFolderName in groupFolderNames:
-            if shouldAbort():
-                wx.CallAfter(wx.GetApp().GetMainFrame().SetStatusMessage,
-                             "Data uploads canceled")
-                return
-            logger.debug("Found folder assumed to be user group name: " +
-                         groupFolderName)
-            groupsDataViewId = self.groupsModel.GetMaxDataViewId() + 1
-            try:
-                groupName = self.settingsModel.GetGroupPrefix() + \
-                    groupFolderName
-                groupRecord = \
-                    GroupModel.GetGroupByName(self.settingsModel,
-                                              groupName)
-            except DoesNotExist:
-                groupRecord = None
-                message = "Didn't find a MyTardis user group record for " \
-                    "folder \"%s\" in %s" % (groupFolderName,
-                                             dataDir)
-                logger.warning(message)
+        # Look up the default owner once, rather than in every scanning
+        # thread.
+        self.settingsModel.GetDefaultOwner()
+        for groupFolderName, (groupRecord, folderModels) in \
+                self.ScanFoldersInParallel(groupFolderNames,
+                                           self.ScanGroupFolder,
+                                           shouldAbort):
             if shouldAbort():
                 wx.CallAfter(wx.GetApp().GetMainFrame().SetStatusMessage,
                              "Data uploads canceled")
                 return
             if groupRecord:
-                groupRecord.SetDataViewId(groupsDataViewId)
+                groupRecord.SetDataViewId(
+                    self.groupsModel.GetMaxDataViewId() + 1)
                 self.groupsModel.AddRow(groupRecord)
-            self.ImportGroupFolders(os.path.join(dataDir,
-                                                 groupFolderName),
-                                    groupRecord)
-            if shouldAbort():
-                wx.CallAfter(wx.GetApp().GetMainFrame().SetStatusMessage,
-                             "Data uploads canceled")
-                return
+            self.AddScannedFolders(folderModels)
             if threading.current_thread().name == "MainThread":
                 incrementProgressDialog()
             else:
                 wx.CallAfter(incrementProgressDialog)
+        if shouldAbort():
+            wx.CallAfter(wx.GetApp().GetMainFrame().SetStatusMessage,
+                         "Data uploads canceled")
+
+    def ScanGroupFolder(self, groupFolderName):
+        """
+        Looks up the MyTardis group record for a group folder and scans
+        the group folder for dataset folders.  Like ScanUserFolder, this
+        doesn't add anything to the groups model or the folders model.
+
+        Returns (groupRecord, folderModels).
+        """
+        dataDir = self.settingsModel.GetDataDirectory()
+        logger.debug("Found folder assumed to be user group name: " +
+                     groupFolderName)
+        try:
+            groupName = self.settingsModel.GetGroupPrefix() + \
+                groupFolderName
+            groupRecord = \
+                GroupModel.GetGroupByName(self.settingsModel,
+                                          groupName)
+        except DoesNotExist:
+            groupRecord = None
+            message = "Didn't find a MyTardis user group record for " \
+                "folder \"%s\" in %s" % (groupFolderName,
+                                         dataDir)
+            logger.warning(message)
+        folderModels = self.ImportGroupFolders(os.path.join(dataDir,
+                                                            groupFolderName),
+                                               groupRecord)
+        return (groupRecord, folderModels)
+
+    def ScanFoldersInParallel(self, folderNames, scanFolder, shouldAbort):
+        """
+        Calls scanFolder(folderName) for each top-level (user or group)
+        folder, using a bounded pool of scanning threads, so that the
+        MyTardis lookups and file system walks for different folders can
+        overlap.  Yields (folderName, result) tuples in the same order as
+        folderNames, so that rows are added to the users, groups and
+        folders models in the same order as a serial scan would add them.
+        Exceptions raised by scanFolder are re-raised in the calling
+        thread, in the same order.
+        """
+        # The API client's connection pool is sized for this many
+        # threads (see ApiClient.GetPoolSize).
+        numScanThreads = min(len(folderNames),
+                             self.settingsModel.GetMaxUploadThreads())
+        tasksQueue = Queue.Queue()
+        for index, folderName in enumerate(folderNames):
+            tasksQueue.put((index, folderName))
+        results = {}
+        resultsCondition = threading.Condition()
+        stopScanning = threading.Event()
+
+        def scanWorker():
+            while not stopScanning.isSet() and not shouldAbort():
+                try:
+                    index, folderName = tasksQueue.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    result = (scanFolder(folderName), None)
+                except:
+                    result = (None, sys.exc_info())
+                with resultsCondition:
+                    results[index] = result
+                    resultsCondition.notify()
+
+        scanThreads = []
+        for i in range(numScanThreads):
+            t = threading.Thread(name="ScanFoldersThread-%d" % (i + 1),
+                                 target=scanWorker)
+            scanThreads.append(t)
+            t.start()
+        try:
+            for index, folderName in enumerate(folderNames):
+                with resultsCondition:
+                    while index not in results:
+                        if shouldAbort():
+                            return
+                        resultsCondition.wait(1)
+                    result, excInfo = results.pop(index)
+                if excInfo is not None:
+                    raise excInfo[0], excInfo[1], excInfo[2]
+                yield (folderName, result)
+        finally:
+            stopScanning.set()
+
+    def AddScannedFolders(self, folderModels):
+        for folderModel in folderModels:
+            folderModel.SetDataViewId(self.GetMaxDataViewId() + 1)
+            self.AddScannedFolder(folderModel)
 
     def ScanForDatasetFolders(self, pathToScan, owner, userFolderName):
+        folderModels = []
         try:
             logger.debug("Scanning " + pathToScan +
                          " for dataset folders...")
@@ -540,9 +631,8 @@ class FoldersModel(wx.dataview.PyDataViewIndexListModel):
                                self.ignoreIntervalUnit)
                         logger.warning(message)
                         continue
-                dataViewId = self.GetMaxDataViewId() + 1
                 folderModel = \
-                    FolderModel(dataViewId=dataViewId,
+                    FolderModel(dataViewId=None,
                                 folder=datasetFolderName,
                                 location=pathToScan,
                                 userFolderName=userFolderName,
@@ -552,38 +642,47 @@ class FoldersModel(wx.dataview.PyDataViewIndexListModel):
                                 usersModel=self.usersModel,
                                 settingsModel=self.settingsModel)
                 folderModel.SetCreatedDate()
-                if not owner.UserNotFoundInMyTardis():
-                    if owner.GetName().strip() != "":
-                        experimentTitle = "%s - %s" \
-                            % (self.settingsModel.GetInstrumentName(),
-                               owner.GetName())
-                    else:
-                        experimentTitle = "%s - %s" \
-                            % (self.settingsModel.GetInstrumentName(),
-                               owner.GetUsername())
-                elif owner.GetName() != UserModel.USER_NOT_FOUND_STRING:
-                    experimentTitle = "%s - %s (%s)" \
-                        % (self.settingsModel.GetInstrumentName(),
-                           owner.GetName(),
-                           UserModel.USER_NOT_FOUND_STRING)
-                elif owner.GetUsername() != UserModel.USER_NOT_FOUND_STRING:
-                    experimentTitle = "%s - %s (%s)" \
-                        % (self.settingsModel.GetInstrumentName(),
-                           owner.GetUsername(),
-                           UserModel.USER_NOT_FOUND_STRING)
-                elif owner.GetEmail() != UserModel.USER_NOT_FOUND_STRING:
-                    experimentTitle = "%s - %s (%s)" \
-                        % (self.settingsModel.GetInstrumentName(),
-                           owner.GetEmail(),
-                           UserModel.USER_NOT_FOUND_STRING)
-                else:
-                    experimentTitle = "%s - %s" \
-                        % (self.settingsModel.GetInstrumentName(),
-                            UserModel.USER_NOT_FOUND_STRING)
-                folderModel.SetExperimentTitle(experimentTitle)
-                self.AddRow(folderModel)
+                folderModel.SetExperimentTitle(
+                    self.GetDefaultExperimentTitle(owner))
+                folderModels.append(folderModel)
         except:
             print traceback.format_exc()
+        return folderModels
+
+    def GetDefaultExperimentTitle(self, owner):
+        """
+        The experiment title used for folder structures which don't
+        include an experiment folder.
+        """
+        if not owner.UserNotFoundInMyTardis():
+            if owner.GetName().strip() != "":
+                experimentTitle = "%s - %s" \
+                    % (self.settingsModel.GetInstrumentName(),
+                       owner.GetName())
+            else:
+                experimentTitle = "%s - %s" \
+                    % (self.settingsModel.GetInstrumentName(),
+                       owner.GetUsername())
+        elif owner.GetName() != UserModel.USER_NOT_FOUND_STRING:
+            experimentTitle = "%s - %s (%s)" \
+                % (self.settingsModel.GetInstrumentName(),
+                   owner.GetName(),
+                   UserModel.USER_NOT_FOUND_STRING)
+        elif owner.GetUsername() != UserModel.USER_NOT_FOUND_STRING:
+            experimentTitle = "%s - %s (%s)" \
+                % (self.settingsModel.GetInstrumentName(),
+                   owner.GetUsername(),
+                   UserModel.USER_NOT_FOUND_STRING)
+        elif owner.GetEmail() != UserModel.USER_NOT_FOUND_STRING:
+            experimentTitle = "%s - %s (%s)" \
+                % (self.settingsModel.GetInstrumentName(),
+                   owner.GetEmail(),
+                   UserModel.USER_NOT_FOUND_STRING)
+        else:
+            experimentTitle = "%s - %s" \
+                % (self.settingsModel.GetInstrumentName(),
+                    UserModel.USER_NOT_FOUND_STRING)
+        return experimentTitle
 
     def ScanForExperimentFolders(self, pathToScan, owner, userFolderName):
         """
@@ -593,6 +692,7 @@ class FoldersModel(wx.dataview.PyDataViewIndexListModel):
         <username>\mytardis\<experiment_title>\<dataset_name>
 
         """
+        folderModels = []
         expFolders = os.walk(pathToScan).next()[1]
         for expFolderName in expFolders:
             expFolderPath = os.path.join(pathToScan, expFolderName)
@@ -611,8 +711,7 @@ class FoldersModel(wx.dataview.PyDataViewIndexListModel):
                                self.ignoreIntervalUnit)
                         logger.warning(message)
                         continue
-                dataViewId = self.GetMaxDataViewId() + 1
-                folderModel = FolderModel(dataViewId=dataViewId,
+                folderModel = FolderModel(dataViewId=None,
                                           folder=datasetFolderName,
                                           location=expFolderPath,
                                           userFolderName=userFolderName,
@@ -623,13 +722,15 @@ class FoldersModel(wx.dataview.PyDataViewIndexListModel):
                                           settingsModel=self.settingsModel)
                 folderModel.SetCreatedDate()
                 folderModel.SetExperimentTitle(expFolderName)
-                self.AddRow(folderModel)
+                folderModels.append(folderModel)
+        return folderModels
 
     def ImportGroupFolders(self, groupFolderPath, groupModel):
         """
         Scan folders within a user group folder,
         e.g. D:\Data\Smith-Lab\
         """
+        folderModels = []
         try:
             logger.debug("Scanning " + groupFolderPath +
                          " for instrument folders...")
@@ -643,7 +744,7 @@ class FoldersModel(wx.dataview.PyDataViewIndexListModel):
                 message = "No instrument folder was found in %s" \
                     % groupFolderPath
                 logger.warning(message)
-                return
+                return folderModels
 
             # Rather than using any folder we happen to find at this level,
             # we will use the instrument name specified in MyData's Settings
@@ -656,7 +757,7 @@ class FoldersModel(wx.dataview.PyDataViewIndexListModel):
 
             if not os.path.exists(instrumentFolderPath):
                 logger.warning("Path %s doesn't exist." % instrumentFolderPath)
-                return
+                return folderModels
 
             # For the User Group / Instrument / Researcher's Name / Dataset
             # folder structure, the default owner in MyTardis will always
@@ -692,9 +793,8 @@ class FoldersModel(wx.dataview.PyDataViewIndexListModel):
                             logger.warning(message)
                             continue
                     groupFolderName = os.path.basename(groupFolderPath)
-                    dataViewId = self.GetMaxDataViewId() + 1
                     folderModel = \
-                        FolderModel(dataViewId=dataViewId,
+                        FolderModel(dataViewId=None,
                                     folder=datasetFolderName,
                                     location=userFolderPath,
                                     userFolderName=userFolderName,
@@ -708,11 +808,177 @@ class FoldersModel(wx.dataview.PyDataViewIndexListModel):
                     folderModel.SetExperimentTitle(
                         "%s - %s" % (self.settingsModel.GetInstrumentName(),
                                      userFolderName))
-                    self.AddRow(folderModel)
+                    folderModels.append(folderModel)
         except InvalidFolderStructure:
             raise
         except:
             logger.error(traceback.format_exc())
+        return folderModels
+
+    def GetFolderModelForPath(self, path):
+        """
+        Returns the FolderModel (dataset folder) containing the given
+        absolute path, or None if it isn't within a known dataset folder.
+        """
+        for folderModel in self.foldersData:
+            folderPath = folderModel.GetAbsolutePath()
+            if path.startswith(folderPath + os.sep):
+                return folderModel
+        return None
+
+    def GetOwnerForUserFolder(self, userFolderName):
+        """
+        Looks for the owner of a user folder amongst the dataset folders
+        which have already been scanned, and only asks MyTardis if this
+        is a new user folder.
+        """
+        if userFolderName in self.ownersForNewUserFolders:
+            return self.ownersForNewUserFolders[userFolderName]
+        for folderModel in self.foldersData:
+            if folderModel.GetUserFolderName() == userFolderName and \
+                    folderModel.GetGroupFolderName() is None:
+                return folderModel.GetOwner()
+        folderStructure = self.settingsModel.GetFolderStructure()
+        try:
+            if folderStructure.startswith("Username"):
+                userRecord = \
+                    UserModel.GetUserByUsername(self.settingsModel,
+                                                userFolderName)
+            else:
+                userRecord = \
+                    UserModel.GetUserByEmail(self.settingsModel,
+                                             userFolderName)
+        except DoesNotExist:
+            message = "Didn't find a MyTardis user record for folder " \
+                "\"%s\"" % userFolderName
+            logger.warning(message)
+            if folderStructure.startswith("Username"):
+                userRecord = UserModel(settingsModel=self.settingsModel,
+                                       username=userFolderName,
+                                       userNotFoundInMyTardis=True)
+            else:
+                userRecord = UserModel(settingsModel=self.settingsModel,
+                                       email=userFolderName,
+                                       userNotFoundInMyTardis=True)
+        userRecord.SetDataViewId(self.usersModel.GetMaxDataViewId() + 1)
+        self.usersModel.AddRow(userRecord)
+        self.ownersForNewUserFolders[userFolderName] = userRecord
+        return userRecord
+
+    def GetGroupForGroupFolder(self, groupFolderName):
+        if groupFolderName in self.groupsForNewGroupFolders:
+            return self.groupsForNewGroupFolders[groupFolderName]
+        for folderModel in self.foldersData:
+            if folderModel.GetGroupFolderName() == groupFolderName:
+                return folderModel.GetGroup()
+        try:
+            groupName = self.settingsModel.GetGroupPrefix() + groupFolderName
+            groupRecord = GroupModel.GetGroupByName(self.settingsModel,
+                                                    groupName)
+        except DoesNotExist:
+            message = "Didn't find a MyTardis user group record for " \
+                "folder \"%s\"" % groupFolderName
+            logger.warning(message)
+            groupRecord = None
+        if groupRecord is not None:
+            groupRecord.SetDataViewId(self.groupsModel.GetMaxDataViewId() + 1)
+            self.groupsModel.AddRow(groupRecord)
+        self.groupsForNewGroupFolders[groupFolderName] = groupRecord
+        return groupRecord
+
+    def ImportDatasetFolderForPath(self, path):
+        """
+        Adds the dataset folder containing the given path, if the folder
+        has appeared in the data directory since it was scanned (e.g.
+        reported by the data directory watcher), following the same
+        folder structure rules as ScanForUserFolders and
+        ScanForGroupFolders.
+
+        Returns the new FolderModel, or None if the path isn't within a
+        dataset folder in the configured folder structure.
+        """
+        dataDir = self.settingsModel.GetDataDirectory()
+        folderStructure = self.settingsModel.GetFolderStructure()
+        relativePath = os.path.relpath(path, dataDir)
+        if relativePath.startswith(os.pardir):
+            return None
+        components = relativePath.split(os.sep)
+        if len(components) < 2:
+            return None
+        groupFolderName = None
+        group = None
+        if folderStructure.startswith("Username") or \
+                folderStructure.startswith("Email"):
+            userFolderName = components[0]
+            owner = self.GetOwnerForUserFolder(userFolderName)
+            # Like ScanForUserFolders, dataset folders of users who
+            # weren't found in MyTardis are expected to be direct
+            # children of the user folder.
+            if owner.UserNotFoundInMyTardis() or \
+                    folderStructure in ('Username / Dataset',
+                                        'Email / Dataset'):
+                datasetDepth = 2
+            elif folderStructure == \
+                    'Username / "MyTardis" / Experiment / Dataset':
+                if components[1].lower() != "mytardis":
+                    return None
+                datasetDepth = 4
+            else:
+                datasetDepth = 3
+            # The path must be a data file (or subdirectory) within the
+            # dataset folder, not the dataset folder itself.
+            if len(components) <= datasetDepth:
+                return None
+            if datasetDepth == 2:
+                experimentTitle = self.GetDefaultExperimentTitle(owner)
+            else:
+                experimentTitle = components[datasetDepth - 2]
+        elif folderStructure.startswith("User Group"):
+            datasetDepth = 4
+            if len(components) <= datasetDepth or \
+                    components[1] != self.settingsModel.GetInstrumentName():
+                return None
+            groupFolderName = components[0]
+            userFolderName = components[2]
+            group = self.GetGroupForGroupFolder(groupFolderName)
+            owner = self.settingsModel.GetDefaultOwner()
+            experimentTitle = "%s - %s" \
+                % (self.settingsModel.GetInstrumentName(), userFolderName)
+        else:
+            raise InvalidFolderStructure("Unknown folder structure.")
+        datasetFolderPath = os.path.join(dataDir,
+                                         *components[:datasetDepth])
+        datasetFolderName = components[datasetDepth - 1]
+        # Like the scan methods, using the ignore interval calculated by
+        # the last call to ScanFolders.
+        if getattr(self, "ignoreOldDatasets", False):
+            ctimestamp = os.path.getctime(datasetFolderPath)
+            ctime = datetime.fromtimestamp(ctimestamp)
+            age = datetime.now() - ctime
+            if age.total_seconds() > self.ignoreIntervalSeconds:
+                message = "Ignoring \"%s\", because it is " \
+                    "older than %d %s" \
+                    % (datasetFolderPath, self.ignoreIntervalNumber,
+                       self.ignoreIntervalUnit)
+                logger.warning(message)
+                return None
+        logger.debug("Importing new dataset folder: " + datasetFolderPath)
+        folderModel = \
+            FolderModel(dataViewId=self.GetMaxDataViewId() + 1,
+                        folder=datasetFolderName,
+                        location=os.path.dirname(datasetFolderPath),
+                        userFolderName=userFolderName,
+                        groupFolderName=groupFolderName,
+                        owner=owner,
+                        foldersModel=self,
+                        usersModel=self.usersModel,
+                        settingsModel=self.settingsModel)
+        if group is not None:
+            folderModel.SetGroup(group)
+        folderModel.SetCreatedDate()
+        folderModel.SetExperimentTitle(experimentTitle)
+        self.AddRow(folderModel)
+        return folderModel
 
     def GetTotalNumFiles(self):
         total = 0
@@ -3,20 +3,21 @@ import os
 import threading
 
 from mydata.models.group import GroupModel
+from mydata.dataviewmodels.rowstore import RowStoreModel
+from mydata.dataviewmodels.rowstore import RowList
 from mydata.logs import logger
 
 
-class GroupsModel(wx.dataview.PyDataViewIndexListModel):
+class GroupsModel(RowStoreModel):
 
     def __init__(self, settingsModel):
 
         self.settingsModel = settingsModel
         self.foldersModel = None
 
-        self.groupsData = list()
+        self.groupsData = RowList()
 
-        wx.dataview.PyDataViewIndexListModel.__init__(self,
-                                                      len(self.groupsData))
+        RowStoreModel.__init__(self, self.groupsData)
 
         self.unfilteredGroupsData = self.groupsData
         self.filteredGroupsData = list()
@@ -27,11 +28,6 @@ class GroupsModel(wx.dataview.PyDataViewIndexListModel):
         self.columnKeys = ("dataViewId", "shortName", "name")
         self.defaultColumnWidths = (40, 200, 400)
 
-        # This is the largest ID value which has been used in this model.
-        # It may no longer exist, i.e. if we delete the row with the
-        # largest ID, we don't decrement the maximum ID.
-        self.maxDataViewId = 0
-
     def SetFoldersModel(self, foldersModel):
         self.foldersModel = foldersModel
 
@@ -223,21 +219,10 @@ class GroupsModel(wx.dataview.PyDataViewIndexListModel):
                 return self.unfilteredGroupsData[row]
         return None
 
-    def GetMaxDataViewIdFromExistingRows(self):
-        maxDataViewId = 0
-        for row in range(0, self.GetCount()):
-            if self.groupsData[row].GetDataViewId() > maxDataViewId:
-                maxDataViewId = self.groupsData[row].GetDataViewId()
-        return maxDataViewId
-
-    def GetMaxDataViewId(self):
-        if self.GetMaxDataViewIdFromExistingRows() > self.maxDataViewId:
-            self.maxDataViewId = self.GetMaxDataViewIdFromExistingRows()
-        return self.maxDataViewId
-
     def AddRow(self, value):
         self.Filter("")
         self.groupsData.append(value)
+        self.IndexAppendedRow(value)
         # Notify views
         if threading.current_thread().name == "MainThread":
             self.RowAppended()
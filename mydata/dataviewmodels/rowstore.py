@@ -0,0 +1,239 @@
+"""
+mydata/dataviewmodels/rowstore.py
+
+The purpose of this module is to provide a common base class for MyData's
+list-only data view models (folders, users, groups, verifications, uploads
+and tasks), which keeps track of which row each record is in, so that
+progress and status updates from worker threads can find the row to
+refresh without scanning every row.
+
+Subclasses keep their records in their own RowList (e.g.
+self.uploadsData), which they pass to RowStoreModel.__init__, and which
+they must only modify in place, never reassign.  RowList counts the
+changes made to it, so the index knows when it is out of date.
+Appending a record (in AddRow) updates the index incrementally.  Other
+changes, such as deleting rows or filtering, move records to different
+rows, so the index is rebuilt (once) the next time it is used after such
+a change.  Looking up a record which isn't in the list (e.g. because it
+has been filtered out or deleted) doesn't rebuild the index.
+
+Worker threads don't notify the data view about changed values directly.
+Instead, they mark the changed cells as dirty (see MarkCellDirty), and a
+timer on the main thread (see MyData.OnGuiRefreshTimer) periodically
+calls FlushDirtyCells, so that many progress updates for the same cell
+only result in one redraw, and the wx event queue isn't flooded with
+RowValueChanged calls while large files are being uploaded.
+
+StatusCounter keeps track of how many of a model's records have each
+status, so that e.g. the number of completed uploads can be checked
+after every upload without iterating over all of the rows.
+"""
+import threading
+import traceback
+
+import wx.dataview
+
+from mydata.logs import logger
+
+
+class StatusCounter():
+    """
+    Counts the records attached to this counter by the value of one of
+    their attributes (e.g. "status").  Attached records must change that
+    attribute by calling SetValue, so that the counts stay up to date.
+    Records which are detached (e.g. because their rows were deleted)
+    can still change their value, without affecting the counts.
+    """
+    def __init__(self, attr):
+        self.attr = attr
+        self.counts = {}
+        self.total = 0
+        self.recordIds = set()
+        self.lock = threading.Lock()
+
+    def Attach(self, record):
+        with self.lock:
+            if id(record) in self.recordIds:
+                return
+            self.recordIds.add(id(record))
+            value = getattr(record, self.attr)
+            self.counts[value] = self.counts.get(value, 0) + 1
+            self.total += 1
+
+    def Detach(self, record):
+        with self.lock:
+            if id(record) not in self.recordIds:
+                return
+            self.recordIds.remove(id(record))
+            value = getattr(record, self.attr)
+            self.counts[value] -= 1
+            self.total -= 1
+
+    def Reset(self):
+        with self.lock:
+            self.counts = {}
+            self.total = 0
+            self.recordIds = set()
+
+    def SetValue(self, record, value):
+        with self.lock:
+            if id(record) in self.recordIds:
+                oldValue = getattr(record, self.attr)
+                self.counts[oldValue] -= 1
+                self.counts[value] = self.counts.get(value, 0) + 1
+            setattr(record, self.attr, value)
+
+    def GetCount(self, value):
+        return self.counts.get(value, 0)
+
+    def GetTotal(self):
+        return self.total
+
+
+class RowList(list):
+    """
+    A list which counts the changes made to it (in self.version).
+    """
+    def __init__(self, *args):
+        list.__init__(self, *args)
+        self.version = 0
+
+    def Changed(method):
+        def ChangeAndCount(self, *args):
+            self.version += 1
+            return method(self, *args)
+        return ChangeAndCount
+
+    append = Changed(list.append)
+    extend = Changed(list.extend)
+    insert = Changed(list.insert)
+    remove = Changed(list.remove)
+    pop = Changed(list.pop)
+    sort = Changed(list.sort)
+    reverse = Changed(list.reverse)
+    __setitem__ = Changed(list.__setitem__)
+    __delitem__ = Changed(list.__delitem__)
+    __setslice__ = Changed(list.__setslice__)
+    __delslice__ = Changed(list.__delslice__)
+    __iadd__ = Changed(list.__iadd__)
+    __imul__ = Changed(list.__imul__)
+    del Changed
+
+
+class RowStoreModel(wx.dataview.PyDataViewIndexListModel):
+    def __init__(self, rowsData):
+        wx.dataview.PyDataViewIndexListModel.__init__(self, len(rowsData))
+        self.rowsData = rowsData
+        self.rowsByRecord = {}
+        self.rowsByDataViewId = {}
+        # The rowsData.version which the index is up to date with.
+        self.indexVersion = None
+        self.indexLock = threading.Lock()
+
+        # This is the largest ID value which has been used in this model.
+        # It may no longer exist, i.e. if we delete the row with the
+        # largest ID, we don't decrement the maximum ID.
+        self.maxDataViewId = 0
+
+        # Cells which have been changed by worker threads, but not yet
+        # refreshed in the data view, keyed by id(record).
+        self.dirtyCells = {}
+        self.dirtyLock = threading.Lock()
+
+    def IndexAppendedRow(self, record):
+        """
+        Should be called by the subclass's AddRow method, after appending
+        the record.
+        """
+        with self.indexLock:
+            row = len(self.rowsData) - 1
+            # If anything else has changed since the index was last
+            # updated, it will be rebuilt when it is next used instead.
+            if row >= 0 and self.rowsData[row] is record and \
+                    self.indexVersion == self.rowsData.version - 1:
+                self.rowsByRecord[id(record)] = row
+                self.rowsByDataViewId[record.GetDataViewId()] = row
+                self.indexVersion = self.rowsData.version
+            if record.GetDataViewId() > self.maxDataViewId:
+                self.maxDataViewId = record.GetDataViewId()
+
+    def ReindexRows(self):
+        """
+        Should be called with self.indexLock acquired.
+        """
+        self.rowsByRecord = {}
+        self.rowsByDataViewId = {}
+        self.indexVersion = self.rowsData.version
+        for row, record in enumerate(self.rowsData):
+            self.rowsByRecord[id(record)] = row
+            self.rowsByDataViewId[record.GetDataViewId()] = row
+
+    def UpdateIndex(self):
+        """
+        Should be called with self.indexLock acquired.
+        """
+        if self.indexVersion != self.rowsData.version:
+            self.ReindexRows()
+
+    def GetRowForRecord(self, record):
+        """
+        Returns the row containing the record, or None if the record isn't
+        currently displayed (e.g. it has been deleted or filtered out).
+        """
+        with self.indexLock:
+            self.UpdateIndex()
+            row = self.rowsByRecord.get(id(record))
+            if row is not None and (row >= len(self.rowsData) or
+                                    self.rowsData[row] is not record):
+                # The list changed while the index was being rebuilt.
+                self.ReindexRows()
+                row = self.rowsByRecord.get(id(record))
+            return row
+
+    def GetRowForDataViewId(self, dataViewId):
+        """
+        Returns the row containing the record with the given data view ID,
+        or None if there is no such record currently displayed.
+        """
+        with self.indexLock:
+            self.UpdateIndex()
+            row = self.rowsByDataViewId.get(dataViewId)
+            if row is not None and (
+                    row >= len(self.rowsData) or
+                    self.rowsData[row].GetDataViewId() != dataViewId):
+                # The list changed while the index was being rebuilt.
+                self.ReindexRows()
+                row = self.rowsByDataViewId.get(dataViewId)
+            return row
+
+    def GetMaxDataViewId(self):
+        return self.maxDataViewId
+
+    def MarkCellDirty(self, record, col):
+        """
+        Can be called from any thread.  Doesn't call any wx methods.
+        """
+        with self.dirtyLock:
+            if id(record) in self.dirtyCells:
+                self.dirtyCells[id(record)][1].add(col)
+            else:
+                self.dirtyCells[id(record)] = (record, set([col]))
+
+    def FlushDirtyCells(self):
+        """
+        Should only be called from the main thread.  Refreshes all of the
+        cells which have been marked as dirty since the last flush.
+        """
+        with self.dirtyLock:
+            dirtyCells = self.dirtyCells
+            self.dirtyCells = {}
+        for record, cols in dirtyCells.itervalues():
+            row = self.GetRowForRecord(record)
+            if row is None:
+                continue
+            for col in sorted(cols):
+                try:
+                    if row < self.GetCount():
+                        self.RowValueChanged(row, col)
+                except:
+                    logger.debug(traceback.format_exc())
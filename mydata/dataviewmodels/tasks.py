@@ -6,17 +6,18 @@ import wx.dataview
 
 from mydata.models.task import TaskModel
 from mydata.utils.notification import Notification
+from mydata.dataviewmodels.rowstore import RowStoreModel
+from mydata.dataviewmodels.rowstore import RowList
 from mydata.logs import logger
 
 
-class TasksModel(wx.dataview.PyDataViewIndexListModel):
+class TasksModel(RowStoreModel):
     def __init__(self, settingsModel):
         self.settingsModel = settingsModel
 
-        self.tasksData = list()
+        self.tasksData = RowList()
 
-        wx.dataview.PyDataViewIndexListModel.__init__(self,
-                                                      len(self.tasksData))
+        RowStoreModel.__init__(self, self.tasksData)
 
         self.unfilteredTasksData = self.tasksData
         self.filteredTasksData = list()
@@ -29,11 +30,6 @@ class TasksModel(wx.dataview.PyDataViewIndexListModel):
                            "scheduleType", "intervalMinutes")
         self.defaultColumnWidths = (40, 300, 200, 200, 100, 100)
 
-        # This is the largest ID value which has been used in this model.
-        # It may no longer exist, i.e. if we delete the row with the
-        # largest ID, we don't decrement the maximum ID.
-        self.maxDataViewId = 0
-
     def Filter(self, searchString):
         self.searchString = searchString
         q = self.searchString.lower()
@@ -239,28 +235,17 @@ class TasksModel(wx.dataview.PyDataViewIndexListModel):
                 return self.unfilteredTasksData[row]
         return None
 
-    def GetMaxDataViewIdFromExistingRows(self):
-        maxDataViewId = 0
-        for row in range(0, self.GetCount()):
-            if self.tasksData[row].GetDataViewId() > maxDataViewId:
-                maxDataViewId = self.tasksData[row].GetDataViewId()
-        return maxDataViewId
-
-    def GetMaxDataViewId(self):
-        if self.GetMaxDataViewIdFromExistingRows() > self.maxDataViewId:
-            self.maxDataViewId = self.GetMaxDataViewIdFromExistingRows()
-        return self.maxDataViewId
-
     def AddRow(self, taskModel):
         self.Filter("")
         self.tasksData.append(taskModel)
+        self.IndexAppendedRow(taskModel)
         # Notify views
         if threading.current_thread().name == "MainThread":
             self.RowAppended()
         else:
             wx.CallAfter(self.RowAppended)
 
-        def jobFunc(taskModel, tasksModel, row, col):
+        def jobFunc(taskModel, tasksModel, col):
 
             def taskJobFunc():
                 assert callable(taskModel.GetJobFunc())
@@ -272,7 +257,11 @@ class TasksModel(wx.dataview.PyDataViewIndexListModel):
                 title = "Finished"
                 message = taskModel.GetJobDesc()
                 Notification.notify(message, title=title)
-                wx.CallAfter(tasksModel.RowValueChanged, row, col)
+                # Rows may have been added or deleted since the task was
+                # scheduled.
+                row = tasksModel.GetRowForRecord(taskModel)
+                if row is not None:
+                    wx.CallAfter(tasksModel.RowValueChanged, row, col)
                 scheduleType = taskModel.GetScheduleType()
                 if scheduleType == "Timer":
                     intervalMinutes = taskModel.GetIntervalMinutes()
@@ -321,7 +310,6 @@ class TasksModel(wx.dataview.PyDataViewIndexListModel):
             logger.debug("Starting task %s" % taskModel.GetJobDesc())
             thread.start()
 
-        row = len(self.tasksData) - 1
         col = self.columnKeys.index("finishTime")
         delta = taskModel.GetStartTime() - datetime.now()
         millis = delta.total_seconds() * 1000
@@ -332,7 +320,7 @@ class TasksModel(wx.dataview.PyDataViewIndexListModel):
                 raise Exception("Scheduled time for task ID %d "
                                 "is in the past."
                                 % taskModel.GetDataViewId())
-        args = [taskModel, self, row, col]
+        args = [taskModel, self, col]
 
         def scheduleTask():
             callLater = wx.CallLater(millis, jobFunc, *args)
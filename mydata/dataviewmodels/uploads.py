@@ -4,6 +4,9 @@ import traceback
 
 from mydata.models.upload import UploadModel
 from mydata.models.upload import UploadStatus
+from mydata.dataviewmodels.rowstore import RowStoreModel
+from mydata.dataviewmodels.rowstore import RowList
+from mydata.dataviewmodels.rowstore import StatusCounter
 from mydata.logs import logger
 from mydata.media import MyDataIcons
 from mydata.media import IconStyle
@@ -15,12 +18,15 @@ class ColumnType:
     PROGRESS = 2
 
 
-class UploadsModel(wx.dataview.PyDataViewIndexListModel):
+class UploadsModel(RowStoreModel):
     def __init__(self):
-        self.uploadsData = []
+        self.uploadsData = RowList()
 
-        wx.dataview.PyDataViewIndexListModel.__init__(self,
-                                                      len(self.uploadsData))
+        RowStoreModel.__init__(self, self.uploadsData)
+
+        # Counts all uploads in this model (including any which have
+        # been filtered out of the view) by status:
+        self.statusCounter = StatusCounter("status")
 
         # Unfiltered uploads data:
         self.uud = self.uploadsData
@@ -39,10 +45,6 @@ class UploadsModel(wx.dataview.PyDataViewIndexListModel):
                             ColumnType.BITMAP, ColumnType.PROGRESS,
                             ColumnType.TEXT)
 
-        # This is the largest ID value which has been used in this model.
-        # It may no longer exist, i.e. if we delete the row with the
-        # largest ID, we don't decrement the maximum ID.
-        self.maxDataViewId = 0
 
         self.inProgressIcon = MyDataIcons.GetIcon("Refresh", size="16x16")
         self.completedIcon = MyDataIcons.GetIcon("Apply", size="16x16")
@@ -226,6 +228,7 @@ class UploadsModel(wx.dataview.PyDataViewIndexListModel):
             logger.debug("DeleteRows: Canceling upload: " +
                          self.uploadsData[row].GetRelativePathToUpload())
             self.uploadsData[row].Cancel()
+            self.statusCounter.Detach(self.uploadsData[row])
             del self.uploadsData[row]
             del self.uud[row]
 
@@ -242,6 +245,7 @@ class UploadsModel(wx.dataview.PyDataViewIndexListModel):
         for row in range(0, self.GetRowCount()):
             if self.uploadsData[row].GetFolderModel() == folderModel and \
                     self.uploadsData[row].GetDataFileIndex() == dataFileIndex:
+                self.statusCounter.Detach(self.uploadsData[row])
                 del self.uploadsData[row]
                 del self.uud[row]
                 # Notify the view(s) using this model that it has been removed
@@ -274,24 +278,16 @@ class UploadsModel(wx.dataview.PyDataViewIndexListModel):
         self.filtered = False
         self.searchString = ""
         self.maxDataViewId = 0
-
-    def GetMaxDataViewIdFromExistingRows(self):
-        maxDataViewId = 0
-        for row in range(0, self.GetCount()):
-            if self.uploadsData[row].GetDataViewId() > maxDataViewId:
-                maxDataViewId = self.uploadsData[row].GetDataViewId()
-        return maxDataViewId
-
-    def GetMaxDataViewId(self):
-        if self.GetMaxDataViewIdFromExistingRows() > self.maxDataViewId:
-            self.maxDataViewId = self.GetMaxDataViewIdFromExistingRows()
-        return self.maxDataViewId
+        self.statusCounter.Reset()
 
     def GetUploadModel(self, row):
         return self.uploadsData[row]
 
     def AddRow(self, value):
+        value.SetStatusCounter(self.statusCounter)
+        self.statusCounter.Attach(value)
         self.uploadsData.append(value)
+        self.IndexAppendedRow(value)
         # Notify views
         if threading.current_thread().name == "MainThread":
             self.RowAppended()
@@ -328,58 +324,46 @@ class UploadsModel(wx.dataview.PyDataViewIndexListModel):
     def UploadFileSizeUpdated(self, uploadModel):
         if uploadModel.Canceled():
             return
-        for row in range(0, self.GetCount()):
-            # Uploads could be in the process of being canceled:
-            if row >= self.GetCount():
-                break
-            if self.uploadsData[row] == uploadModel:
-                col = self.columnNames.index("File Size")
-                if threading.current_thread().name == "MainThread":
-                    self.TryRowValueChanged(row, col)
-                else:
-                    wx.CallAfter(self.TryRowValueChanged, row, col)
+        col = self.columnNames.index("File Size")
+        if threading.current_thread().name == "MainThread":
+            row = self.GetRowForRecord(uploadModel)
+            if row is not None:
+                self.TryRowValueChanged(row, col)
+        else:
+            self.MarkCellDirty(uploadModel, col)
 
     def UploadProgressUpdated(self, uploadModel):
         if uploadModel.Canceled():
             return
-        for row in range(0, self.GetCount()):
-            # Uploads could be in the process of being canceled:
-            if row >= self.GetCount():
-                break
-            if self.uploadsData[row] == uploadModel:
-                col = self.columnNames.index("Progress")
-                if threading.current_thread().name == "MainThread":
-                    self.TryRowValueChanged(row, col)
-                else:
-                    wx.CallAfter(self.TryRowValueChanged, row, col)
+        col = self.columnNames.index("Progress")
+        if threading.current_thread().name == "MainThread":
+            row = self.GetRowForRecord(uploadModel)
+            if row is not None:
+                self.TryRowValueChanged(row, col)
+        else:
+            self.MarkCellDirty(uploadModel, col)
 
     def UploadStatusUpdated(self, uploadModel):
         if uploadModel.Canceled():
             return
-        for row in range(0, self.GetCount()):
-            # Uploads could be in the process of being canceled:
-            if row >= self.GetCount():
-                break
-            if self.uploadsData[row] == uploadModel:
-                col = self.columnNames.index("Status")
-                if threading.current_thread().name == "MainThread":
-                    self.TryRowValueChanged(row, col)
-                else:
-                    wx.CallAfter(self.TryRowValueChanged, row, col)
+        col = self.columnNames.index("Status")
+        if threading.current_thread().name == "MainThread":
+            row = self.GetRowForRecord(uploadModel)
+            if row is not None:
+                self.TryRowValueChanged(row, col)
+        else:
+            self.MarkCellDirty(uploadModel, col)
 
     def UploadMessageUpdated(self, uploadModel):
         if uploadModel.Canceled():
             return
-        for row in range(0, self.GetCount()):
-            # Uploads could be in the process of being canceled:
-            if row >= self.GetCount():
-                break
-            if self.uploadsData[row] == uploadModel:
-                col = self.columnNames.index("Message")
-                if threading.current_thread().name == "MainThread":
-                    self.TryRowValueChanged(row, col)
-                else:
-                    wx.CallAfter(self.TryRowValueChanged, row, col)
+        col = self.columnNames.index("Message")
+        if threading.current_thread().name == "MainThread":
+            row = self.GetRowForRecord(uploadModel)
+            if row is not None:
+                self.TryRowValueChanged(row, col)
+        else:
+            self.MarkCellDirty(uploadModel, col)
 
     def CancelRemaining(self):
         app = wx.GetApp()
@@ -398,6 +382,7 @@ class UploadsModel(wx.dataview.PyDataViewIndexListModel):
         self.GetMaxDataViewId()
         for row in reversed(rowsToDelete):
             self.uploadsData[row].Cancel()
+            self.statusCounter.Detach(self.uploadsData[row])
             del self.uploadsData[row]
             del self.uud[row]
         if threading.current_thread().name == "MainThread":
@@ -408,18 +393,16 @@ class UploadsModel(wx.dataview.PyDataViewIndexListModel):
         self.fud = list()
         self.filtered = False
         self.searchString = ""
-        self.maxDataViewId = 0
 
     def GetCompletedCount(self):
-        completedCount = 0
-        for row in range(0, self.GetRowCount()):
-            if self.uploadsData[row].GetStatus() == UploadStatus.COMPLETED:
-                completedCount += 1
-        return completedCount
+        return self.statusCounter.GetCount(UploadStatus.COMPLETED)
 
     def GetFailedCount(self):
-        failedCount = 0
-        for row in range(0, self.GetRowCount()):
-            if self.uploadsData[row].GetStatus() == UploadStatus.FAILED:
-                failedCount += 1
-        return failedCount
+        return self.statusCounter.GetCount(UploadStatus.FAILED)
+
+    def GetTotalCount(self):
+        """
+        Unlike GetRowCount, this includes uploads which have been
+        filtered out of the view.
+        """
+        return self.statusCounter.GetTotal()
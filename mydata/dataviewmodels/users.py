@@ -4,22 +4,23 @@ import threading
 
 from mydata.models.user import UserModel
 from mydata.models.group import GroupModel
+from mydata.dataviewmodels.rowstore import RowStoreModel
+from mydata.dataviewmodels.rowstore import RowList
 from mydata.logs import logger
 from mydata.utils.exceptions import DoesNotExist
 from mydata.utils.exceptions import InvalidFolderStructure
 
 
-class UsersModel(wx.dataview.PyDataViewIndexListModel):
+class UsersModel(RowStoreModel):
 
     def __init__(self, settingsModel):
 
         self.settingsModel = settingsModel
         self.foldersModel = None
 
-        self.usersData = list()
+        self.usersData = RowList()
 
-        wx.dataview.PyDataViewIndexListModel.__init__(self,
-                                                      len(self.usersData))
+        RowStoreModel.__init__(self, self.usersData)
 
         self.unfilteredUsersData = self.usersData
         self.filteredUsersData = list()
@@ -30,11 +31,6 @@ class UsersModel(wx.dataview.PyDataViewIndexListModel):
         self.columnKeys = ("dataViewId", "username", "name", "email")
         self.defaultColumnWidths = (40, 100, 200, 260)
 
-        # This is the largest ID value which has been used in this model.
-        # It may no longer exist, i.e. if we delete the row with the
-        # largest ID, we don't decrement the maximum ID.
-        self.maxDataViewId = 0
-
     def SetFoldersModel(self, foldersModel):
         self.foldersModel = foldersModel
 
@@ -238,21 +234,10 @@ class UsersModel(wx.dataview.PyDataViewIndexListModel):
                 return self.unfilteredUsersData[row]
         return None
 
-    def GetMaxDataViewIdFromExistingRows(self):
-        maxDataViewId = 0
-        for row in range(0, self.GetCount()):
-            if self.usersData[row].GetDataViewId() > maxDataViewId:
-                maxDataViewId = self.usersData[row].GetDataViewId()
-        return maxDataViewId
-
-    def GetMaxDataViewId(self):
-        if self.GetMaxDataViewIdFromExistingRows() > self.maxDataViewId:
-            self.maxDataViewId = self.GetMaxDataViewIdFromExistingRows()
-        return self.maxDataViewId
-
     def AddRow(self, value):
         self.Filter("")
         self.usersData.append(value)
+        self.IndexAppendedRow(value)
         # Notify views
         if threading.current_thread().name == "MainThread":
             self.RowAppended()
@@ -8,20 +8,26 @@ import traceback
 from mydata.models.verification import VerificationModel
 from mydata.models.verification import VerificationStatus
 from mydata.dataviewmodels.uploads import ColumnType
+from mydata.dataviewmodels.rowstore import RowStoreModel
+from mydata.dataviewmodels.rowstore import RowList
+from mydata.dataviewmodels.rowstore import StatusCounter
 from mydata.logs import logger
 
 
-class VerificationsModel(wx.dataview.PyDataViewIndexListModel):
+class VerificationsModel(RowStoreModel):
 
     def __init__(self):
 
         self.foldersModel = None
 
-        self.verificationsData = list()
+        self.verificationsData = RowList()
 
-        wx.dataview.PyDataViewIndexListModel\
-            .__init__(self,
-                      len(self.verificationsData))
+        RowStoreModel.__init__(self, self.verificationsData)
+
+        # Count all verifications in this model (including any which have
+        # been filtered out of the view) by status and by completeness:
+        self.statusCounter = StatusCounter("status")
+        self.completeCounter = StatusCounter("complete")
 
         # Unfiltered verifications data:
         self.uvd = self.verificationsData
@@ -38,11 +44,6 @@ class VerificationsModel(wx.dataview.PyDataViewIndexListModel):
         self.columnTypes = (ColumnType.TEXT, ColumnType.TEXT, ColumnType.TEXT,
                             ColumnType.TEXT, ColumnType.TEXT)
 
-        # This is the largest ID value which has been used in this model.
-        # It may no longer exist, i.e. if we delete the row with the
-        # largest ID, we don't decrement the maximum ID.
-        self.maxDataViewId = 0
-
     def SetFoldersModel(self, foldersModel):
         self.foldersModel = foldersModel
 
@@ -202,6 +203,8 @@ class VerificationsModel(wx.dataview.PyDataViewIndexListModel):
         rows.sort(reverse=True)
 
         for row in rows:
+            self.statusCounter.Detach(self.verificationsData[row])
+            self.completeCounter.Detach(self.verificationsData[row])
             del self.verificationsData[row]
             del self.uvd[row]
 
@@ -228,22 +231,16 @@ class VerificationsModel(wx.dataview.PyDataViewIndexListModel):
         self.filtered = False
         self.searchString = ""
         self.maxDataViewId = 0
-
-    def GetMaxDataViewIdFromExistingRows(self):
-        maxDataViewId = 0
-        for row in range(0, self.GetCount()):
-            if self.verificationsData[row].GetDataViewId() > maxDataViewId:
-                maxDataViewId = self.verificationsData[row].GetDataViewId()
-        return maxDataViewId
-
-    def GetMaxDataViewId(self):
-        if self.GetMaxDataViewIdFromExistingRows() > self.maxDataViewId:
-            self.maxDataViewId = self.GetMaxDataViewIdFromExistingRows()
-        return self.maxDataViewId
+        self.statusCounter.Reset()
+        self.completeCounter.Reset()
 
     def AddRow(self, value):
         self.Filter("")
+        value.SetCounters(self.statusCounter, self.completeCounter)
+        self.statusCounter.Attach(value)
+        self.completeCounter.Attach(value)
         self.verificationsData.append(value)
+        self.IndexAppendedRow(value)
         # Notify views
         if threading.current_thread().name == "MainThread":
             self.RowAppended()
@@ -267,59 +264,30 @@ class VerificationsModel(wx.dataview.PyDataViewIndexListModel):
             logger.debug(traceback.format_exc())
 
     def VerificationMessageUpdated(self, verificationModel):
-        for row in range(0, self.GetCount()):
-            if row >= self.GetCount():
-                break
-            if self.verificationsData[row] == verificationModel:
-                col = self.columnNames.index("Message")
-                if threading.current_thread().name == "MainThread":
-                    self.TryRowValueChanged(row, col)
-                else:
-                    wx.CallAfter(self.TryRowValueChanged, row, col)
+        col = self.columnNames.index("Message")
+        if threading.current_thread().name == "MainThread":
+            row = self.GetRowForRecord(verificationModel)
+            if row is not None:
+                self.TryRowValueChanged(row, col)
+        else:
+            self.MarkCellDirty(verificationModel, col)
 
     def GetFoundVerifiedCount(self):
-        foundVerifiedCount = 0
-        for row in range(0, self.GetRowCount()):
-            if self.verificationsData[row].GetStatus() == \
-                    VerificationStatus.FOUND_VERIFIED:
-                foundVerifiedCount += 1
-        return foundVerifiedCount
+        return self.statusCounter.GetCount(VerificationStatus.FOUND_VERIFIED)
 
     def GetNotFoundCount(self):
-        notFoundCount = 0
-        for row in range(0, self.GetRowCount()):
-            if self.verificationsData[row].GetStatus() == \
-                    VerificationStatus.NOT_FOUND:
-                notFoundCount += 1
-        return notFoundCount
+        return self.statusCounter.GetCount(VerificationStatus.NOT_FOUND)
 
     def GetFoundUnverifiedFullSizeCount(self):
-        foundUnverifiedFullSizeCount = 0
-        for row in range(0, self.GetRowCount()):
-            if self.verificationsData[row].GetStatus() == \
-                    VerificationStatus.FOUND_UNVERIFIED_FULL_SIZE:
-                foundUnverifiedFullSizeCount += 1
-        return foundUnverifiedFullSizeCount
+        return self.statusCounter.GetCount(
+            VerificationStatus.FOUND_UNVERIFIED_FULL_SIZE)
 
     def GetFoundUnverifiedNotFullSizeCount(self):
-        foundUnverifiedNotFullSizeCount = 0
-        for row in range(0, self.GetRowCount()):
-            if self.verificationsData[row].GetStatus() == \
-                    VerificationStatus.FOUND_UNVERIFIED_NOT_FULL_SIZE:
-                foundUnverifiedNotFullSizeCount += 1
-        return foundUnverifiedNotFullSizeCount
+        return self.statusCounter.GetCount(
+            VerificationStatus.FOUND_UNVERIFIED_NOT_FULL_SIZE)
 
     def GetFailedCount(self):
-        failedCount = 0
-        for row in range(0, self.GetRowCount()):
-            if self.verificationsData[row].GetStatus() == \
-                    VerificationStatus.FAILED:
-                failedCount += 1
-        return failedCount
+        return self.statusCounter.GetCount(VerificationStatus.FAILED)
 
     def GetCompletedCount(self):
-        foundCompletedCount = 0
-        for row in range(0, self.GetRowCount()):
-            if self.verificationsData[row].GetComplete():
-                foundCompletedCount += 1
-        return foundCompletedCount
+        return self.completeCounter.GetCount(True)
@@ -545,7 +545,13 @@ class MyDataEvent(wx.PyCommandEvent):
             app = wx.GetApp()
             wx.CallAfter(app.toolbar.EnableTool, app.stopTool.GetId(), True)
             wx.GetApp().SetPerformingLookupsAndUploads(True)
-            event.foldersController.StartDataUploads()
+            foldersQueue = getattr(event, "foldersQueue", None)
+            try:
+                event.foldersController.StartDataUploads(foldersQueue)
+            finally:
+                if foldersQueue is not None:
+                    event.foldersController\
+                        .StopReceivingScannedFolders(foldersQueue)
 
             def endBusyCursorIfRequired():
                 try:
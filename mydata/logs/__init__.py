@@ -1,7 +1,8 @@
 import threading
 import wx
 import logging
-from StringIO import StringIO
+import collections
+import atexit
 from ConfigParser import ConfigParser
 import HTMLParser
 import os
@@ -9,26 +10,56 @@ import time
 import subprocess
 import sys
 import requests
-import inspect
 import pkgutil
 import traceback
 
 from SubmitDebugReportDialog import SubmitDebugReportDialog
+from handlers import RingBufferHandler
+from handlers import CompressingRotatingFileHandler
 
 
 class Logger():
     """
     Allows logger.debug(...), logger.info(...) etc. to write to MyData's
     Log window and to ~/.MyData_debug_log.txt
+
+    Log records are appended to a deque (which is thread-safe without
+    needing a lock) and are formatted and written by a dedicated log
+    writer thread, so that neither the worker threads nor the main
+    thread have to wait for log file I/O.  Only the Log window is
+    updated on the main thread, with one batch of messages at a time.
     """
     def __init__(self, name):
         self.name = name
         self.loggerObject = None
         self.loggerOutput = None
         self.loggerFileHandler = None
+        # FIXME: magic numbers
+        self.maxLogBufferBytes = 5 * 1024 * 1024
+        self.maxLogFileBytes = 10 * 1024 * 1024
+        self.logFileBackupCount = 5
+        # How many compressed log file segments to include in debug logs:
+        self.numLogSegmentsToSubmit = 2
         self.myDataConfigPath = None
         self.level = logging.DEBUG
+        self.moduleNames = {}
+        self.logRecords = collections.deque()
+        self.logWindowHandler = None
+        self.logTextCtrl = None
+        self.logWindowLines = []
+        self.logWindowLock = threading.Lock()
+        self.logWindowUpdateScheduled = False
+        # How long the log writer thread waits before checking for new
+        # log records, after writing all of the previous ones.
+        self.logWriterInterval = 0.1  # FIXME: magic number
+        self.writingLogRecords = threading.Event()
         self.ConfigureLogger()
+        self.logWriterThread = \
+            threading.Thread(target=self.WriteLogRecords,
+                             name="LogWriterThread")
+        self.logWriterThread.daemon = True
+        self.logWriterThread.start()
+        atexit.register(self.Flush)
         if not hasattr(sys, "frozen"):
             self.appRootDir = \
                 os.path.dirname(pkgutil.get_loader("mydata.MyData").filename)
@@ -46,8 +77,12 @@ class Logger():
             "%(functionName)s - %(currentThreadName)s - %(levelname)s - " \
             "%(message)s"
         logWindowHandler.setFormatter(logging.Formatter(logFormatString))
-        self.loggerObject = logging.getLogger(self.name)
-        self.loggerObject.addHandler(logWindowHandler)
+        # The log window handler isn't added to self.loggerObject,
+        # because it must only be used on the main thread.  The log
+        # writer thread formats records for it, and
+        # UpdateLogWindow writes them.
+        self.logTextCtrl = logTextCtrl
+        self.logWindowHandler = logWindowHandler
 
     def ConfigureLogger(self):
         self.loggerObject = logging.getLogger(self.name)
@@ -58,122 +93,168 @@ class Logger():
             "%(functionName)s - %(currentThreadName)s - %(levelname)s - " \
             "%(message)s"
 
-        # Send all log messages to a string.
-        self.loggerOutput = StringIO()
-        try:
-            stringHandler = logging.StreamHandler(stream=self.loggerOutput)
-        except:
-            stringHandler = logging.StreamHandler(strm=self.loggerOutput)
-        stringHandler.setLevel(self.level)
-        stringHandler.setFormatter(logging.Formatter(self.logFormatString))
-        self.loggerObject.addHandler(stringHandler)
+        # Keep the most recent log messages in memory.
+        self.loggerOutput = RingBufferHandler(self.maxLogBufferBytes)
+        self.loggerOutput.setLevel(self.level)
+        self.loggerOutput.setFormatter(
+            logging.Formatter(self.logFormatString))
+        self.loggerObject.addHandler(self.loggerOutput)
 
         # Finally, send all log messages to a log file.
-        self.loggerFileHandler = \
-            logging.FileHandler(os.path.join(os.path.expanduser("~"),
-                                             ".MyData_debug_log.txt"))
-        self.loggerFileHandler.setLevel(self.level)
-        self.loggerFileHandler\
-            .setFormatter(logging.Formatter(self.logFormatString))
-        self.loggerObject.addHandler(self.loggerFileHandler)
+        self.SetLogFileName(".MyData_debug_log.txt")
 
     def SetLogFileName(self, logFileName):
-        self.loggerObject.removeHandler(self.loggerFileHandler)
-        self.loggerFileHandler = \
-            logging.FileHandler(os.path.join(os.path.expanduser("~"),
-                                             logFileName))
+        if self.loggerFileHandler:
+            self.loggerObject.removeHandler(self.loggerFileHandler)
+            self.loggerFileHandler.close()
+        self.loggerFileHandler = CompressingRotatingFileHandler(
+            os.path.join(os.path.expanduser("~"), logFileName),
+            maxBytes=self.maxLogFileBytes,
+            backupCount=self.logFileBackupCount)
         self.loggerFileHandler.setLevel(self.level)
         self.loggerFileHandler\
             .setFormatter(logging.Formatter(self.logFormatString))
         self.loggerObject.addHandler(self.loggerFileHandler)
 
+    def GetLogText(self):
+        """
+        Returns the log messages kept in memory.  If older messages have
+        been discarded from memory, they are read from the most recent
+        segments of the log file.
+        """
+        logText = self.loggerOutput.getvalue()
+        if not self.loggerOutput.DiscardedLines():
+            return logText
+        firstLine = self.loggerOutput.GetFirstLine()
+        try:
+            logFileText = self.loggerFileHandler\
+                .ReadRecentSegments(self.numLogSegmentsToSubmit)
+        except (IOError, OSError):
+            return logText
+        index = logFileText.rfind(firstLine)
+        if index == -1:
+            return logText
+        return logFileText[:index] + logText
+
     def SetLevel(self, level):
         self.level = level
         self.loggerObject.setLevel(self.level)
         for handler in self.loggerObject.handlers:
             handler.setLevel(self.level)
+        if self.logWindowHandler:
+            self.logWindowHandler.setLevel(self.level)
 
-    def debug(self, message):
-        frame = inspect.currentframe()
-        outerFrames = inspect.getouterframes(frame)[1]
-        if hasattr(sys, "frozen"):
-            try:
-                moduleName = os.path.basename(outerFrames[1])
-            except:
-                moduleName = outerFrames[1]
-        else:
-            moduleName = os.path.relpath(outerFrames[1], self.appRootDir)
-        extra = {'moduleName':  moduleName,
-                 'lineNumber': outerFrames[2],
-                 'functionName': outerFrames[3],
+    def GetModuleName(self, fileName):
+        """
+        The module name for a source file only needs to be worked out
+        once, because os.path.relpath is relatively expensive.
+        """
+        moduleName = self.moduleNames.get(fileName)
+        if moduleName is None:
+            if hasattr(sys, "frozen"):
+                try:
+                    moduleName = os.path.basename(fileName)
+                except:
+                    moduleName = fileName
+            else:
+                moduleName = os.path.relpath(fileName, self.appRootDir)
+            self.moduleNames[fileName] = moduleName
+        return moduleName
+
+    def Log(self, level, message):
+        """
+        Should only be called by debug, info, warning and error, so that
+        the caller's frame is two levels up.
+        """
+        if not self.loggerObject.isEnabledFor(level):
+            return
+        callerFrame = sys._getframe(2)
+        extra = {'moduleName':
+                 self.GetModuleName(callerFrame.f_code.co_filename),
+                 'lineNumber': callerFrame.f_lineno,
+                 'functionName': callerFrame.f_code.co_name,
                  'currentThreadName': threading.current_thread().name}
-        if threading.current_thread().name == "MainThread":
-            self.loggerObject.debug(message, extra=extra)
-        else:
-            wx.CallAfter(self.loggerObject.debug, message, extra=extra)
+        record = self.loggerObject.makeRecord(
+            self.name, level, callerFrame.f_code.co_filename,
+            callerFrame.f_lineno, message, None, None,
+            callerFrame.f_code.co_name, extra)
+        self.logRecords.append(record)
+
+    def WriteLogRecords(self):
+        """
+        Runs in the log writer thread.
+        """
+        while True:
+            self.writingLogRecords.set()
+            numRecords = 0
+            while True:
+                try:
+                    record = self.logRecords.popleft()
+                except IndexError:
+                    break
+                numRecords += 1
+                try:
+                    self.loggerObject.handle(record)
+                    logWindowHandler = self.logWindowHandler
+                    if logWindowHandler and \
+                            record.levelno >= logWindowHandler.level:
+                        with self.logWindowLock:
+                            self.logWindowLines.append(
+                                logWindowHandler.format(record) + "\n")
+                except:
+                    traceback.print_exc()
+            if numRecords > 0:
+                self.ScheduleLogWindowUpdate()
+            self.writingLogRecords.clear()
+            time.sleep(self.logWriterInterval)
+
+    def ScheduleLogWindowUpdate(self):
+        with self.logWindowLock:
+            if self.logWindowUpdateScheduled or not self.logWindowLines:
+                return
+            self.logWindowUpdateScheduled = True
+        wx.CallAfter(self.UpdateLogWindow)
+
+    def UpdateLogWindow(self):
+        """
+        Called on the main thread, to write all of the log messages
+        which have been formatted since the last update.
+        """
+        with self.logWindowLock:
+            logWindowLines = self.logWindowLines
+            self.logWindowLines = []
+            self.logWindowUpdateScheduled = False
+        try:
+            self.logTextCtrl.write("".join(logWindowLines))
+        except:
+            traceback.print_exc()
+
+    def Flush(self):
+        """
+        Waits until all of the log records logged so far have been
+        written.
+        """
+        while self.logWriterThread.isAlive() and \
+                (len(self.logRecords) > 0 or
+                 self.writingLogRecords.isSet()):
+            time.sleep(0.01)
+
+    def debug(self, message):
+        self.Log(logging.DEBUG, message)
 
     def error(self, message):
-        frame = inspect.currentframe()
-        outerFrames = inspect.getouterframes(frame)[1]
-        if hasattr(sys, "frozen"):
-            try:
-                moduleName = os.path.basename(outerFrames[1])
-            except:
-                moduleName = outerFrames[1]
-        else:
-            moduleName = os.path.relpath(outerFrames[1], self.appRootDir)
-        extra = {'moduleName':  moduleName,
-                 'lineNumber': outerFrames[2],
-                 'functionName': outerFrames[3],
-                 'currentThreadName': threading.current_thread().name}
-        if threading.current_thread().name == "MainThread":
-            self.loggerObject.error(message, extra=extra)
-        else:
-            wx.CallAfter(self.loggerObject.error, message, extra=extra)
+        self.Log(logging.ERROR, message)
 
     def warning(self, message):
-        frame = inspect.currentframe()
-        outerFrames = inspect.getouterframes(frame)[1]
-        if hasattr(sys, "frozen"):
-            try:
-                moduleName = os.path.basename(outerFrames[1])
-            except:
-                moduleName = outerFrames[1]
-        else:
-            moduleName = os.path.relpath(outerFrames[1], self.appRootDir)
-        extra = {'moduleName':  moduleName,
-                 'lineNumber': outerFrames[2],
-                 'functionName': outerFrames[3],
-                 'currentThreadName': threading.current_thread().name}
-        if threading.current_thread().name == "MainThread":
-            self.loggerObject.warning(message, extra=extra)
-        else:
-            wx.CallAfter(self.loggerObject.warning, message, extra=extra)
+        self.Log(logging.WARNING, message)
 
     def info(self, message):
-        frame = inspect.currentframe()
-        outerFrames = inspect.getouterframes(frame)[1]
-        if hasattr(sys, "frozen"):
-            try:
-                moduleName = os.path.basename(outerFrames[1])
-            except:
-                moduleName = outerFrames[1]
-        else:
-            moduleName = os.path.relpath(outerFrames[1], self.appRootDir)
-        extra = {'moduleName':  moduleName,
-                 'lineNumber': outerFrames[2],
-                 'functionName': outerFrames[3],
-                 'currentThreadName': threading.current_thread().name}
-        if threading.current_thread().name == "MainThread":
-            self.loggerObject.info(message, extra=extra)
-        else:
-            wx.CallAfter(self.loggerObject.info, message, extra=extra)
+        self.Log(logging.INFO, message)
 
     def DumpLog(self, myDataMainFrame, settingsModel, submitDebugLog=False):
-        logger.debug("Logger.DumpLog: Flushing "
-                     "self.loggerObject.handlers[0], which is of class: "
-                     + self.loggerObject.handlers[0].__class__.__name__)
-        self.loggerObject.handlers[0].flush()
+        logger.debug("Logger.DumpLog: Waiting for the log writer thread "
+                     "to write all log messages.")
+        self.Flush()
 
         if myDataMainFrame is None:
             logger.debug("Logger.dump_log: Bailing out early, "
@@ -186,7 +267,7 @@ class Logger():
         def showSubmitDebugLogDialog():
             dlg = SubmitDebugReportDialog(myDataMainFrame, wx.ID_ANY,
                                           "MyData - Submit Debug Log",
-                                          self.loggerOutput.getvalue(),
+                                          self.GetLogText(),
                                           settingsModel)
             try:
                 if wx.IsBusy():
@@ -236,13 +317,14 @@ class Logger():
                 debugLog = debugLog + "No" + "\n"
             debugLog = debugLog + "Comments:\n\n" + self.comments + "\n\n"
             atLeastOneError = False
-            for line in self.loggerOutput.getvalue().splitlines(True):
+            logText = self.GetLogText()
+            for line in logText.splitlines(True):
                 if "ERROR" in line:
                     atLeastOneError = True
                     debugLog = debugLog + line
             if atLeastOneError:
                 debugLog = debugLog + "\n"
-            debugLog = debugLog + self.loggerOutput.getvalue()
+            debugLog = debugLog + logText
             fileInfo = {"logfile": debugLog}
 
             # If we are running in an installation then we have to use
@@ -0,0 +1,128 @@
+"""
+mydata/logs/handlers.py
+
+The purpose of this module is to stop MyData's log from growing without
+limit when MyData runs in the background for weeks at a time.
+
+RingBufferHandler replaces the StringIO which used to keep a copy of
+every log message in memory (for the Submit Debug Log dialog), keeping
+only the most recent messages, up to a maximum number of bytes.
+
+CompressingRotatingFileHandler replaces the FileHandler which used to
+append to ~/.MyData_debug_log.txt forever.  When the log file reaches its
+maximum size, it is compressed into ~/.MyData_debug_log.txt.1.gz (and
+any older segments are renamed to .2.gz, .3.gz etc.), so only a limited
+number of compressed segments are kept.
+"""
+import collections
+import gzip
+import logging
+import logging.handlers
+import os
+
+
+class RingBufferHandler(logging.Handler):
+    def __init__(self, maxBytes):
+        logging.Handler.__init__(self)
+        self.maxBytes = maxBytes
+        self.lines = collections.deque()
+        self.numBytes = 0
+        self.numDiscarded = 0
+
+    def emit(self, record):
+        """
+        Called by logging.Handler.handle with self.lock acquired.
+        """
+        try:
+            line = self.format(record) + "\n"
+        except:
+            self.handleError(record)
+            return
+        self.lines.append(line)
+        self.numBytes += len(line)
+        while self.numBytes > self.maxBytes and len(self.lines) > 1:
+            self.numBytes -= len(self.lines.popleft())
+            self.numDiscarded += 1
+
+    def getvalue(self):
+        """
+        Named like StringIO.getvalue, which this handler replaces.
+        """
+        self.acquire()
+        try:
+            return "".join(self.lines)
+        finally:
+            self.release()
+
+    def GetFirstLine(self):
+        self.acquire()
+        try:
+            if len(self.lines) > 0:
+                return self.lines[0]
+            return None
+        finally:
+            self.release()
+
+    def DiscardedLines(self):
+        return self.numDiscarded > 0
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    def GetSegmentPath(self, segmentNumber):
+        return "%s.%d.gz" % (self.baseFilename, segmentNumber)
+
+    def doRollover(self):
+        """
+        Like RotatingFileHandler.doRollover, but compresses the log file
+        instead of renaming it.
+        """
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        if self.backupCount > 0:
+            for i in range(self.backupCount - 1, 0, -1):
+                sourcePath = self.GetSegmentPath(i)
+                destPath = self.GetSegmentPath(i + 1)
+                if os.path.exists(sourcePath):
+                    if os.path.exists(destPath):
+                        os.remove(destPath)
+                    os.rename(sourcePath, destPath)
+            destPath = self.GetSegmentPath(1)
+            if os.path.exists(destPath):
+                os.remove(destPath)
+            if os.path.exists(self.baseFilename):
+                with open(self.baseFilename, "rb") as logFile:
+                    compressedLogFile = gzip.open(destPath, "wb")
+                    try:
+                        for chunk in iter(lambda: logFile.read(65536), ""):
+                            compressedLogFile.write(chunk)
+                    finally:
+                        compressedLogFile.close()
+        self.mode = "w"
+        self.stream = self._open()
+
+    def ReadRecentSegments(self, numSegments):
+        """
+        Returns the contents of up to numSegments of the most recent
+        compressed segments (oldest first), followed by the contents of
+        the current log file.
+        """
+        self.acquire()
+        try:
+            if self.stream:
+                self.stream.flush()
+            contents = []
+            for i in range(numSegments, 0, -1):
+                segmentPath = self.GetSegmentPath(i)
+                if os.path.exists(segmentPath):
+                    compressedLogFile = gzip.open(segmentPath, "rb")
+                    try:
+                        contents.append(compressedLogFile.read())
+                    finally:
+                        compressedLogFile.close()
+            if os.path.exists(self.baseFilename):
+                with open(self.baseFilename, "rb") as logFile:
+                    contents.append(logFile.read())
+            return "".join(contents)
+        finally:
+            self.release()
@@ -0,0 +1,151 @@
+"""
+mydata/models/checksumcache.py
+
+The purpose of this module is to avoid re-reading large data files to
+calculate their checksums every time an upload is retried or re-queued,
+e.g. after restarting MyData, after canceling uploads, or after finding
+an unverified datafile on the MyTardis server.
+
+The checksum cache is an SQLite database, stored next to MyData.cfg,
+with one row per data file, keyed by the file's absolute path.  A cached
+checksum is only used if the file's size, modified time and inode still
+match the values recorded when the checksum was calculated.  When the
+cache grows beyond its maximum number of entries, the least recently
+used entries are evicted.
+
+Updating an entry's last used time doesn't need to be durable, so those
+updates are committed in batches, rather than once per cache hit.  Call
+Commit when uploads finish, so that the last batch isn't lost.
+"""
+import sqlite3
+import threading
+import time
+import traceback
+
+from mydata.logs import logger
+
+
+class ChecksumCacheModel():
+    def __init__(self, cachePath, maxEntries):
+        self.cachePath = cachePath
+        self.maxEntries = maxEntries
+        self.cacheLock = threading.Lock()
+        self.uncommittedRowCount = 0
+        self.commitBatchSize = 100  # FIXME: magic number
+        self.commitInterval = 2  # FIXME: magic number (seconds)
+        self.lastCommitTime = time.time()
+        self.connection = sqlite3.connect(cachePath, check_same_thread=False)
+        # Allow (8-bit) byte string paths, as returned by os.listdir.
+        self.connection.text_factory = str
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS checksums ("
+            "path TEXT PRIMARY KEY, "
+            "size INTEGER, "
+            "mtime REAL, "
+            "inode INTEGER, "
+            "md5sum TEXT, "
+            "sha512sum TEXT, "
+            "last_used REAL)")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS checksums_last_used "
+            "ON checksums (last_used)")
+        self.connection.commit()
+        self.numEntries = self.connection.execute(
+            "SELECT COUNT(*) FROM checksums").fetchone()[0]
+
+    def GetCachePath(self):
+        return self.cachePath
+
+    def GetChecksums(self, folderModel, dataFileIndex):
+        """
+        Returns (md5sum, sha512sum) for the data file if they have been
+        cached and the file hasn't changed since, otherwise (None, None).
+        The sha512sum may be None even if the md5sum is cached.
+        """
+        dataFilePath = folderModel.GetDataFilePath(dataFileIndex)
+        try:
+            with self.cacheLock:
+                row = self.connection.execute(
+                    "SELECT size, mtime, inode, md5sum, sha512sum "
+                    "FROM checksums WHERE path = ?",
+                    (dataFilePath,)).fetchone()
+                if row is None:
+                    return (None, None)
+                size, mtime, inode, md5sum, sha512sum = row
+                if size != folderModel.GetDataFileSize(dataFileIndex) or \
+                        mtime != folderModel\
+                        .GetDataFileModifiedTime(dataFileIndex) or \
+                        inode != folderModel.GetDataFileInode(dataFileIndex):
+                    return (None, None)
+                self.connection.execute(
+                    "UPDATE checksums SET last_used = ? WHERE path = ?",
+                    (time.time(), dataFilePath))
+                self.uncommittedRowCount += 1
+                if self.uncommittedRowCount >= self.commitBatchSize or \
+                        time.time() - self.lastCommitTime >= \
+                        self.commitInterval:
+                    self.CommitLocked()
+                return (md5sum, sha512sum)
+        except sqlite3.Error:
+            logger.error(traceback.format_exc())
+            return (None, None)
+
+    def GetMd5Sum(self, folderModel, dataFileIndex):
+        return self.GetChecksums(folderModel, dataFileIndex)[0]
+
+    def SetChecksums(self, folderModel, dataFileIndex, md5sum,
+                     sha512sum=None):
+        dataFilePath = folderModel.GetDataFilePath(dataFileIndex)
+        try:
+            with self.cacheLock:
+                existingRow = self.connection.execute(
+                    "SELECT 1 FROM checksums WHERE path = ?",
+                    (dataFilePath,)).fetchone()
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO checksums "
+                    "(path, size, mtime, inode, md5sum, sha512sum, "
+                    "last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (dataFilePath,
+                     folderModel.GetDataFileSize(dataFileIndex),
+                     folderModel.GetDataFileModifiedTime(dataFileIndex),
+                     folderModel.GetDataFileInode(dataFileIndex),
+                     md5sum, sha512sum, time.time()))
+                if existingRow is None:
+                    self.numEntries += 1
+                if self.numEntries > self.maxEntries:
+                    self.EvictLeastRecentlyUsed()
+                self.CommitLocked()
+        except sqlite3.Error:
+            logger.error(traceback.format_exc())
+
+    def Commit(self):
+        with self.cacheLock:
+            try:
+                self.CommitLocked()
+            except sqlite3.Error:
+                logger.error(traceback.format_exc())
+
+    def CommitLocked(self):
+        """
+        Should be called with self.cacheLock acquired.
+        """
+        self.connection.commit()
+        self.uncommittedRowCount = 0
+        self.lastCommitTime = time.time()
+
+    def EvictLeastRecentlyUsed(self):
+        """
+        Evicts the least recently used entries, leaving the cache 10%
+        below its maximum size, so that we don't need to evict entries
+        every time a new checksum is added.  Should be called with
+        self.cacheLock acquired.
+        """
+        targetNumEntries = int(self.maxEntries * 0.9)  # FIXME: magic number
+        numToEvict = self.numEntries - targetNumEntries
+        self.connection.execute(
+            "DELETE FROM checksums WHERE path IN "
+            "(SELECT path FROM checksums ORDER BY last_used LIMIT ?)",
+            (numToEvict,))
+        logger.debug("Evicted %d entries from the checksum cache."
+                     % numToEvict)
+        self.numEntries = targetNumEntries
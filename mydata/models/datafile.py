@@ -1,4 +1,3 @@
-import requests
 import json
 import urllib
 
@@ -88,15 +87,11 @@ class DataFileModel():
     @staticmethod
     def GetDataFile(settingsModel, dataset, filename, directory):
         myTardisUrl = settingsModel.GetMyTardisUrl()
-        myTardisUsername = settingsModel.GetUsername()
-        myTardisApiKey = settingsModel.GetApiKey()
         url = myTardisUrl + "/api/v1/mydata_dataset_file/?format=json" + \
             "&dataset__id=" + str(dataset.GetId()) + \
             "&filename=" + urllib.quote(filename) + \
             "&directory=" + urllib.quote(directory)
-        headers = {"Authorization": "ApiKey " + myTardisUsername + ":" +
-                   myTardisApiKey}
-        response = requests.get(url=url, headers=headers)
+        response = settingsModel.GetApiClient().Get(url)
         if response.status_code < 200 or response.status_code >= 300:
             logger.debug("Failed to look up datafile \"%s\" "
                          "in dataset \"%s\"."
@@ -120,15 +115,34 @@ class DataFileModel():
                 dataset=dataset,
                 dataFileJson=dataFilesJson['objects'][0])
 
+    @staticmethod
+    def GetDataFileFromId(settingsModel, dataset, datafileId):
+        """
+        Looks up a datafile record by its ID (e.g. one found in the upload
+        journal).  Raises DoesNotExist if it has been deleted from MyTardis.
+        """
+        myTardisUrl = settingsModel.GetMyTardisUrl()
+        url = myTardisUrl + "/api/v1/dataset_file/%s/?format=json" \
+            % datafileId
+        response = settingsModel.GetApiClient().Get(url)
+        if response.status_code == 404:
+            raise DoesNotExist(
+                message="Datafile ID \"%s\" was not found in MyTardis"
+                % datafileId,
+                url=url, response=response)
+        if response.status_code < 200 or response.status_code >= 300:
+            logger.debug("Failed to look up datafile ID \"%s\"."
+                         % datafileId)
+            logger.debug(response.text)
+            return None
+        return DataFileModel(settingsModel=settingsModel, dataset=dataset,
+                             dataFileJson=response.json())
+
     @staticmethod
     def Verify(settingsModel, datafileId):
         myTardisUrl = settingsModel.GetMyTardisUrl()
-        myTardisUsername = settingsModel.GetUsername()
-        myTardisApiKey = settingsModel.GetApiKey()
         url = myTardisUrl + "/api/v1/dataset_file/%s/verify/" % datafileId
-        headers = {"Authorization": "ApiKey " + myTardisUsername + ":" +
-                   myTardisApiKey}
-        response = requests.get(url=url, headers=headers)
+        response = settingsModel.GetApiClient().Get(url)
         if response.status_code < 200 or response.status_code >= 300:
             logger.error("Failed to verify datafile id \"%s\" "
                          % datafileId)
@@ -1,9 +1,9 @@
 import urllib
 import urllib2
-import requests
 import json
 import traceback
 import threading
+import time
 
 from mydata.logs import logger
 from mydata.utils.exceptions import Unauthorized
@@ -19,6 +19,12 @@ class DatasetModel():
         self.settingsModel = settingsModel
         self.json = datasetJson
         self.datafiles = None
+        self.dataFileIndex = None
+        self.dataFileIndexTime = 0
+        # In watch mode, a DatasetModel can be used for days, so its file
+        # listing is fetched again if it is older than this, because
+        # MyTardis may have verified some of the listed datafiles since.
+        self.dataFileIndexMaxAge = 300  # FIXME: magic number (seconds)
 
     def GetJson(self):
         return self.json
@@ -49,45 +55,42 @@ class DatasetModel():
                     return self.datafiles
                 myTardisUrl = self.settingsModel.GetMyTardisUrl()
                 myTardisDefaultUsername = self.settingsModel.GetUsername()
-                myTardisDefaultUserApiKey = self.settingsModel.GetApiKey()
 
                 # limit=0 can still encounter a limit of 1000 unless
                 # API_LIMIT_PER_PAGE is set to 0 in MyTardis's settings.py
                 limit = 0
                 url = "%s/api/v1/dataset/%d/files/?format=json&limit=%d" \
                     % (myTardisUrl, self.GetId(), limit)
-                headers = {"Authorization": "ApiKey %s:%s"
-                           % (myTardisDefaultUsername,
-                              myTardisDefaultUserApiKey)}
                 logger.debug(url)
-                response = requests.get(headers=headers, url=url)
+                response = self.settingsModel.GetApiClient().Get(url)
                 if response.status_code >= 200 and response.status_code < 300:
                     from .datafile import DataFileModel
-                    self.datafiles = []
+                    datafiles = []
                     datafilesJson = response.json()['objects']
                     for datafileJson in datafilesJson:
-                        self.datafiles.append(DataFileModel(self.settingsModel,
-                                                            self,
-                                                            datafileJson))
+                        datafiles.append(DataFileModel(self.settingsModel,
+                                                       self,
+                                                       datafileJson))
                     offset = 0
-                    while response.json()['meta']['next']:
+                    while response.json()['meta']['next'] and \
+                            len(datafilesJson) > 0:
                         # We should be able to use
                         # response.json()['meta']['next'] in the URL,
                         # instead of manually constructing the next
                         # URL using offset.
                         # But response.json()['meta']['next'] seems to give
                         # the wrong URL for /api/v1/dataset/%d/files/
-                        offset += 1
+                        offset += len(datafilesJson)
                         url = "%s/api/v1/dataset/%d/files/?format=json" \
                             "&limit=%d&offset=%d" % (myTardisUrl, self.GetId(),
                                                      limit, offset)
                         logger.debug(url)
-                        response = requests.get(headers=headers, url=url)
+                        response = self.settingsModel.GetApiClient().Get(url)
                         if response.status_code >= 200 and \
                                 response.status_code < 300:
                             datafilesJson = response.json()['objects']
                             for datafileJson in datafilesJson:
-                                self.datafiles\
+                                datafiles\
                                     .append(DataFileModel(self.settingsModel,
                                                           self, datafileJson))
                         else:
@@ -95,7 +98,8 @@ class DatasetModel():
                             logger.error("response.status_code = " +
                                          str(response.status_code))
                             logger.error(response.text)
-
+                            raise Exception(response.text)
+                    self.datafiles = datafiles
                 else:
                     logger.error(url)
                     logger.error("response.status_code = " +
@@ -108,14 +112,68 @@ class DatasetModel():
                         message += "Please ask your MyTardis administrator " \
                                    "to check the permissions of the \"%s\" " \
                                    "user account." % myTardisDefaultUsername
-                        self.getDatasetFilesThreadingLock.release()
                         raise Unauthorized(message)
-                    self.getDatasetFilesThreadingLock.release()
                     raise Exception(response.text)
             finally:
                 self.getDatasetFilesThreadingLock.release()
         return self.datafiles
 
+    def GetListedDataFiles(self):
+        """
+        Returns the datafiles from GetDataFiles if they have already been
+        listed, without querying MyTardis, otherwise an empty list.
+        """
+        return self.datafiles or []
+
+    def GetDataFileIndex(self):
+        """
+        Returns a dictionary of this dataset's datafiles, keyed by
+        (directory, filename), built from a single listing of the
+        dataset's files, so that local files can be looked up without
+        a separate MyTardis API request for each file.
+
+        If more than one datafile matches the same (directory, filename),
+        the key maps to None, so the caller can fall back to a per-file
+        query, which will raise MultipleObjectsReturned.
+
+        The listing is fetched again once it is older than
+        dataFileIndexMaxAge.
+        """
+        if self.dataFileIndex is None or self.DataFileIndexExpired():
+            if not hasattr(self, "getDataFileIndexThreadingLock"):
+                self.getDataFileIndexThreadingLock = threading.Lock()
+            with self.getDataFileIndexThreadingLock:
+                if self.dataFileIndex is not None and \
+                        not self.DataFileIndexExpired():
+                    return self.dataFileIndex
+                # Discard the old listing, so GetDataFiles lists the
+                # dataset's files again.
+                self.datafiles = None
+                self.dataFileIndexTime = time.time()
+                try:
+                    datafiles = self.GetDataFiles()
+                except:
+                    # Don't retry the listing for every file in the
+                    # dataset - just fall back to per-file queries.
+                    self.dataFileIndex = {}
+                    raise
+                dataFileIndex = {}
+                for datafile in datafiles:
+                    directory = datafile.GetDirectory()
+                    if directory is None:
+                        directory = ""
+                    key = (directory, datafile.GetFilename())
+                    if key in dataFileIndex:
+                        dataFileIndex[key] = None
+                    else:
+                        dataFileIndex[key] = datafile
+                self.dataFileIndex = dataFileIndex
+        return self.dataFileIndex
+
+    def DataFileIndexExpired(self):
+        return time.time() - self.dataFileIndexTime > \
+            self.dataFileIndexMaxAge
+
     @staticmethod
     def CreateDatasetIfNecessary(folderModel):
         description = folderModel.GetFolder()
@@ -123,16 +181,12 @@ class DatasetModel():
 
         myTardisUrl = settingsModel.GetMyTardisUrl()
         myTardisDefaultUsername = settingsModel.GetUsername()
-        myTardisDefaultUserApiKey = settingsModel.GetApiKey()
 
         url = myTardisUrl + "/api/v1/dataset/?format=json" + \
             "&experiments__id=" + str(folderModel.GetExperiment().GetId())
         url = url + "&description=" + urllib.quote(description)
 
-        headers = {"Authorization": "ApiKey " + myTardisDefaultUsername + ":" +
-                   myTardisDefaultUserApiKey}
-
-        response = requests.get(headers=headers, url=url)
+        response = settingsModel.GetApiClient().Get(url)
         existingMatchingDatasets = response.json()
         numExistingMatchingDatasets = \
             existingMatchingDatasets['meta']['total_count']
@@ -154,12 +208,8 @@ class DatasetModel():
                 "experiments": [experimentUri],
                 "immutable": immutable}
             data = json.dumps(datasetJson)
-            headers = {"Authorization": "ApiKey " + myTardisDefaultUsername +
-                       ":" + myTardisDefaultUserApiKey,
-                       "Content-Type": "application/json",
-                       "Accept": "application/json"}
             url = myTardisUrl + "/api/v1/dataset/"
-            response = requests.post(headers=headers, url=url, data=data)
+            response = settingsModel.GetApiClient().Post(url, data=data)
             if response.status_code >= 200 and response.status_code < 300:
                 newDatasetJson = response.json()
                 return DatasetModel(settingsModel, newDatasetJson)
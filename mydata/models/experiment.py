@@ -1,4 +1,3 @@
-import requests
 import json
 import urllib2
 
@@ -45,7 +44,6 @@ class ExperimentModel():
         groupFolderName = folderModel.GetGroupFolderName()
         myTardisUrl = settingsModel.GetMyTardisUrl()
         myTardisDefaultUsername = settingsModel.GetUsername()
-        myTardisDefaultUserApiKey = settingsModel.GetApiKey()
         experimentTitle = folderModel.GetExperimentTitle()
 
         if folderModel.ExperimentTitleSetManually():
@@ -62,9 +60,7 @@ class ExperimentModel():
         if groupFolderName:
             url += "&group_folder_name=" + urllib2.quote(groupFolderName)
 
-        headers = {"Authorization": "ApiKey " + myTardisDefaultUsername + ":" +
-                   myTardisDefaultUserApiKey}
-        response = requests.get(url=url, headers=headers)
+        response = settingsModel.GetApiClient().Get(url)
         numExperimentsFound = 0
         experimentsJson = []
         try:
@@ -191,7 +187,6 @@ class ExperimentModel():
 
         myTardisUrl = settingsModel.GetMyTardisUrl()
         myTardisDefaultUsername = settingsModel.GetUsername()
-        myTardisDefaultUserApiKey = settingsModel.GetApiKey()
 
         message = "Creating experiment for uploader \"" + \
             uploaderName + ", user folder " + userFolderName
@@ -218,14 +213,9 @@ class ExperimentModel():
         if groupFolderName:
             experimentJson["parameter_sets"][0]["parameters"].append(
                 {"name": "group_folder_name", "value": groupFolderName})
-        headers = {"Authorization": "ApiKey " +
-                   myTardisDefaultUsername + ":" +
-                   myTardisDefaultUserApiKey,
-                   "Content-Type": "application/json",
-                   "Accept": "application/json"}
         url = myTardisUrl + "/api/v1/mydata_experiment/"
-        response = requests.post(headers=headers, url=url,
-                                 data=json.dumps(experimentJson))
+        response = settingsModel.GetApiClient().Post(
+            url, data=json.dumps(experimentJson))
         try:
             createdExperimentJson = response.json()
             createdExperiment = ExperimentModel(settingsModel,
@@ -289,7 +279,6 @@ class ExperimentModel():
             if groupFolderName:
                 message += " and group folder \"%s\"" % groupFolderName
             logger.error(message)
-            logger.error(headers)
             logger.error(url)
             logger.error(response.text)
             logger.error("response.status_code = " +
@@ -1,4 +1,3 @@
-import requests
 import json
 import urllib
 
@@ -54,24 +53,17 @@ class FacilityModel():
     @staticmethod
     def GetFacility(settingsModel, name):
         myTardisUrl = settingsModel.GetMyTardisUrl()
-        myTardisUsername = settingsModel.GetUsername()
-        myTardisApiKey = settingsModel.GetApiKey()
 
         url = myTardisUrl + "/api/v1/facility/?format=json&name=" + \
             urllib.quote(name)
-        headers = {'Authorization': 'ApiKey ' + myTardisUsername + ":" +
-                   myTardisApiKey}
-        session = requests.Session()
-        response = session.get(url=url, headers=headers, stream=False)
+        response = settingsModel.GetApiClient().Get(url)
         logger.debug(response.text)
         if response.status_code != 200:
             message = response.text
             response.close()
-            session.close()
             raise Exception(message)
         facilitiesJson = response.json()
         response.close()
-        session.close()
         numFacilitiesFound = facilitiesJson['meta']['total_count']
 
         if numFacilitiesFound == 0:
@@ -86,23 +78,16 @@ class FacilityModel():
     @staticmethod
     def GetMyFacilities(settingsModel):
         myTardisUrl = settingsModel.GetMyTardisUrl()
-        myTardisUsername = settingsModel.GetUsername()
-        myTardisApiKey = settingsModel.GetApiKey()
 
         facilities = []
 
         url = myTardisUrl + "/api/v1/facility/?format=json"
-        headers = {'Authorization': 'ApiKey ' + myTardisUsername + ":" +
-                   myTardisApiKey}
-        session = requests.Session()
-        response = session.get(url=url, headers=headers)
+        response = settingsModel.GetApiClient().Get(url)
         if response.status_code != 200:
             message = response.text
             response.close()
-            session.close()
             raise Exception(message)
         response.close()
-        session.close()
         facilitiesJson = response.json()
         for facilityJson in facilitiesJson['objects']:
             facilities.append(FacilityModel(
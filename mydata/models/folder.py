@@ -1,4 +1,5 @@
 import os
+import stat
 import urllib
 import requests
 import json
@@ -8,6 +9,42 @@ import traceback
 from .dataset import DatasetModel
 from mydata.logs import logger
 
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+def ListDirectory(dirPath):
+    """
+    Returns a sorted list of (name, path, statResult, isSymlink) tuples
+    for the entries in dirPath, using scandir where available, so that
+    each entry is stat'ed at most once.
+    """
+    entries = []
+    if scandir is not None:
+        for entry in scandir(dirPath):
+            try:
+                entries.append((entry.name, entry.path, entry.stat(),
+                                entry.is_symlink()))
+            except OSError:
+                logger.warning("Couldn't stat %s" % entry.path)
+    else:
+        for name in os.listdir(dirPath):
+            path = os.path.join(dirPath, name)
+            try:
+                statResult = os.lstat(path)
+                isSymlink = stat.S_ISLNK(statResult.st_mode)
+                if isSymlink:
+                    statResult = os.stat(path)
+                entries.append((name, path, statResult, isSymlink))
+            except OSError:
+                logger.warning("Couldn't stat %s" % path)
+    return sorted(entries)
+
 
 class FolderModel():
     def __init__(self, dataViewId, folder, location,
@@ -16,21 +53,8 @@ class FolderModel():
         self.dataViewId = dataViewId
         self.folder = folder
         self.location = location
-        absoluteFolderPath = os.path.join(location, folder)
-        self.numFiles = sum([len(files) for dirName, _, files in
-                             os.walk(absoluteFolderPath)])
-        self.dataFilePaths = []
-        self.dataFileDirectories = []
-        for dirName, _, files in os.walk(absoluteFolderPath):
-            for fileName in sorted(files):
-                self.dataFilePaths.append(os.path.join(dirName, fileName))
-                self.dataFileDirectories\
-                    .append(os.path.relpath(dirName, absoluteFolderPath))
-        for i in range(0, len(self.dataFileDirectories)):
-            if self.dataFileDirectories[i] == ".":
-                self.dataFileDirectories[i] = ""
-            self.dataFileDirectories[i] = \
-                self.dataFileDirectories[i].replace("\\", "/")
+        self.numFiles = 0
+        self.ScanDataFiles()
         self.created = ""
         self.experimentTitle = ""
         self.group = None
@@ -57,8 +81,12 @@ class FolderModel():
         self.numFilesVerified = 0
 
     def SetDataFileUploaded(self, dataFileIndex, uploaded):
-        self.dataFileUploaded[dataFileIndex] = uploaded
-        self.numFilesUploaded = sum(self.dataFileUploaded)
+        if self.dataFileUploaded[dataFileIndex] != uploaded:
+            self.dataFileUploaded[dataFileIndex] = uploaded
+            if uploaded:
+                self.numFilesUploaded += 1
+            else:
+                self.numFilesUploaded -= 1
         self.status = "%d of %d files uploaded" % (self.numFilesUploaded,
                                                    self.numFiles)
 
@@ -75,13 +103,18 @@ class FolderModel():
         return os.path.basename(self.dataFilePaths[dataFileIndex])
 
     def GetDataFileSize(self, dataFileIndex):
-        return os.stat(self.GetDataFilePath(dataFileIndex)).st_size
+        return self.dataFileSizes[dataFileIndex]
+
+    def GetDataFileModifiedTime(self, dataFileIndex):
+        return self.dataFileModifiedTimes[dataFileIndex]
+
+    def GetDataFileInode(self, dataFileIndex):
+        return self.dataFileInodes[dataFileIndex]
 
     def GetDataFileCreatedTime(self, dataFileIndex):
-        absoluteFilePath = self.GetDataFilePath(dataFileIndex)
         try:
             createdTimeIsoString = datetime.fromtimestamp(
-                os.stat(absoluteFilePath).st_ctime).isoformat()
+                self.dataFileCreatedTimes[dataFileIndex]).isoformat()
             return createdTimeIsoString
         except:
             logger.error(traceback.format_exc())
@@ -99,6 +132,9 @@ class FolderModel():
     def GetDataViewId(self):
         return self.dataViewId
 
+    def SetDataViewId(self, dataViewId):
+        self.dataViewId = dataViewId
+
     def GetFolder(self):
         return self.folder
 
@@ -154,22 +190,115 @@ class FolderModel():
     def SetGroup(self, group):
         self.group = group
 
-    def Refresh(self):
+    def ScanDataFiles(self):
+        """
+        Walks the folder once, recording each data file's path, relative
+        directory, size, modified time and created time, so that later
+        lookups don't need to hit the file system again.
+        """
         absoluteFolderPath = os.path.join(self.location, self.folder)
-        self.numFiles = sum([len(files) for dirName, _, files in
-                             os.walk(absoluteFolderPath)])
         self.dataFilePaths = []
         self.dataFileDirectories = []
-        for dirName, _, files in os.walk(absoluteFolderPath):
-            for fileName in sorted(files):
-                self.dataFilePaths.append(os.path.join(dirName, fileName))
-                self.dataFileDirectories\
-                    .append(os.path.relpath(dirName, absoluteFolderPath))
-        for i in range(0, len(self.dataFileDirectories)):
-            if self.dataFileDirectories[i] == ".":
-                self.dataFileDirectories[i] = ""
-            self.dataFileDirectories[i] = \
-                self.dataFileDirectories[i].replace("\\", "/")
+        self.dataFileSizes = []
+        self.dataFileModifiedTimes = []
+        self.dataFileCreatedTimes = []
+        self.dataFileInodes = []
+        dirsToScan = [(absoluteFolderPath, "")]
+        while len(dirsToScan) > 0:
+            dirPath, dataFileDirectory = dirsToScan.pop(0)
+            try:
+                entries = ListDirectory(dirPath)
+            except OSError:
+                logger.error(traceback.format_exc())
+                continue
+            subdirs = []
+            for name, path, statResult, isSymlink in entries:
+                if stat.S_ISDIR(statResult.st_mode):
+                    # Like os.walk, don't follow symbolic links to
+                    # directories.
+                    if isSymlink:
+                        continue
+                    if dataFileDirectory == "":
+                        subdirs.append((path, name))
+                    else:
+                        subdirs.append((path,
+                                        dataFileDirectory + "/" + name))
+                    continue
+                self.dataFilePaths.append(path)
+                self.dataFileDirectories.append(dataFileDirectory)
+                self.dataFileSizes.append(statResult.st_size)
+                self.dataFileModifiedTimes.append(statResult.st_mtime)
+                self.dataFileCreatedTimes.append(statResult.st_ctime)
+                self.dataFileInodes.append(statResult.st_ino)
+            # Preserve os.walk's top-down ordering of subdirectories.
+            dirsToScan = subdirs + dirsToScan
+        self.numFiles = len(self.dataFilePaths)
+
+    def RefreshDataFileStat(self, dataFileIndex):
+        """
+        Re-stats a single data file, updating the cached size and
+        timestamps.  Used immediately before uploading, so that we don't
+        upload a file based on stale metadata from the folder scan.
+        """
+        statResult = os.stat(self.GetDataFilePath(dataFileIndex))
+        self.dataFileSizes[dataFileIndex] = statResult.st_size
+        self.dataFileModifiedTimes[dataFileIndex] = statResult.st_mtime
+        self.dataFileCreatedTimes[dataFileIndex] = statResult.st_ctime
+        return statResult
+
+    def GetAbsolutePath(self):
+        return os.path.join(self.location, self.folder)
+
+    def GetDataFileIndex(self, dataFilePath):
+        """
+        Returns the index of the data file with the given absolute path,
+        or None if it isn't (yet) part of this folder.
+        """
+        try:
+            return self.dataFilePaths.index(dataFilePath)
+        except ValueError:
+            return None
+
+    def AddDataFile(self, dataFilePath):
+        """
+        Adds a data file which has appeared in the folder since it was
+        scanned (e.g. reported by the data directory watcher), or updates
+        the cached metadata of a data file which has been rewritten, and
+        returns its index.
+        """
+        statResult = os.stat(dataFilePath)
+        dataFileIndex = self.GetDataFileIndex(dataFilePath)
+        if dataFileIndex is not None:
+            self.RefreshDataFileStat(dataFileIndex)
+            self.dataFileInodes[dataFileIndex] = statResult.st_ino
+            self.dataFileVerified[dataFileIndex] = False
+            self.SetDataFileUploaded(dataFileIndex, False)
+            return dataFileIndex
+        relativeDirectory = os.path.relpath(os.path.dirname(dataFilePath),
+                                            self.GetAbsolutePath())
+        if relativeDirectory == ".":
+            dataFileDirectory = ""
+        else:
+            dataFileDirectory = relativeDirectory.replace(os.sep, "/")
+        self.dataFilePaths.append(dataFilePath)
+        self.dataFileDirectories.append(dataFileDirectory)
+        self.dataFileSizes.append(statResult.st_size)
+        self.dataFileModifiedTimes.append(statResult.st_mtime)
+        self.dataFileCreatedTimes.append(statResult.st_ctime)
+        self.dataFileInodes.append(statResult.st_ino)
+        self.dataFileUploaded.append(False)
+        self.dataFileVerified.append(False)
+        self.numFiles = len(self.dataFilePaths)
+        self.status = "%d of %d files uploaded" % (self.numFilesUploaded,
+                                                   self.numFiles)
+        return self.numFiles - 1
+
+    def Refresh(self):
+        self.ScanDataFiles()
+        self.dataFileUploaded = [False] * self.numFiles
+        self.dataFileVerified = [False] * self.numFiles
+        self.numFilesUploaded = 0
+        self.numFilesVerified = 0
 
         self.status = "0 of %d files uploaded" % (self.numFiles,)
         self.SetCreatedDate()
@@ -1,4 +1,3 @@
-import requests
 import json
 import urllib
 
@@ -57,14 +56,10 @@ class GroupModel():
     @staticmethod
     def GetGroupByName(settingsModel, name):
         myTardisUrl = settingsModel.GetMyTardisUrl()
-        myTardisUsername = settingsModel.GetUsername()
-        myTardisApiKey = settingsModel.GetApiKey()
 
         url = myTardisUrl + "/api/v1/group/?format=json&name=" + \
             urllib.quote(name)
-        headers = {'Authorization': 'ApiKey ' + myTardisUsername + ":" +
-                   myTardisApiKey}
-        response = requests.get(url=url, headers=headers)
+        response = settingsModel.GetApiClient().Get(url)
         if response.status_code != 200:
             logger.debug("Failed to look up group record for name \"" +
                          name + "\".")
@@ -1,4 +1,3 @@
-import requests
 import json
 import urllib
 
@@ -59,17 +58,12 @@ class InstrumentModel():
     def CreateInstrument(settingsModel, facility, name):
         myTardisUrl = settingsModel.GetMyTardisUrl()
         myTardisDefaultUsername = settingsModel.GetUsername()
-        myTardisDefaultUserApiKey = settingsModel.GetApiKey()
         url = myTardisUrl + "/api/v1/instrument/"
-        headers = {"Authorization": "ApiKey " + myTardisDefaultUsername + ":" +
-                   myTardisDefaultUserApiKey,
-                   "Content-Type": "application/json",
-                   "Accept": "application/json"}
         instrumentJson = \
             {"facility": facility.GetResourceUri(),
              "name": name}
         data = json.dumps(instrumentJson)
-        response = requests.post(headers=headers, url=url, data=data)
+        response = settingsModel.GetApiClient().Post(url, data=data)
         status_code = response.status_code
         content = response.text
         if status_code >= 200 and status_code < 300:
@@ -97,15 +91,10 @@ class InstrumentModel():
     @staticmethod
     def GetInstrument(settingsModel, facility, name):
         myTardisUrl = settingsModel.GetMyTardisUrl()
-        myTardisUsername = settingsModel.GetUsername()
-        myTardisApiKey = settingsModel.GetApiKey()
         url = myTardisUrl + "/api/v1/instrument/?format=json" + \
             "&facility__id=" + str(facility.GetId()) + \
             "&name=" + urllib.quote(name)
-        headers = {"Authorization": "ApiKey " + myTardisUsername + ":" +
-                   myTardisApiKey}
-        session = requests.Session()
-        response = session.get(url=url, headers=headers)
+        response = settingsModel.GetApiClient().Get(url)
         if response.status_code != 200:
             message = response.text
             logger.error(message)
@@ -119,7 +108,6 @@ class InstrumentModel():
             logger.debug(url)
             logger.debug(response.text)
             response.close()
-            session.close()
             return None
         else:
             logger.debug("Found instrument record for name \"%s\" "
@@ -127,7 +115,6 @@ class InstrumentModel():
                          (name, facility.GetName()))
             instrumentJson = instrumentsJson['objects'][0]
             response.close()
-            session.close()
             return InstrumentModel(
                 settingsModel=settingsModel, name=name,
                 instrumentJson=instrumentJson)
@@ -135,8 +122,6 @@ class InstrumentModel():
     @staticmethod
     def GetMyInstruments(settingsModel):
         myTardisUrl = settingsModel.GetMyTardisUrl()
-        myTardisUsername = settingsModel.GetUsername()
-        myTardisApiKey = settingsModel.GetApiKey()
 
         instruments = []
 
@@ -145,16 +130,12 @@ class InstrumentModel():
         for facility in myFacilities:
             url = myTardisUrl + "/api/v1/instrument/?format=json" + \
                 "&facility__id=" + str(facility.GetId())
-            headers = {'Authorization': 'ApiKey ' + myTardisUsername + ":" +
-                       myTardisApiKey}
-            session = requests.Session()
-            response = session.get(url=url, headers=headers)
+            response = settingsModel.GetApiClient().Get(url)
             if response.status_code != 200:
                 message = response.text
                 raise Exception(message)
             instrumentsJson = response.json()
             response.close()
-            session.close()
             for instrumentJson in instrumentsJson['objects']:
                 instruments.append(InstrumentModel(
                     settingsModel=settingsModel,
@@ -164,18 +145,12 @@ class InstrumentModel():
 
     def Rename(self, name):
         myTardisUrl = self.settingsModel.GetMyTardisUrl()
-        myTardisDefaultUsername = self.settingsModel.GetUsername()
-        myTardisDefaultUserApiKey = self.settingsModel.GetApiKey()
-        headers = {"Authorization": "ApiKey " + myTardisDefaultUsername + ":" +
-                   myTardisDefaultUserApiKey,
-                   "Content-Type": "application/json",
-                   "Accept": "application/json"}
         logger.info("Renaming instrument \"%s\" to \"%s\"."
                     % (str(self), name))
         url = myTardisUrl + "/api/v1/instrument/%d/" % self.GetId()
         uploaderJson = {"name": name}
         data = json.dumps(uploaderJson)
-        response = requests.put(headers=headers, url=url, data=data)
+        response = self.settingsModel.GetApiClient().Put(url, data=data)
         if response.status_code >= 200 and response.status_code < 300:
             logger.info("Renaming instrument succeeded.")
         else:
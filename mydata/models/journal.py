@@ -0,0 +1,209 @@
+"""
+mydata/models/journal.py
+
+The purpose of this module is to allow an upload run which was
+interrupted (e.g. because MyData was killed or the computer was
+restarted) to carry on where it left off, rather than re-verifying and
+re-hashing every data file which was still queued.
+
+The upload journal is an SQLite database, stored next to MyData.cfg, with
+one row per data file, keyed by the file's absolute path.  As a data file
+moves through the upload pipeline, its row records how far it got:
+
+QUEUED - queued for uploading (after it wasn't found on MyTardis).
+HASHED - its MD5 checksum has been calculated (and is recorded).
+CREATED - its datafile record has been created on MyTardis (the record's
+    ID and the path to upload to in staging are recorded), and
+    bytes_sent records how much of it has been sent to staging so far.
+UPLOADED - all of its bytes have been sent.  Only CREATED rows are
+    resumed without looking up the datafile on MyTardis; UPLOADED rows
+    are verified as usual.
+VERIFIED - it has been found verified on MyTardis, after which the
+    manifest (see mydata.models.manifest) takes over, so VERIFIED rows
+    are removed when the journal is next opened.
+
+Like the manifest, the size, modified time, inode and dataset ID of the
+data file are recorded, so a row is only used if the data file hasn't
+changed since.  Rows are committed in batches (by number of rows and by
+time), so that progress updates don't sync the database to disk for every
+block of data uploaded.
+"""
+import sqlite3
+import threading
+import time
+import traceback
+
+from mydata.logs import logger
+
+
+class UploadJournalState():
+    QUEUED = 0
+    HASHED = 1
+    CREATED = 2
+    UPLOADED = 3
+    VERIFIED = 4
+
+
+class UploadJournalEntry():
+    def __init__(self, state, md5sum, datafileId, stagingPath, bytesSent):
+        self.state = state
+        self.md5sum = md5sum
+        self.datafileId = datafileId
+        self.stagingPath = stagingPath
+        self.bytesSent = bytesSent
+
+    def GetState(self):
+        return self.state
+
+    def GetMd5Sum(self):
+        return self.md5sum
+
+    def GetDatafileId(self):
+        return self.datafileId
+
+    def GetStagingPath(self):
+        return self.stagingPath
+
+    def GetBytesSent(self):
+        return self.bytesSent
+
+
+class UploadJournalModel():
+    def __init__(self, journalPath):
+        self.journalPath = journalPath
+        self.journalLock = threading.Lock()
+        self.uncommittedRowCount = 0
+        self.commitBatchSize = 100  # FIXME: magic number
+        self.commitInterval = 2  # FIXME: magic number (seconds)
+        self.lastCommitTime = time.time()
+        self.connection = sqlite3.connect(journalPath,
+                                          check_same_thread=False)
+        # Allow (8-bit) byte string paths, as returned by os.listdir.
+        self.connection.text_factory = str
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            "path TEXT PRIMARY KEY, "
+            "size INTEGER, "
+            "mtime REAL, "
+            "inode INTEGER, "
+            "dataset_id INTEGER, "
+            "state INTEGER, "
+            "md5sum TEXT, "
+            "datafile_id INTEGER, "
+            "staging_path TEXT, "
+            "bytes_sent INTEGER)")
+        self.connection.execute(
+            "DELETE FROM uploads WHERE state = ?",
+            (UploadJournalState.VERIFIED,))
+        self.connection.commit()
+
+    def GetJournalPath(self):
+        return self.journalPath
+
+    def GetEntry(self, folderModel, dataFileIndex):
+        """
+        Returns an UploadJournalEntry for the data file, or None if it
+        isn't in the journal, or it has changed since it was journaled.
+        """
+        dataFilePath = folderModel.GetDataFilePath(dataFileIndex)
+        datasetId = folderModel.GetDatasetModel().GetId()
+        try:
+            with self.journalLock:
+                row = self.connection.execute(
+                    "SELECT size, mtime, inode, dataset_id, state, md5sum, "
+                    "datafile_id, staging_path, bytes_sent "
+                    "FROM uploads WHERE path = ?",
+                    (dataFilePath,)).fetchone()
+        except sqlite3.Error:
+            logger.error(traceback.format_exc())
+            return None
+        if row is None:
+            return None
+        size, mtime, inode, rowDatasetId = row[:4]
+        if size != folderModel.GetDataFileSize(dataFileIndex) or \
+                mtime != folderModel.GetDataFileModifiedTime(dataFileIndex) or \
+                inode != folderModel.GetDataFileInode(dataFileIndex) or \
+                rowDatasetId != datasetId:
+            return None
+        return UploadJournalEntry(*row[4:])
+
+    def SetQueued(self, folderModel, dataFileIndex):
+        """
+        Starts a new row for the data file, unless there is already a row
+        for this version of the data file, which may record later states.
+        """
+        if self.GetEntry(folderModel, dataFileIndex) is not None:
+            return
+        self.Write(
+            "INSERT OR REPLACE INTO uploads "
+            "(path, size, mtime, inode, dataset_id, state, bytes_sent) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0)",
+            (folderModel.GetDataFilePath(dataFileIndex),
+             folderModel.GetDataFileSize(dataFileIndex),
+             folderModel.GetDataFileModifiedTime(dataFileIndex),
+             folderModel.GetDataFileInode(dataFileIndex),
+             folderModel.GetDatasetModel().GetId(),
+             UploadJournalState.QUEUED))
+
+    def SetHashed(self, folderModel, dataFileIndex, md5sum):
+        """
+        The data file may have been re-stat'ed before hashing, so its
+        size, modified time and inode are updated too.
+        """
+        self.Write(
+            "UPDATE uploads SET size = ?, mtime = ?, inode = ?, "
+            "state = MAX(state, ?), md5sum = ? WHERE path = ?",
+            (folderModel.GetDataFileSize(dataFileIndex),
+             folderModel.GetDataFileModifiedTime(dataFileIndex),
+             folderModel.GetDataFileInode(dataFileIndex),
+             UploadJournalState.HASHED, md5sum,
+             folderModel.GetDataFilePath(dataFileIndex)))
+
+    def SetCreated(self, folderModel, dataFileIndex, datafileId,
+                   stagingPath):
+        self.Write(
+            "UPDATE uploads SET state = MAX(state, ?), datafile_id = ?, "
+            "staging_path = ? WHERE path = ?",
+            (UploadJournalState.CREATED, datafileId, stagingPath,
+             folderModel.GetDataFilePath(dataFileIndex)))
+
+    def SetBytesSent(self, folderModel, dataFileIndex, bytesSent):
+        self.Write(
+            "UPDATE uploads SET bytes_sent = ? WHERE path = ?",
+            (bytesSent, folderModel.GetDataFilePath(dataFileIndex)))
+
+    def SetUploaded(self, folderModel, dataFileIndex):
+        self.Write(
+            "UPDATE uploads SET state = MAX(state, ?), bytes_sent = size "
+            "WHERE path = ?",
+            (UploadJournalState.UPLOADED,
+             folderModel.GetDataFilePath(dataFileIndex)))
+
+    def SetVerified(self, folderModel, dataFileIndex):
+        self.Write(
+            "UPDATE uploads SET state = ? WHERE path = ?",
+            (UploadJournalState.VERIFIED,
+             folderModel.GetDataFilePath(dataFileIndex)))
+
+    def Write(self, sql, parameters):
+        try:
+            with self.journalLock:
+                self.connection.execute(sql, parameters)
+                self.uncommittedRowCount += 1
+                if self.uncommittedRowCount >= self.commitBatchSize or \
+                        time.time() - self.lastCommitTime >= \
+                        self.commitInterval:
+                    self.connection.commit()
+                    self.uncommittedRowCount = 0
+                    self.lastCommitTime = time.time()
+        except sqlite3.Error:
+            logger.error(traceback.format_exc())
+
+    def Commit(self):
+        with self.journalLock:
+            try:
+                self.connection.commit()
+                self.uncommittedRowCount = 0
+                self.lastCommitTime = time.time()
+            except sqlite3.Error:
+                logger.error(traceback.format_exc())
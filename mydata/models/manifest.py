@@ -0,0 +1,97 @@
+"""
+mydata/models/manifest.py
+
+The purpose of this module is to remember which local data files MyData
+has already found verified on the MyTardis server, so that a refresh
+doesn't need to re-verify every file in the data directory.
+
+The manifest is an SQLite database, stored next to MyData.cfg, with one
+row per data file, keyed by the file's absolute path.  Each row records
+the size, modified time and inode the file had when it was last seen,
+the ID of the dataset it belongs to, and its last known verification
+status.  If a file's size, modified time, inode and dataset all match
+its manifest row, and it was verified in a previous run, then there's no
+need to look for it on the MyTardis server again.
+"""
+import sqlite3
+import threading
+import traceback
+
+from mydata.logs import logger
+
+
+class ManifestModel():
+    def __init__(self, manifestPath):
+        self.manifestPath = manifestPath
+        self.manifestLock = threading.Lock()
+        # Rows are committed in batches, rather than one at a time,
+        # to avoid syncing the database to disk for every data file.
+        self.uncommittedRowCount = 0
+        self.commitBatchSize = 1000  # FIXME: magic number
+        self.connection = sqlite3.connect(manifestPath,
+                                          check_same_thread=False)
+        # Allow (8-bit) byte string paths, as returned by os.listdir.
+        self.connection.text_factory = str
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS datafiles ("
+            "path TEXT PRIMARY KEY, "
+            "size INTEGER, "
+            "mtime REAL, "
+            "inode INTEGER, "
+            "dataset_id INTEGER, "
+            "verified INTEGER)")
+        self.connection.commit()
+
+    def GetManifestPath(self):
+        return self.manifestPath
+
+    def IsUnchangedAndVerified(self, folderModel, dataFileIndex):
+        """
+        Returns True if the data file was found verified on the MyTardis
+        server in a previous run, and hasn't changed since then.
+        """
+        dataFilePath = folderModel.GetDataFilePath(dataFileIndex)
+        datasetId = folderModel.GetDatasetModel().GetId()
+        with self.manifestLock:
+            row = self.connection.execute(
+                "SELECT size, mtime, inode, dataset_id, verified "
+                "FROM datafiles WHERE path = ?", (dataFilePath,)).fetchone()
+        if row is None:
+            return False
+        size, mtime, inode, rowDatasetId, verified = row
+        return bool(verified) and \
+            size == folderModel.GetDataFileSize(dataFileIndex) and \
+            mtime == folderModel.GetDataFileModifiedTime(dataFileIndex) and \
+            inode == folderModel.GetDataFileInode(dataFileIndex) and \
+            rowDatasetId == datasetId
+
+    def SetVerified(self, folderModel, dataFileIndex, verified=True):
+        """
+        Records the data file's current size, modified time and inode,
+        along with its dataset ID and verification status.
+        """
+        dataFilePath = folderModel.GetDataFilePath(dataFileIndex)
+        datasetId = folderModel.GetDatasetModel().GetId()
+        with self.manifestLock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO datafiles "
+                "(path, size, mtime, inode, dataset_id, verified) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (dataFilePath,
+                 folderModel.GetDataFileSize(dataFileIndex),
+                 folderModel.GetDataFileModifiedTime(dataFileIndex),
+                 folderModel.GetDataFileInode(dataFileIndex),
+                 datasetId, int(verified)))
+            self.uncommittedRowCount += 1
+            if self.uncommittedRowCount >= self.commitBatchSize:
+                self.connection.commit()
+                self.uncommittedRowCount = 0
+
+    def Commit(self):
+        with self.manifestLock:
+            try:
+                self.connection.commit()
+                self.uncommittedRowCount = 0
+            except sqlite3.Error:
+                logger.error(traceback.format_exc())
+
@@ -1,4 +1,3 @@
-import requests
 import json
 import urllib
 
@@ -28,7 +27,6 @@ class ObjectAclModel():
         settingsModel = experiment.GetSettingsModel()
         myTardisUrl = settingsModel.GetMyTardisUrl()
         myTardisDefaultUsername = settingsModel.GetUsername()
-        myTardisDefaultUserApiKey = settingsModel.GetApiKey()
 
         objectAclJson = {
             "pluginId": "django_user",
@@ -45,14 +43,9 @@ class ObjectAclModel():
             "effectiveDate": None,
             "expiryDate": None}
 
-        headers = {"Authorization": "ApiKey " +
-                   myTardisDefaultUsername + ":" +
-                   myTardisDefaultUserApiKey,
-                   "Content-Type": "application/json",
-                   "Accept": "application/json"}
         url = myTardisUrl + "/api/v1/objectacl/"
-        response = requests.post(headers=headers, url=url,
-                                 data=json.dumps(objectAclJson))
+        response = settingsModel.GetApiClient().Post(
+            url, data=json.dumps(objectAclJson))
         if response.status_code == 201:
             logger.debug("Shared experiment with user " +
                          user.GetUsername() + ".")
@@ -93,7 +86,6 @@ class ObjectAclModel():
         settingsModel = experiment.GetSettingsModel()
         myTardisUrl = settingsModel.GetMyTardisUrl()
         myTardisDefaultUsername = settingsModel.GetUsername()
-        myTardisDefaultUserApiKey = settingsModel.GetApiKey()
 
         objectAclJson = {
             "pluginId": "django_group",
@@ -110,14 +102,9 @@ class ObjectAclModel():
             "effectiveDate": None,
             "expiryDate": None}
 
-        headers = {"Authorization": "ApiKey " +
-                   myTardisDefaultUsername + ":" +
-                   myTardisDefaultUserApiKey,
-                   "Content-Type": "application/json",
-                   "Accept": "application/json"}
         url = myTardisUrl + "/api/v1/objectacl/"
-        response = requests.post(headers=headers, url=url,
-                                 data=json.dumps(objectAclJson))
+        response = settingsModel.GetApiClient().Post(
+            url, data=json.dumps(objectAclJson))
         if response.status_code == 201:
             logger.debug("Shared experiment with group " +
                          group.GetName() + ".")
@@ -1,6 +1,5 @@
 import json
 import sys
-import requests
 import traceback
 import os
 from glob import glob
@@ -15,6 +14,10 @@ from mydata.models.user import UserModel
 from mydata.models.facility import FacilityModel
 from mydata.models.instrument import InstrumentModel
 from mydata.models.uploader import UploaderModel
+from mydata.models.manifest import ManifestModel
+from mydata.models.checksumcache import ChecksumCacheModel
+from mydata.models.journal import UploadJournalModel
+from mydata.utils.apiclient import ApiClient
 from mydata.utils.exceptions import DuplicateKey
 from mydata.utils.exceptions import Unauthorized
 from mydata.utils.exceptions import IncompatibleMyTardisVersion
@@ -52,6 +55,10 @@ class SettingsModel():
         self.background_mode = "False"
 
         self.uploaderModel = None
+        self.manifestModel = None
+        self.checksumCacheModel = None
+        self.uploadJournalModel = None
+        self.apiClient = None
         self.uploadToStagingRequest = None
         self.sshKeyPair = None
 
@@ -103,7 +110,42 @@ class SettingsModel():
         self.ignore_interval_number = 0
         self.ignore_interval_unit = "months"
         self.max_upload_threads = 5
+        # If adaptive_upload_threads is enabled, the number of active
+        # upload workers is adjusted at runtime, between
+        # min_upload_threads and max_upload_threads.
+        self.adaptive_upload_threads = False
+        self.min_upload_threads = 1
+        self.max_hash_threads = 2
+        # Data files larger than large_file_threshold_mb are uploaded by
+        # a separate lane of up to max_large_upload_threads workers,
+        # which are taken from max_upload_threads (always leaving at
+        # least one worker for smaller files).  While there are no large
+        # files to upload, the large-file lane's workers upload smaller
+        # files too.
+        self.max_large_upload_threads = 2
+        self.large_file_threshold_mb = 10
+        # How many times per second the data views and status bar are
+        # refreshed with progress updates from worker threads.
+        self.gui_refresh_rate = 10
+        # Maximum upload rates in MB/s (0 means unlimited) between the
+        # timer's from and to times, and outside of those times.  See
+        # mydata.utils.ratelimit.BandwidthLimiter.
+        self.max_upload_rate_in_timer_window = 0
+        self.max_upload_rate_outside_timer_window = 0
+        self.limit_checksum_read_rate = False
+        # The order in which data files are verified and uploaded (see
+        # mydata.utils.scheduler.SchedulingPolicy), and the weights used
+        # by the "Fair Share Per User Folder" policy, e.g. "alice: 2".
+        self.upload_scheduling_policy = "FIFO"
+        self.upload_scheduling_weights = ""
+        # Uploads which fail with a transient error are retried up to
+        # upload_retry_attempts times (0 disables retries), after an
+        # exponentially increasing delay, starting from upload_retry_delay
+        # seconds.  See mydata.utils.retry.RetryQueue.
+        self.upload_retry_attempts = 5
+        self.upload_retry_delay = 10
         self.validate_folder_structure = True
+        self.watch_data_directory = False
 
         self.locked = False
 
@@ -129,7 +171,17 @@ class SettingsModel():
                           "folder_structure",
                           "dataset_grouping", "group_prefix",
                           "ignore_interval_unit", "max_upload_threads",
-                          "validate_folder_structure", "locked", "uuid"]
+                          "adaptive_upload_threads", "min_upload_threads",
+                          "max_hash_threads", "max_large_upload_threads",
+                          "large_file_threshold_mb", "gui_refresh_rate",
+                          "max_upload_rate_in_timer_window",
+                          "max_upload_rate_outside_timer_window",
+                          "limit_checksum_read_rate",
+                          "upload_scheduling_policy",
+                          "upload_scheduling_weights",
+                          "upload_retry_attempts", "upload_retry_delay",
+                          "validate_folder_structure",
+                          "watch_data_directory", "locked", "uuid"]
                 for field in fields:
                     if configParser.has_option(configFileSection, field):
                         self.__dict__[field] = \
@@ -149,11 +201,75 @@ class SettingsModel():
                     self.max_upload_threads = \
                         configParser.getint(configFileSection,
                                             "max_upload_threads")
+                if configParser.has_option(configFileSection,
+                                           "adaptive_upload_threads"):
+                    self.adaptive_upload_threads = \
+                        configParser.getboolean(configFileSection,
+                                                "adaptive_upload_threads")
+                if configParser.has_option(configFileSection,
+                                           "min_upload_threads"):
+                    self.min_upload_threads = \
+                        configParser.getint(configFileSection,
+                                            "min_upload_threads")
+                if configParser.has_option(configFileSection,
+                                           "max_hash_threads"):
+                    self.max_hash_threads = \
+                        configParser.getint(configFileSection,
+                                            "max_hash_threads")
+                if configParser.has_option(configFileSection,
+                                           "max_large_upload_threads"):
+                    self.max_large_upload_threads = \
+                        configParser.getint(configFileSection,
+                                            "max_large_upload_threads")
+                if configParser.has_option(configFileSection,
+                                           "large_file_threshold_mb"):
+                    self.large_file_threshold_mb = \
+                        configParser.getint(configFileSection,
+                                            "large_file_threshold_mb")
+                if configParser.has_option(
+                        configFileSection,
+                        "max_upload_rate_in_timer_window"):
+                    self.max_upload_rate_in_timer_window = \
+                        configParser.getfloat(
+                            configFileSection,
+                            "max_upload_rate_in_timer_window")
+                if configParser.has_option(
+                        configFileSection,
+                        "max_upload_rate_outside_timer_window"):
+                    self.max_upload_rate_outside_timer_window = \
+                        configParser.getfloat(
+                            configFileSection,
+                            "max_upload_rate_outside_timer_window")
+                if configParser.has_option(configFileSection,
+                                           "limit_checksum_read_rate"):
+                    self.limit_checksum_read_rate = \
+                        configParser.getboolean(configFileSection,
+                                                "limit_checksum_read_rate")
+                if configParser.has_option(configFileSection,
+                                           "upload_retry_attempts"):
+                    self.upload_retry_attempts = \
+                        configParser.getint(configFileSection,
+                                            "upload_retry_attempts")
+                if configParser.has_option(configFileSection,
+                                           "upload_retry_delay"):
+                    self.upload_retry_delay = \
+                        configParser.getint(configFileSection,
+                                            "upload_retry_delay")
+                if configParser.has_option(configFileSection,
+                                           "gui_refresh_rate"):
+                    self.gui_refresh_rate = \
+                        configParser.getint(configFileSection,
+                                            "gui_refresh_rate")
                 if configParser.has_option(configFileSection,
                                            "validate_folder_structure"):
                     self.validate_folder_structure = \
                         configParser.getboolean(configFileSection,
                                                 "validate_folder_structure")
+                if configParser.has_option(configFileSection,
+                                           "watch_data_directory"):
+                    self.watch_data_directory = \
+                        configParser.getboolean(configFileSection,
+                                                "watch_data_directory")
                 if configParser.has_option(configFileSection,
                                            "locked"):
                     self.locked = configParser.getboolean(configFileSection,
@@ -416,6 +532,90 @@ class SettingsModel():
     def SetMaxUploadThreads(self, maxUploadThreads):
         self.max_upload_threads = maxUploadThreads
 
+    def AdaptiveUploadThreads(self):
+        return self.adaptive_upload_threads
+
+    def SetAdaptiveUploadThreads(self, adaptiveUploadThreads):
+        self.adaptive_upload_threads = adaptiveUploadThreads
+
+    def GetMinUploadThreads(self):
+        return self.min_upload_threads
+
+    def SetMinUploadThreads(self, minUploadThreads):
+        self.min_upload_threads = minUploadThreads
+
+    def GetMaxHashThreads(self):
+        return self.max_hash_threads
+
+    def SetMaxHashThreads(self, maxHashThreads):
+        self.max_hash_threads = maxHashThreads
+
+    def GetMaxLargeUploadThreads(self):
+        return self.max_large_upload_threads
+
+    def SetMaxLargeUploadThreads(self, maxLargeUploadThreads):
+        self.max_large_upload_threads = maxLargeUploadThreads
+
+    def GetLargeFileThresholdMb(self):
+        return self.large_file_threshold_mb
+
+    def SetLargeFileThresholdMb(self, largeFileThresholdMb):
+        self.large_file_threshold_mb = largeFileThresholdMb
+
+    def GetUploadRetryAttempts(self):
+        return self.upload_retry_attempts
+
+    def SetUploadRetryAttempts(self, uploadRetryAttempts):
+        self.upload_retry_attempts = uploadRetryAttempts
+
+    def GetUploadRetryDelay(self):
+        return self.upload_retry_delay
+
+    def SetUploadRetryDelay(self, uploadRetryDelay):
+        self.upload_retry_delay = uploadRetryDelay
+
+    def GetMaxUploadRateInTimerWindow(self):
+        return self.max_upload_rate_in_timer_window
+
+    def SetMaxUploadRateInTimerWindow(self, maxUploadRate):
+        self.max_upload_rate_in_timer_window = maxUploadRate
+
+    def GetMaxUploadRateOutsideTimerWindow(self):
+        return self.max_upload_rate_outside_timer_window
+
+    def SetMaxUploadRateOutsideTimerWindow(self, maxUploadRate):
+        self.max_upload_rate_outside_timer_window = maxUploadRate
+
+    def LimitChecksumReadRate(self):
+        return self.limit_checksum_read_rate
+
+    def SetLimitChecksumReadRate(self, limitChecksumReadRate):
+        self.limit_checksum_read_rate = limitChecksumReadRate
+
+    def GetGuiRefreshRate(self):
+        return self.gui_refresh_rate
+
+    def SetGuiRefreshRate(self, guiRefreshRate):
+        self.gui_refresh_rate = guiRefreshRate
+
+    def GetUploadSchedulingPolicy(self):
+        return self.upload_scheduling_policy
+
+    def SetUploadSchedulingPolicy(self, uploadSchedulingPolicy):
+        self.upload_scheduling_policy = uploadSchedulingPolicy
+
+    def GetUploadSchedulingWeights(self):
+        return self.upload_scheduling_weights
+
+    def SetUploadSchedulingWeights(self, uploadSchedulingWeights):
+        self.upload_scheduling_weights = uploadSchedulingWeights
+
+    def WatchDataDirectory(self):
+        return self.watch_data_directory
+
+    def SetWatchDataDirectory(self, watchDataDirectory):
+        self.watch_data_directory = watchDataDirectory
+
     def RunningInBackgroundMode(self):
         return self.background_mode
 
@@ -452,6 +652,107 @@ class SettingsModel():
     def SetUploaderModel(self, uploaderModel):
         self.uploaderModel = uploaderModel
 
+    def GetApiClient(self):
+        if not self.apiClient:
+            """
+            This could be called from multiple threads simultaneously,
+            so it requires locking.
+            """
+            if not hasattr(self, "createApiClientThreadingLock"):
+                self.createApiClientThreadingLock = threading.Lock()
+            if self.createApiClientThreadingLock.acquire():
+                try:
+                    if not self.apiClient:
+                        self.apiClient = ApiClient(self)
+                finally:
+                    self.createApiClientThreadingLock.release()
+        return self.apiClient
+
+    def GetManifestPath(self):
+        """
+        The manifest of previously verified data files is stored in the
+        same directory as MyData.cfg.
+        """
+        if self.GetConfigPath() is None:
+            return None
+        return os.path.join(os.path.dirname(self.GetConfigPath()),
+                            "MyDataManifest.db")
+
+    def GetChecksumCachePath(self):
+        """
+        The cache of previously calculated checksums is stored in the
+        same directory as MyData.cfg.
+        """
+        if self.GetConfigPath() is None:
+            return None
+        return os.path.join(os.path.dirname(self.GetConfigPath()),
+                            "MyDataChecksums.db")
+
+    def GetChecksumCacheModel(self):
+        if not self.checksumCacheModel and \
+                self.GetChecksumCachePath() is not None:
+            """
+            This could be called from multiple threads simultaneously,
+            so it requires locking.
+            """
+            if not hasattr(self, "createChecksumCacheThreadingLock"):
+                self.createChecksumCacheThreadingLock = threading.Lock()
+            if self.createChecksumCacheThreadingLock.acquire():
+                try:
+                    if not self.checksumCacheModel:
+                        maxEntries = 100000  # FIXME: magic number
+                        self.checksumCacheModel = \
+                            ChecksumCacheModel(self.GetChecksumCachePath(),
+                                               maxEntries)
+                finally:
+                    self.createChecksumCacheThreadingLock.release()
+        return self.checksumCacheModel
+
+    def GetUploadJournalPath(self):
+        """
+        The journal of uploads in progress is stored in the same
+        directory as MyData.cfg.
+        """
+        if self.GetConfigPath() is None:
+            return None
+        return os.path.join(os.path.dirname(self.GetConfigPath()),
+                            "MyDataUploadJournal.db")
+
+    def GetUploadJournalModel(self):
+        if not self.uploadJournalModel and \
+                self.GetUploadJournalPath() is not None:
+            """
+            This could be called from multiple threads simultaneously,
+            so it requires locking.
+            """
+            if not hasattr(self, "createUploadJournalThreadingLock"):
+                self.createUploadJournalThreadingLock = threading.Lock()
+            if self.createUploadJournalThreadingLock.acquire():
+                try:
+                    if not self.uploadJournalModel:
+                        self.uploadJournalModel = \
+                            UploadJournalModel(self.GetUploadJournalPath())
+                finally:
+                    self.createUploadJournalThreadingLock.release()
+        return self.uploadJournalModel
+
+    def GetManifestModel(self):
+        if not self.manifestModel and self.GetManifestPath() is not None:
+            """
+            This could be called from multiple threads simultaneously,
+            so it requires locking.
+            """
+            if not hasattr(self, "createManifestThreadingLock"):
+                self.createManifestThreadingLock = threading.Lock()
+            if self.createManifestThreadingLock.acquire():
+                try:
+                    if not self.manifestModel:
+                        self.manifestModel = \
+                            ManifestModel(self.GetManifestPath())
+                finally:
+                    self.createManifestThreadingLock.release()
+        return self.manifestModel
+
     def GetSshKeyPair(self):
         return self.sshKeyPair
 
@@ -488,7 +789,17 @@ class SettingsModel():
                       "dataset_grouping", "group_prefix",
                       "ignore_old_datasets", "ignore_interval_number",
                       "ignore_interval_unit", "max_upload_threads",
-                      "validate_folder_structure", "locked", "uuid"]
+                      "adaptive_upload_threads", "min_upload_threads",
+                      "max_hash_threads", "max_large_upload_threads",
+                      "large_file_threshold_mb", "gui_refresh_rate",
+                      "max_upload_rate_in_timer_window",
+                      "max_upload_rate_outside_timer_window",
+                      "limit_checksum_read_rate",
+                      "upload_scheduling_policy",
+                      "upload_scheduling_weights",
+                      "upload_retry_attempts", "upload_retry_delay",
+                      "validate_folder_structure",
+                      "watch_data_directory", "locked", "uuid"]
             for field in fields:
                 configParser.set("MyData", field, self.__dict__[field])
             configParser.write(configFile)
@@ -604,14 +915,13 @@ class SettingsModel():
                 datasetCount = self.validation.GetDatasetCount()
 
             try:
-                session = requests.Session()
-                r = session.get(self.GetMyTardisUrl() + "/about/")
+                r = self.GetApiClient().Get(self.GetMyTardisUrl() +
+                                            "/about/")
                 status_code = r.status_code
                 content = r.text
                 history = r.history
                 url = r.url
                 r.close()
-                session.close()
                 if status_code < 200 or status_code >= 300:
                     logger.debug("Received HTTP %d while trying to access "
                                  "MyTardis server (%s)."
@@ -691,11 +1001,8 @@ class SettingsModel():
             """
             url = self.GetMyTardisUrl() + \
                 "/api/v1/user/?format=json&username=" + self.GetUsername()
-            headers = {"Authorization": "ApiKey " + self.GetUsername() + ":" +
-                       self.GetApiKey(),
-                       "Content-Type": "application/json",
-                       "Accept": "application/json"}
-            response = requests.get(headers=headers, url=url)
+            response = self.GetApiClient().Get(
+                url, contentType="application/json")
             status_code = response.status_code
             # We don't care about the response content here, only the
             # status code, but failing to read the content risks leaving
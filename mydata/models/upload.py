@@ -32,6 +32,8 @@ class UploadModel():
         # self.progress = 0.0  # Percentage used to render progress bar
         self.progress = 0  # Percentage used to render progress bar
         self.status = UploadStatus.NOT_STARTED
+        # Set by the UploadsModel, which counts uploads by status:
+        self.statusCounter = None
         self.message = ""
         self.bufferedReader = None
         self.scpUploadProcess = None
@@ -65,13 +67,20 @@ class UploadModel():
     def SetProgress(self, progress):
         self.progress = progress
         if progress > 0 and progress < 100:
-            self.status = UploadStatus.IN_PROGRESS
+            self.SetStatus(UploadStatus.IN_PROGRESS)
 
     def GetStatus(self):
         return self.status
 
     def SetStatus(self, status):
-        self.status = status
+        statusCounter = self.statusCounter
+        if statusCounter is not None:
+            statusCounter.SetValue(self, status)
+        else:
+            self.status = status
+
+    def SetStatusCounter(self, statusCounter):
+        self.statusCounter = statusCounter
 
     def GetMessage(self):
         return self.message
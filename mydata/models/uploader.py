@@ -68,7 +68,6 @@ important.  It means that files created within that directory by the "mydata"
 user will have a default group of "www-data" (inherited from the "receiving"
 directory), instead of having a default group of "mydata".
 """
-import requests
 import json
 import os
 import psutil
@@ -287,19 +286,13 @@ class UploaderModel():
     def UploadUploaderInfo(self):
         """ Uploads info about the instrument PC to MyTardis via HTTP POST """
         myTardisUrl = self.settingsModel.GetMyTardisUrl()
-        myTardisDefaultUsername = self.settingsModel.GetUsername()
-        myTardisDefaultUserApiKey = self.settingsModel.GetApiKey()
 
         url = myTardisUrl + "/api/v1/mydata_uploader/?format=json" + \
             "&uuid=" + urllib.quote(self.uuid)
 
-        headers = {"Authorization": "ApiKey " + myTardisDefaultUsername + ":" +
-                   myTardisDefaultUserApiKey,
-                   "Content-Type": "application/json",
-                   "Accept": "application/json"}
-
         try:
-            response = requests.get(headers=headers, url=url)
+            response = self.settingsModel.GetApiClient().Get(
+                url, contentType="application/json")
         except Exception, e:
             logger.error(str(e))
             raise
@@ -375,9 +368,9 @@ class UploaderModel():
         data = json.dumps(uploaderJson, indent=4)
         logger.debug(data)
         if numExistingMatchingUploaderRecords > 0:
-            response = requests.put(headers=headers, url=url, data=data)
+            response = self.settingsModel.GetApiClient().Put(url, data=data)
         else:
-            response = requests.post(headers=headers, url=url, data=data)
+            response = self.settingsModel.GetApiClient().Post(url, data=data)
         if response.status_code >= 200 and response.status_code < 300:
             logger.info("Upload succeeded for uploader info.")
             self.responseJson = response.json()
@@ -395,19 +388,14 @@ class UploaderModel():
             keyPair = OpenSSH.NewKeyPair("MyData")
         self.settingsModel.SetSshKeyPair(keyPair)
         myTardisUrl = self.settingsModel.GetMyTardisUrl()
-        myTardisDefaultUsername = self.settingsModel.GetUsername()
-        myTardisDefaultUserApiKey = self.settingsModel.GetApiKey()
         url = myTardisUrl + \
             "/api/v1/mydata_uploaderregistrationrequest/?format=json" + \
             "&uploader__uuid=" + self.uuid + \
             "&requester_key_fingerprint=" + \
             urllib.quote(keyPair.GetFingerprint())
         logger.debug(url)
-        headers = {"Authorization": "ApiKey " + myTardisDefaultUsername + ":" +
-                   myTardisDefaultUserApiKey,
-                   "Content-Type": "application/json",
-                   "Accept": "application/json"}
-        response = requests.get(headers=headers, url=url)
+        response = self.settingsModel.GetApiClient().Get(
+            url, contentType="application/json")
         if response.status_code < 200 or response.status_code >= 300:
             if response.status_code == 404:
                 response.close()
@@ -443,13 +431,7 @@ class UploaderModel():
             keyPair = OpenSSH.NewKeyPair("MyData")
         self.settingsModel.SetSshKeyPair(keyPair)
         myTardisUrl = self.settingsModel.GetMyTardisUrl()
-        myTardisDefaultUsername = self.settingsModel.GetUsername()
-        myTardisDefaultUserApiKey = self.settingsModel.GetApiKey()
         url = myTardisUrl + "/api/v1/mydata_uploaderregistrationrequest/"
-        headers = {"Authorization": "ApiKey " + myTardisDefaultUsername + ":" +
-                   myTardisDefaultUserApiKey,
-                   "Content-Type": "application/json",
-                   "Accept": "application/json"}
         uploaderRegistrationRequestJson = \
             {"uploader": self.responseJson['resource_uri'],
              "name": self.name,
@@ -458,7 +440,7 @@ class UploaderModel():
              "requester_public_key": keyPair.GetPublicKey(),
              "requester_key_fingerprint": keyPair.GetFingerprint()}
         data = json.dumps(uploaderRegistrationRequestJson)
-        response = requests.post(headers=headers, url=url, data=data)
+        response = self.settingsModel.GetApiClient().Post(url, data=data)
         if response.status_code >= 200 and response.status_code < 300:
             responseJson = response.json()
             response.close()
@@ -1,4 +1,3 @@
-import requests
 import json
 import traceback
 import urllib2
@@ -113,33 +112,23 @@ class UserModel():
     @staticmethod
     def GetUserByUsername(settingsModel, username):
         myTardisUrl = settingsModel.GetMyTardisUrl()
-        myTardisUsername = settingsModel.GetUsername()
-        myTardisApiKey = settingsModel.GetApiKey()
 
         url = myTardisUrl + "/api/v1/user/?format=json&username=" + username
-        headers = {'Authorization': 'ApiKey ' + myTardisUsername + ":" +
-                   myTardisApiKey}
         try:
-            session = requests.Session()
-            response = session.get(url=url, headers=headers)
+            response = settingsModel.GetApiClient().Get(url)
         except:
-            response.close()
-            session.close()
             raise Exception(traceback.format_exc())
         if response.status_code != 200:
             message = response.text
             response.close()
-            session.close()
             raise Exception(message)
         try:
             userRecordsJson = response.json()
         except:
             logger.error(traceback.format_exc())
             response.close()
-            session.close()
             raise
         response.close()
-        session.close()
         numUserRecordsFound = userRecordsJson['meta']['total_count']
 
         if numUserRecordsFound == 0:
@@ -154,35 +143,25 @@ class UserModel():
     @staticmethod
     def GetUserByEmail(settingsModel, email):
         myTardisUrl = settingsModel.GetMyTardisUrl()
-        myTardisUsername = settingsModel.GetUsername()
-        myTardisApiKey = settingsModel.GetApiKey()
 
         url = myTardisUrl + "/api/v1/user/?format=json&email__iexact=" + \
             urllib2.quote(email)
-        headers = {'Authorization': 'ApiKey ' + myTardisUsername + ":" +
-                   myTardisApiKey}
         try:
-            session = requests.Session()
-            response = session.get(url=url, headers=headers)
+            response = settingsModel.GetApiClient().Get(url)
         except:
-            response.close()
-            session.close()
             raise Exception(traceback.format_exc())
         if response.status_code != 200:
             logger.debug(url)
             message = response.text
             response.close()
-            session.close()
             raise Exception(message)
         try:
             userRecordsJson = response.json()
         except:
             logger.error(traceback.format_exc())
             response.close()
-            session.close()
             raise
         response.close()
-        session.close()
         numUserRecordsFound = userRecordsJson['meta']['total_count']
 
         if numUserRecordsFound == 0:
@@ -27,6 +27,10 @@ class VerificationModel():
         self.message = ""
         self.status = VerificationStatus.NOT_STARTED
         self.complete = False
+        # Set by the VerificationsModel, which counts verifications by
+        # status and by whether they are complete:
+        self.statusCounter = None
+        self.completeCounter = None
 
     def GetDataViewId(self):
         return self.dataViewId
@@ -41,13 +45,25 @@ class VerificationModel():
         return self.status
 
     def SetComplete(self, complete=True):
-        self.complete = complete
+        completeCounter = self.completeCounter
+        if completeCounter is not None:
+            completeCounter.SetValue(self, complete)
+        else:
+            self.complete = complete
 
     def GetComplete(self):
         return self.complete
 
     def SetStatus(self, status):
-        self.status = status
+        statusCounter = self.statusCounter
+        if statusCounter is not None:
+            statusCounter.SetValue(self, status)
+        else:
+            self.status = status
+
+    def SetCounters(self, statusCounter, completeCounter):
+        self.statusCounter = statusCounter
+        self.completeCounter = completeCounter
 
     def GetMessage(self):
         return self.message
@@ -0,0 +1,101 @@
+"""
+mydata/utils/apiclient.py
+
+The purpose of this module is to provide a single MyTardis API client,
+shared by all of MyData's models and worker threads, so that connections
+to the MyTardis server can be kept alive and reused, rather than
+performing a new TCP (and TLS) handshake for every API request.
+
+The client is owned by the SettingsModel (see
+SettingsModel.GetApiClient), because it depends on the MyTardis URL,
+username, API key and maximum number of upload threads, all of which
+can be changed in the Settings dialog.  If any of these change, the
+client rebuilds its headers and/or its connection pool the next time
+it is used.
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ApiClient():
+    def __init__(self, settingsModel):
+        self.settingsModel = settingsModel
+        self.session = None
+        self.poolSize = None
+        self.credentials = None
+        self.headers = None
+        self.sessionLock = threading.Lock()
+        # (connect timeout, read timeout) in seconds for all requests.
+        # The read timeout needs to be long enough to list all of the
+        # files in a large dataset.
+        self.timeout = (10, 300)  # FIXME: magic numbers
+
+    def GetPoolSize(self):
+        """
+        Each upload worker thread (in both the small-file and large-file
+        lanes, which share max_upload_threads) and each verification
+        worker thread could be using a connection, plus the thread which
+        creates experiments and datasets.
+        """
+        return 2 * self.settingsModel.GetMaxUploadThreads() + 1
+
+    def GetSession(self):
+        with self.sessionLock:
+            poolSize = self.GetPoolSize()
+            if self.session is None or poolSize != self.poolSize:
+                # The old session isn't closed, because other threads may
+                # still be in the middle of requests using it.  Its
+                # connections are closed when it is garbage collected.
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=poolSize)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.session = session
+                self.poolSize = poolSize
+            return self.session
+
+    def GetHeaders(self, contentType=None):
+        """
+        Returns the authorization headers for the MyTardis API, only
+        rebuilding them if the username or API key has changed.
+        """
+        credentials = (self.settingsModel.GetUsername(),
+                       self.settingsModel.GetApiKey())
+        if credentials != self.credentials:
+            self.headers = {"Authorization": "ApiKey %s:%s" % credentials}
+            self.credentials = credentials
+        headers = dict(self.headers)
+        if contentType:
+            headers["Content-Type"] = contentType
+            headers["Accept"] = contentType
+        return headers
+
+    def Request(self, method, url, contentType=None, **kwargs):
+        headers = self.GetHeaders(contentType)
+        if "headers" in kwargs:
+            headers.update(kwargs.pop("headers"))
+        kwargs.setdefault("timeout", self.timeout)
+        return self.GetSession().request(method, url, headers=headers,
+                                         **kwargs)
+
+    def Get(self, url, **kwargs):
+        return self.Request("GET", url, **kwargs)
+
+    def Post(self, url, data=None, contentType="application/json",
+             **kwargs):
+        return self.Request("POST", url, data=data, contentType=contentType,
+                            **kwargs)
+
+    def Put(self, url, data=None, contentType="application/json",
+            **kwargs):
+        return self.Request("PUT", url, data=data, contentType=contentType,
+                            **kwargs)
+
+    def Close(self):
+        with self.sessionLock:
+            if self.session is not None:
+                self.session.close()
+                self.session = None
@@ -0,0 +1,191 @@
+"""
+mydata/utils/concurrency.py
+
+The purpose of this module is to allow MyData to find the number of
+concurrent uploads which gives the most throughput that the staging host
+will tolerate, rather than relying on a fixed number of upload threads
+typed into the settings dialog.
+
+When the "adaptive_upload_threads" setting is enabled, each upload lane
+(small files and large files) has its own AdaptiveConcurrencyLimit.
+The lane's upload workers must call Acquire before taking each upload
+task from the lane's queue, and Release afterwards, so that only
+GetLimit() of them can be uploading at once, and so that a task isn't
+taken by a worker which isn't allowed to run it yet.  A worker holding
+its slot may still be waiting for a task, so workers also call
+TaskStarted and TaskFinished around each upload, to show whether all of
+the permitted workers were really busy.  Each upload reports the bytes
+it sends, and whether it succeeded, to its lane's limit.  The limit is
+adjusted using an AIMD (additive increase, multiplicative decrease)
+rule, once per measurement interval:
+
+If the staging host refused an SSH connection (e.g. because of sshd's
+MaxStartups), or the proportion of failed uploads exceeded
+maxErrorRate, the limit is halved.
+
+Otherwise, if all of the permitted workers were busy during the interval,
+the limit is increased by one, unless the aggregate bytes per second
+dropped after the last increase, in which case that increase is undone.
+
+The limit is always kept between the minimum and maximum number of
+upload workers in the lane.
+"""
+import threading
+import time
+
+from mydata.logs import logger
+
+
+class AdaptiveConcurrencyLimit():
+    def __init__(self, minLimit, maxLimit, onLimitChanged=None):
+        self.minLimit = max(1, minLimit)
+        self.maxLimit = max(self.minLimit, maxLimit)
+        self.limit = self.minLimit
+        self.onLimitChanged = onLimitChanged
+        self.numActive = 0
+        self.numBusy = 0
+        self.stopped = False
+        self.condition = threading.Condition()
+
+        self.interval = 10  # FIXME: magic number (seconds)
+        self.maxErrorRate = 0.1  # FIXME: magic number
+        # Throughput is considered to have dropped if it falls by more
+        # than this fraction.
+        self.tolerance = 0.05  # FIXME: magic number
+        self.lastBytesPerSecond = None
+        self.lastAdjustmentWasIncrease = False
+        self.lastDecreaseTime = 0
+        self.ResetMeasurements()
+
+    def ResetMeasurements(self):
+        """
+        Should be called with self.condition acquired.
+        """
+        self.intervalStartTime = time.time()
+        self.intervalBytes = 0
+        self.intervalSuccesses = 0
+        self.intervalErrors = 0
+        self.intervalRefused = False
+        self.intervalSaturated = self.numBusy >= self.limit
+
+    def GetLimit(self):
+        return self.limit
+
+    def GetMinLimit(self):
+        return self.minLimit
+
+    def Acquire(self):
+        """
+        Blocks until fewer than GetLimit() workers are active.  Returns
+        False if Stop has been called, in which case the worker should
+        exit without calling Release.
+        """
+        with self.condition:
+            while not self.stopped and self.numActive >= self.limit:
+                self.condition.wait(1)
+            if self.stopped:
+                return False
+            self.numActive += 1
+            return True
+
+    def Release(self):
+        with self.condition:
+            self.numActive -= 1
+            self.condition.notify()
+
+    def TaskStarted(self):
+        with self.condition:
+            self.numBusy += 1
+            if self.numBusy >= self.limit:
+                self.intervalSaturated = True
+
+    def TaskFinished(self):
+        with self.condition:
+            self.numBusy -= 1
+
+    def Stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notifyAll()
+
+    def RecordBytes(self, numBytes):
+        with self.condition:
+            self.intervalBytes += numBytes
+            self.AdjustIfIntervalElapsed()
+
+    def RecordSuccess(self):
+        with self.condition:
+            self.intervalSuccesses += 1
+            self.AdjustIfIntervalElapsed()
+
+    def RecordError(self, refused=False):
+        """
+        refused should be True if the staging host refused an SSH
+        connection, in which case the limit is decreased straight away,
+        rather than waiting for the end of the measurement interval
+        (unless it was already decreased within the last interval, so
+        that several workers being refused at once only count once).
+        """
+        with self.condition:
+            self.intervalErrors += 1
+            if refused:
+                self.intervalRefused = True
+                if time.time() - self.lastDecreaseTime >= self.interval:
+                    self.Adjust()
+                    return
+            self.AdjustIfIntervalElapsed()
+
+    def AdjustIfIntervalElapsed(self):
+        """
+        Should be called with self.condition acquired.
+        """
+        if time.time() - self.intervalStartTime >= self.interval:
+            self.Adjust()
+
+    def Adjust(self):
+        """
+        Should be called with self.condition acquired.
+        """
+        elapsed = max(time.time() - self.intervalStartTime, 0.001)
+        bytesPerSecond = self.intervalBytes / elapsed
+        numResults = self.intervalSuccesses + self.intervalErrors
+        errorRate = 0.0
+        if numResults > 0:
+            errorRate = float(self.intervalErrors) / numResults
+        oldLimit = self.limit
+        if self.intervalRefused or errorRate > self.maxErrorRate:
+            self.limit = max(self.minLimit, self.limit / 2)
+            self.lastAdjustmentWasIncrease = False
+            self.lastDecreaseTime = time.time()
+            reason = "error rate %.0f%%%s" \
+                % (errorRate * 100,
+                   ", staging host refused connection"
+                   if self.intervalRefused else "")
+        elif self.lastAdjustmentWasIncrease and \
+                self.lastBytesPerSecond is not None and \
+                bytesPerSecond < \
+                self.lastBytesPerSecond * (1.0 - self.tolerance):
+            self.limit = max(self.minLimit, self.limit - 1)
+            self.lastAdjustmentWasIncrease = False
+            reason = "throughput dropped"
+        elif self.intervalSaturated:
+            self.limit = min(self.maxLimit, self.limit + 1)
+            self.lastAdjustmentWasIncrease = self.limit > oldLimit
+            reason = "all upload workers busy"
+        else:
+            self.lastAdjustmentWasIncrease = False
+            reason = None
+        self.lastBytesPerSecond = bytesPerSecond
+        self.ResetMeasurements()
+        if self.limit != oldLimit:
+            logger.debug("Changing number of active upload workers from "
+                         "%d to %d (%s, %.1f MB/s)."
+                         % (oldLimit, self.limit, reason,
+                            bytesPerSecond / (1024 * 1024)))
+            self.condition.notifyAll()
+            if self.onLimitChanged:
+                try:
+                    self.onLimitChanged(self.limit)
+                except:
+                    logger.warning("Couldn't apply new upload worker limit "
+                                   "of %d." % self.limit)
@@ -0,0 +1,91 @@
+"""
+mydata/utils/multipart.py
+
+The purpose of this module is to allow data files to be uploaded with
+HTTP POST by several upload worker threads at once, using the shared
+(thread-safe) ApiClient, rather than using poster's streaming urllib2
+openers, which are not thread-safe.
+
+MultipartFileStream is a file-like object which generates a
+multipart/form-data request body on the fly, reading the data file one
+block at a time (rather than loading it into memory), and reporting
+progress as the data file is read.  Because it has a length, requests
+sends it with a Content-Length header, rather than using chunked
+transfer encoding, which isn't supported by all web servers.
+"""
+import uuid
+from StringIO import StringIO
+
+
+class MultipartFileStream():
+    def __init__(self, fields, fileFieldName, fileName, fileObject,
+                 fileSize, progressCallback=None, bandwidthLimiter=None):
+        """
+        fields is a dictionary of (string) form fields to send before the
+        file.  progressCallback is called like poster's callbacks, i.e.
+        progressCallback(param, current, total), where current is the
+        number of bytes of the file which have been read so far.
+        If a bandwidthLimiter (see mydata.utils.ratelimit) is provided,
+        reading the file is slowed down to stay within its current rate.
+        """
+        self.boundary = uuid.uuid4().hex
+        self.fileObject = fileObject
+        self.fileSize = fileSize
+        self.fileBytesRead = 0
+        self.progressCallback = progressCallback
+        self.bandwidthLimiter = bandwidthLimiter
+
+        if isinstance(fileName, unicode):
+            fileName = fileName.encode("utf-8")
+        preamble = ""
+        for name, value in fields.iteritems():
+            if isinstance(value, unicode):
+                value = value.encode("utf-8")
+            preamble += "--%s\r\n" % self.boundary
+            preamble += "Content-Disposition: form-data; name=\"%s\"" \
+                "\r\n\r\n" % name
+            preamble += "%s\r\n" % value
+        preamble += "--%s\r\n" % self.boundary
+        preamble += "Content-Disposition: form-data; name=\"%s\"; " \
+            "filename=\"%s\"\r\n" % (fileFieldName,
+                                     fileName.replace("\"", "\\\""))
+        preamble += "Content-Type: application/octet-stream\r\n\r\n"
+        epilogue = "\r\n--%s--\r\n" % self.boundary
+
+        self.length = len(preamble) + fileSize + len(epilogue)
+        self.parts = [StringIO(preamble), fileObject, StringIO(epilogue)]
+        self.partIndex = 0
+
+    def GetContentType(self):
+        return "multipart/form-data; boundary=%s" % self.boundary
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        chunks = []
+        while self.partIndex < len(self.parts) and size != 0:
+            part = self.parts[self.partIndex]
+            chunk = part.read(size)
+            if not chunk:
+                self.partIndex += 1
+                continue
+            if part is self.fileObject:
+                if self.bandwidthLimiter:
+                    self.bandwidthLimiter.Consume(len(chunk))
+                self.fileBytesRead += len(chunk)
+                if self.progressCallback:
+                    self.progressCallback(None, self.fileBytesRead,
+                                          self.fileSize)
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return "".join(chunks)
+
+    def __iter__(self):
+        blockSize = 64 * 1024  # FIXME: magic number
+        while True:
+            chunk = self.read(blockSize)
+            if not chunk:
+                return
+            yield chunk
@@ -123,6 +123,17 @@ class OpenSSH():
             # subprocess to quote the command lists correctly.
             self.preferToUseShellInSubprocess = True
 
+        # This should be less than MaxSessions in the staging server's
+        # sshd_config.  It is adjusted by FoldersController to match the
+        # number of upload workers.
+        self.maxControlMasterConnections = 5
+
+    def SetMaxControlMasterConnections(self, maxConnections):
+        self.maxControlMasterConnections = maxConnections
+        sshControlMasterPool = getattr(self, "sshControlMasterPool", None)
+        if sshControlMasterPool:
+            sshControlMasterPool.SetMaxConnections(maxConnections)
+
     def GetSshControlMasterPool(self, username=None, privateKeyFilePath=None,
                                 hostname=None, createIfMissing=True):
         """
@@ -138,7 +149,8 @@ class OpenSSH():
                 self.createSshControlMasterPoolThreadingLock.acquire()
                 self.sshControlMasterPool = \
                     SshControlMasterPool(username, privateKeyFilePath,
-                                         hostname)
+                                         hostname,
+                                         self.maxControlMasterConnections)
                 self.createSshControlMasterPoolThreadingLock.release()
             else:
                 return None
@@ -376,23 +388,91 @@ def NewKeyPair(keyName=None,
         raise SshException(stdout)
 
 
-def GetBytesUploadedToStaging(remoteFilePath, username, privateKeyFilePath,
-                              hostname, uploadOrVerificationModel):
-    if sys.platform.startswith("win"):
-        privateKeyFilePath = GetMsysPath(privateKeyFilePath)
-    quotedRemoteFilePath = openSSH.DoubleQuote(remoteFilePath)
-
+def CheckSshOutputLine(line, stdout, hostname):
+    """
+    Raises an exception if a line of output from ssh shows that MyData
+    couldn't connect to (or authenticate into) the staging host.
+    """
+    if line == "ssh_exchange_identification: read: " \
+            "Connection reset by peer" or \
+            line == "ssh_exchange_identification: " \
+                    "Connection closed by remote host":
+        message = "The MyTardis staging host assigned to your " \
+            "MyData instance (%s) refused MyData's attempted " \
+            "SSH connection." \
+            "\n\n" \
+            "There are a few possible reasons why this could occur." \
+            "\n\n" \
+            "1. Your MyTardis administrator could have forgotten to " \
+            "grant your IP address access to MyTardis's staging " \
+            "host, or" \
+            "\n\n" \
+            "2. Your IP address could have changed sinced you were " \
+            "granted access to MyTardis's staging host, or" \
+            "\n\n" \
+            "3. MyData's attempts to log in to MyTardis's staging host " \
+            "could have been flagged as suspicious, and your IP " \
+            "address could have been temporarily banned." \
+            "\n\n" \
+            "4. MyData could be running more simultaneous upload threads " \
+            "than your staging server can handle.  Ask your staging server " \
+            "administrator to check the values of MaxStartups and MaxSessions " \
+            "in the server's /etc/ssh/sshd_config" \
+            "\n\n" \
+            "In any of these cases, it is best to contact your " \
+            "MyTardis administrator for assistance." % hostname
+        logger.error(stdout)
+        logger.error(message)
+        raise StagingHostRefusedSshConnection(message)
+    elif line == "Permission denied (publickey,password).":
+        message = "MyData was unable to authenticate into the " \
+            "MyTardis staging host assigned to your MyData instance " \
+            "(%s)." \
+            "\n\n" \
+            "There are a few possible reasons why this could occur." \
+            "\n\n" \
+            "1. Your MyTardis administrator could have failed to add " \
+            "the public key generated by your MyData instance to the " \
+            "appropriate ~/.ssh/authorized_keys file on MyTardis's " \
+            "staging host, or" \
+            "\n\n" \
+            "2. The private key generated by MyData (a file called " \
+            "\"MyData\" in the \".ssh\" folder within your " \
+            "user home folder (%s) could have been deleted or moved." \
+            "\n\n" \
+            "3. The permissions on %s could be too open - only the " \
+            "current user account should be able to access this private " \
+            "key file." \
+            "\n\n" \
+            "In any of these cases, it is best to contact your " \
+            "MyTardis administrator for assistance." \
+            % (hostname, os.path.expanduser("~"),
+               os.path.join(os.path.expanduser("~"), ".ssh",
+                            "MyData"))
+
+        logger.error(message)
+        raise StagingHostSshPermissionDenied(message)
+
+
+def RunRemoteCommandForPaths(remoteCommand, remoteFilePaths, username,
+                             privateKeyFilePath, hostname):
+    """
+    Runs remoteCommand on the staging host with a single SSH command,
+    writing remoteFilePaths to its stdin, one per line.  Returns
+    (returncode, stdout, stderr).
+    """
     if sys.platform.startswith("win"):
         cmdAndArgs = [openSSH.DoubleQuote(openSSH.ssh),
-                      "-n",
                       "-c", openSSH.cipher,
-                      "-i", openSSH.DoubleQuote(privateKeyFilePath),
+                      "-i",
+                      openSSH.DoubleQuote(GetMsysPath(privateKeyFilePath)),
                       "-oIdentitiesOnly=yes",
                       "-oPasswordAuthentication=no",
                       "-oStrictHostKeyChecking=no",
                       "-l", username,
                       hostname,
-                      openSSH.DoubleQuote("wc -c %s" % quotedRemoteFilePath)]
+                      openSSH.DoubleQuote(remoteCommand)]
+        cmd = " ".join(cmdAndArgs)
     else:
         sshControlMasterPool = \
             openSSH.GetSshControlMasterPool(username, privateKeyFilePath,
@@ -405,97 +485,206 @@ def GetBytesUploadedToStaging(remoteFilePath, username, privateKeyFilePath,
         # shouldn't be necessary if the socket created by the SSH master
         # process (sshControlPath)is ready), but we can't guarantee that it
         # will be ready immediately.
-        cmdAndArgs = [openSSH.DoubleQuote(openSSH.ssh),
-                      "-c", openSSH.cipher,
-                      "-i", openSSH.DoubleQuote(privateKeyFilePath),
-                      "-oIdentitiesOnly=yes",
-                      "-oPasswordAuthentication=no",
-                      "-oStrictHostKeyChecking=no",
-                      "-l", username,
-                      "-oControlPath=%s" % openSSH.DoubleQuote(sshControlPath),
-                      hostname,
-                      openSSH.DoubleQuote("wc -c %s" % quotedRemoteFilePath)]
-    cmdString = " ".join(cmdAndArgs)
-    logger.debug(cmdString)
-    proc = subprocess.Popen(cmdString,
-                            shell=openSSH.preferToUseShellInSubprocess,
+        #
+        # The remote command may contain "$f", which must not be expanded
+        # by a local shell, so we use an argument list with shell=False.
+        # (subprocess doesn't need to quote anything on POSIX systems
+        # when shell=False - each argument is passed to ssh as is.)
+        cmd = [openSSH.ssh,
+               "-c", openSSH.cipher,
+               "-i", privateKeyFilePath,
+               "-oIdentitiesOnly=yes",
+               "-oPasswordAuthentication=no",
+               "-oStrictHostKeyChecking=no",
+               "-l", username,
+               "-oControlPath=%s" % sshControlPath,
+               hostname,
+               remoteCommand]
+    logger.debug("Running \"%s\" for %d path(s) on staging host %s"
+                 % (remoteCommand, len(remoteFilePaths), hostname))
+    proc = subprocess.Popen(cmd,
+                            shell=False,
+                            stdin=subprocess.PIPE,
                             stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT,
+                            stderr=subprocess.PIPE,
                             startupinfo=defaultStartupInfo,
                             creationflags=defaultCreationFlags)
-    stdout, _ = proc.communicate()
-    lines = stdout.splitlines()
-    bytesUploaded = 0
-    for line in lines:
-        match = re.search(r"^(\d+)\s+\S+", line)
+    stdout, stderr = proc.communicate("".join(["%s\n" % remoteFilePath
+                                               for remoteFilePath
+                                               in remoteFilePaths]))
+    return (proc.returncode, stdout, stderr)
+
+
+def GetBytesUploadedToStagingForPaths(remoteFilePaths, username,
+                                      privateKeyFilePath, hostname):
+    """
+    Gets the sizes of many (partially) uploaded files in the staging area
+    with a single SSH command, which reads the remote paths from its
+    stdin, and prints one size per path, in the same order, or -1 if the
+    file doesn't exist.  Returns a dictionary of sizes, keyed by remote
+    path, with 0 for files which don't exist.
+    """
+    remoteCommand = "sh -c 'while IFS= read -r f; do " \
+        "wc -c 2>/dev/null < \"$f\" || echo -1; done'"
+    returncode, stdout, stderr = \
+        RunRemoteCommandForPaths(remoteCommand, remoteFilePaths, username,
+                                 privateKeyFilePath, hostname)
+    sizes = []
+    for line in stdout.splitlines():
+        match = re.search(r"^\s*(-?\d+)\s*$", line)
         if match:
-            bytesUploaded = long(match.groups()[0])
-            return bytesUploaded
-        elif "No such file or directory" in line:
-            bytesUploaded = 0
-            return bytesUploaded
-        elif line == "ssh_exchange_identification: read: " \
-                "Connection reset by peer" or \
-                line == "ssh_exchange_identification: " \
-                        "Connection closed by remote host":
-            message = "The MyTardis staging host assigned to your " \
-                "MyData instance (%s) refused MyData's attempted " \
-                "SSH connection." \
-                "\n\n" \
-                "There are a few possible reasons why this could occur." \
-                "\n\n" \
-                "1. Your MyTardis administrator could have forgotten to " \
-                "grant your IP address access to MyTardis's staging " \
-                "host, or" \
-                "\n\n" \
-                "2. Your IP address could have changed sinced you were " \
-                "granted access to MyTardis's staging host, or" \
-                "\n\n" \
-                "3. MyData's attempts to log in to MyTardis's staging host " \
-                "could have been flagged as suspicious, and your IP " \
-                "address could have been temporarily banned." \
-                "\n\n" \
-                "4. MyData could be running more simultaneous upload threads " \
-                "than your staging server can handle.  Ask your staging server " \
-                "administrator to check the values of MaxStartups and MaxSessions " \
-                "in the server's /etc/ssh/sshd_config" \
-                "\n\n" \
-                "In any of these cases, it is best to contact your " \
-                "MyTardis administrator for assistance." % hostname
-            logger.error(stdout)
-            logger.error(message)
-            raise StagingHostRefusedSshConnection(message)
-        elif line == "Permission denied (publickey,password).":
-            message = "MyData was unable to authenticate into the " \
-                "MyTardis staging host assigned to your MyData instance " \
-                "(%s)." \
-                "\n\n" \
-                "There are a few possible reasons why this could occur." \
-                "\n\n" \
-                "1. Your MyTardis administrator could have failed to add " \
-                "the public key generated by your MyData instance to the " \
-                "appropriate ~/.ssh/authorized_keys file on MyTardis's " \
-                "staging host, or" \
-                "\n\n" \
-                "2. The private key generated by MyData (a file called " \
-                "\"MyData\" in the \".ssh\" folder within your " \
-                "user home folder (%s) could have been deleted or moved." \
-                "\n\n" \
-                "3. The permissions on %s could be too open - only the " \
-                "current user account should be able to access this private " \
-                "key file." \
-                "\n\n" \
-                "In any of these cases, it is best to contact your " \
-                "MyTardis administrator for assistance." \
-                % (hostname, os.path.expanduser("~"),
-                   os.path.join(os.path.expanduser("~"), ".ssh",
-                                "MyData"))
-
-            logger.error(message)
-            raise StagingHostSshPermissionDenied(message)
+            sizes.append(max(0, long(match.groups()[0])))
         else:
             logger.debug(line)
-    return bytesUploaded
+    if len(sizes) != len(remoteFilePaths):
+        for line in stderr.splitlines():
+            CheckSshOutputLine(line, stderr, hostname)
+            logger.debug(line)
+        raise SshException("Expected %d file sizes from %s, but received "
+                           "%d.\n\n%s" % (len(remoteFilePaths), hostname,
+                                          len(sizes), stdout + stderr),
+                           returncode)
+    return dict(zip(remoteFilePaths, sizes))
+
+
+class StagingFileSizeCache():
+    """
+    Avoids launching a separate SSH process to check the size of each
+    partially uploaded file in the staging area, e.g. after an outage,
+    when many files' datafile records on MyTardis have no verified
+    replicas.
+
+    When the size of one file is requested, the sizes of other files
+    which are likely to be requested soon (e.g. the other unverified
+    replicas in the same dataset) can be looked up in the same SSH
+    command, and are cached until they are requested.  Each cached size
+    is only used once, because the file may be appended to after that.
+    A new cache is created for each upload run.
+
+    The other paths are provided by a function (getOtherRemoteFilePaths),
+    which is only called when the requested size isn't already cached,
+    because building the list of paths can be expensive for a large
+    dataset.
+    """
+    def __init__(self, username, privateKeyFilePath, hostname):
+        self.username = username
+        self.privateKeyFilePath = privateKeyFilePath
+        self.hostname = hostname
+        self.sizes = {}
+        self.pathsBeingChecked = set()
+        self.condition = threading.Condition()
+        self.maxPathsPerCommand = 1000  # FIXME: magic number
+
+    def GetBytesUploadedToStaging(self, remoteFilePath,
+                                  getOtherRemoteFilePaths=None):
+        with self.condition:
+            while remoteFilePath in self.pathsBeingChecked:
+                self.condition.wait()
+            if remoteFilePath in self.sizes:
+                return self.sizes.pop(remoteFilePath)
+            remoteFilePaths = [remoteFilePath]
+            otherRemoteFilePaths = ()
+            if getOtherRemoteFilePaths:
+                otherRemoteFilePaths = getOtherRemoteFilePaths()
+            for otherRemoteFilePath in otherRemoteFilePaths:
+                if len(remoteFilePaths) >= self.maxPathsPerCommand:
+                    break
+                if otherRemoteFilePath != remoteFilePath and \
+                        otherRemoteFilePath not in self.sizes and \
+                        otherRemoteFilePath not in self.pathsBeingChecked:
+                    remoteFilePaths.append(otherRemoteFilePath)
+            self.pathsBeingChecked.update(remoteFilePaths)
+        sizes = {}
+        try:
+            sizes = GetBytesUploadedToStagingForPaths(
+                remoteFilePaths, self.username, self.privateKeyFilePath,
+                self.hostname)
+        finally:
+            with self.condition:
+                for otherRemoteFilePath in remoteFilePaths[1:]:
+                    if otherRemoteFilePath in sizes:
+                        self.sizes[otherRemoteFilePath] = \
+                            sizes[otherRemoteFilePath]
+                self.pathsBeingChecked.difference_update(remoteFilePaths)
+                self.condition.notifyAll()
+        return sizes[remoteFilePath]
+
+
+def MakeRemoteDirectories(remoteDirs, username, privateKeyFilePath,
+                          hostname):
+    remoteCommand = "sh -c 'while IFS= read -r d; do " \
+        "mkdir -p \"$d\" || exit 1; done'"
+    returncode, stdout, stderr = \
+        RunRemoteCommandForPaths(remoteCommand, remoteDirs, username,
+                                 privateKeyFilePath, hostname)
+    if returncode != 0:
+        for line in stderr.splitlines():
+            CheckSshOutputLine(line, stderr, hostname)
+        raise SshException(stdout + stderr, returncode)
+
+
+def RemoveRemoteFiles(remoteFilePaths, username, privateKeyFilePath,
+                      hostname):
+    remoteCommand = "sh -c 'while IFS= read -r f; do " \
+        "rm -f \"$f\"; done'"
+    returncode, stdout, stderr = \
+        RunRemoteCommandForPaths(remoteCommand, remoteFilePaths, username,
+                                 privateKeyFilePath, hostname)
+    if returncode != 0:
+        raise SshException(stdout + stderr, returncode)
+
+
+class StagingDirectoryCache():
+    """
+    Remembers which directories have already been created in the staging
+    area during this upload run, so that we don't need to run
+    "ssh mkdir -p ..." before uploading every file, when many files
+    are uploaded into the same dataset directory.
+
+    It also keeps track of the temporary chunk files created by
+    UploadLargeFileFromWindows, so that they can all be removed with a
+    single SSH command at the end of the upload run, rather than one
+    SSH command per file.
+    """
+    def __init__(self, username, privateKeyFilePath, hostname):
+        self.username = username
+        self.privateKeyFilePath = privateKeyFilePath
+        self.hostname = hostname
+        self.createdDirs = set()
+        self.chunkFilePaths = set()
+        self.lock = threading.Lock()
+
+    def MakeDirectory(self, remoteDir):
+        with self.lock:
+            if remoteDir in self.createdDirs:
+                return
+        MakeRemoteDirectories([remoteDir], self.username,
+                              self.privateKeyFilePath, self.hostname)
+        with self.lock:
+            self.createdDirs.add(remoteDir)
+
+    def ForgetDirectory(self, remoteDir):
+        """
+        Called when an upload fails, in case it failed because the
+        directory has been removed from the staging area.
+        """
+        with self.lock:
+            self.createdDirs.discard(remoteDir)
+
+    def AddChunkFile(self, remoteChunkPath):
+        with self.lock:
+            self.chunkFilePaths.add(remoteChunkPath)
+
+    def RemoveChunkFiles(self):
+        with self.lock:
+            chunkFilePaths = sorted(self.chunkFilePaths)
+            self.chunkFilePaths = set()
+        if len(chunkFilePaths) == 0:
+            return
+        logger.debug("Removing %d chunk file(s) from staging."
+                     % len(chunkFilePaths))
+        RemoveRemoteFiles(chunkFilePaths, self.username,
+                          self.privateKeyFilePath, self.hostname)
 
 
 def UploadFile(filePath, fileSize, username, privateKeyFilePath,
@@ -510,7 +699,9 @@ def UploadFile(filePath, fileSize, username, privateKeyFilePath,
     """
 
     bytesUploaded = 0
-    largeFileSize = 10 * 1024 * 1024  # FIXME: Magic number
+    # Large files are resumed if they were partially uploaded, and on
+    # Windows, they are uploaded in separate chunks.
+    largeFileSize = foldersController.GetLargeFileSize()
 
     if fileSize > largeFileSize:
         ProgressCallback(None, bytesUploaded, fileSize,
@@ -518,10 +709,10 @@ def UploadFile(filePath, fileSize, username, privateKeyFilePath,
         if uploadModel.GetBytesUploadedToStaging() is not None:
             bytesUploaded = uploadModel.GetBytesUploadedToStaging()
         else:
-            bytesUploaded = GetBytesUploadedToStaging(remoteFilePath,
-                                                      username,
-                                                      privateKeyFilePath,
-                                                      hostname, uploadModel)
+            bytesUploaded = foldersController\
+                .GetStagingFileSizeCache(username, privateKeyFilePath,
+                                         hostname)\
+                .GetBytesUploadedToStaging(remoteFilePath)
             uploadModel.SetBytesUploadedToStaging(bytesUploaded)
     if 0 < bytesUploaded < fileSize:
         ProgressCallback(None, bytesUploaded, fileSize,
@@ -534,6 +725,7 @@ def UploadFile(filePath, fileSize, username, privateKeyFilePath,
     if bytesUploaded == fileSize:
         logger.debug("UploadFile returning because file \"%s\" has already "
                      "been uploaded." % filePath)
+        ProgressCallback(None, bytesUploaded, fileSize)
         return
     elif bytesUploaded > fileSize:
         logger.error("Possibly due to a bug in MyData, the file size on "
@@ -574,18 +766,20 @@ def UploadFileFromPosixSystem(filePath, fileSize, username, privateKeyFilePath,
     and ControlPath options in "man ssh_config"), but they are not
     available on Windows.
 
-    We want to ensure that the partially uploaded datafile in MyTardis's
-    staging area always has a whole number of chunks.  If we were to
-    append each chunk directly to the datafile at the same time as
-    sending it over the SSH channel, there would be a risk of a broken
-    connection resulting in a partial chunk being appended to the datafile.
-    So we upload the chunk to its own file on the remote server first,
-    and then append the chunk onto the remote (partial) datafile.
-    """
+    The file is streamed from the local file to a single remote
+    "cat >> remoteFilePath" process through the SSH channel's stdin, so
+    there is only one SSH process per file, with no local temporary
+    chunk files and no remote chunk files.
 
-    remoteChunkPath = remoteFilePath + ".chunk"
+    Because the remote cat process only ever appends the bytes it has
+    received, in order, the partially uploaded datafile in MyTardis's
+    staging area is always a prefix of the local file (even if the
+    connection is broken mid-chunk), so an interrupted upload can be
+    resumed from whatever size GetBytesUploadedToStaging reports.
+    """
 
-    # logger.warning("Assuming that the remote shell is Bash.")
+    def AbortCheck():
+        return foldersController.IsShuttingDown() or uploadModel.Canceled()
 
     sshControlMasterPool = \
         openSSH.GetSshControlMasterPool(username, privateKeyFilePath,
@@ -595,219 +789,95 @@ def UploadFileFromPosixSystem(filePath, fileSize, username, privateKeyFilePath,
     sshControlPath = sshControlMasterProcess.GetControlPath()
 
     remoteDir = os.path.dirname(remoteFilePath)
-    quotedRemoteDir = openSSH.DoubleQuote(remoteDir)
-    mkdirCmdAndArgs = \
-        [openSSH.DoubleQuote(openSSH.ssh),
-         "-i", openSSH.DoubleQuote(privateKeyFilePath),
-         "-c", openSSH.cipher,
-         "-oControlPath=%s" % openSSH.DoubleQuote(sshControlPath),
-         "-oIdentitiesOnly=yes",
-         "-oPasswordAuthentication=no",
-         "-oStrictHostKeyChecking=no",
-         "-l", username,
-         hostname,
-         openSSH.DoubleQuote("mkdir -p %s" % quotedRemoteDir)]
-    mkdirCmdString = " ".join(mkdirCmdAndArgs)
-    logger.debug(mkdirCmdString)
-    mkdirProcess = \
-        subprocess.Popen(mkdirCmdString,
-                         shell=openSSH.preferToUseShellInSubprocess,
-                         stdout=subprocess.PIPE,
-                         stderr=subprocess.STDOUT,
-                         startupinfo=defaultStartupInfo,
-                         creationflags=defaultCreationFlags)
-    stdout, _ = mkdirProcess.communicate()
-    if mkdirProcess.returncode != 0:
-        raise SshException(stdout, mkdirProcess.returncode)
-
-    remoteRemoveChunkCommand = \
-        "/bin/rm -f %s" % openSSH.DoubleQuote(remoteChunkPath)
-    rmCommandString = \
-        "%s -i %s -c %s " \
-        "-oControlPath=%s " \
-        "-oIdentitiesOnly=yes -oPasswordAuthentication=no " \
-        "-oStrictHostKeyChecking=no " \
-        "%s@%s %s" \
-        % (openSSH.DoubleQuote(openSSH.ssh),
-           privateKeyFilePath, openSSH.cipher,
-           openSSH.DoubleQuote(sshControlPath),
-           username, hostname,
-           openSSH.DoubleQuote(remoteRemoveChunkCommand))
-    # logger.debug(rmCommandString)
-    removeRemoteChunkProcess = \
-        subprocess.Popen(rmCommandString,
-                         shell=openSSH.preferToUseShellInSubprocess,
-                         stdout=subprocess.PIPE,
-                         stderr=subprocess.STDOUT,
-                         startupinfo=defaultStartupInfo,
-                         creationflags=defaultCreationFlags)
-    stdout, _ = removeRemoteChunkProcess.communicate()
-    if removeRemoteChunkProcess.returncode != 0:
-        raise SshException(stdout, removeRemoteChunkProcess.returncode)
-
-    # defaultChunkSize = 1024*1024  # FIXME: magic number
+    stagingDirectoryCache = \
+        foldersController.GetStagingDirectoryCache(username,
+                                                   privateKeyFilePath,
+                                                   hostname)
+    stagingDirectoryCache.MakeDirectory(remoteDir)
+
+    # The chunk size now only determines how often we read from the
+    # local file and update the progress bar.
     defaultChunkSize = 128 * 1024  # FIXME: magic number
     maxChunkSize = 16 * 1024 * 1024  # FIXME: magic number
     chunkSize = defaultChunkSize
     # FIXME: magic number (approximately 50 progress bar increments)
     while (fileSize / chunkSize) > 50 and chunkSize < maxChunkSize:
         chunkSize = chunkSize * 2
-    skip = 0
-    if 0 < bytesUploaded < fileSize and (bytesUploaded % chunkSize == 0):
+    if 0 < bytesUploaded < fileSize:
         ProgressCallback(None, bytesUploaded, fileSize,
                          message="Performing seek on file, so we can "
                          "resume the upload.")
-        # Using dd command on POSIX systems, so don't need fp.seek
-        skip = bytesUploaded / chunkSize
-        ProgressCallback(None, bytesUploaded, fileSize)
+        redirect = ">>"
     else:
         # Overwrite staging file if it is bigger that local file:
         bytesUploaded = 0
+        redirect = ">"
 
     # FIXME: Handle exception where socket for ssh control path
     # is missing, then we need to create a new master connection.
 
-    while bytesUploaded < fileSize:
-        if foldersController.IsShuttingDown() or uploadModel.Canceled():
-            logger.debug("UploadFileFromPosixSystem 1: Aborting upload for "
-                         "%s" % filePath)
-            return
-
-        # Write chunk to temporary file:
-        chunkFile = tempfile.NamedTemporaryFile(delete=False)
-        chunkFile.close()
-        chunkFilePath = chunkFile.name
-        ddCommandString = \
-            "%s bs=%d skip=%d count=1 if=%s of=%s" \
-            % (openSSH.dd,
-               chunkSize,
-               skip,
-               openSSH.DoubleQuote(filePath),
-               openSSH.DoubleQuote(chunkFilePath))
-        # logger.debug(ddCommandString)
-        ddProcess = subprocess.Popen(
-            ddCommandString,
-            shell=openSSH.preferToUseShellInSubprocess,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            startupinfo=defaultStartupInfo,
-            creationflags=defaultCreationFlags)
-        stdout, _ = ddProcess.communicate()
-        if ddProcess.returncode != 0:
-            raise Exception(stdout,
-                            ddCommandString,
-                            ddProcess.returncode)
-        lines = stdout.splitlines()
-        bytesTransferred = 0
-        for line in lines:
-            match = re.search(r"^(\d+)\s+bytes\s+transferred.*$", line)
-            if match:
-                bytesTransferred = long(match.groups()[0])
-        skip += 1
-
-        scpCommandString = \
-            '%s -i %s -c %s ' \
-            '-oControlPath=%s ' \
-            '-oIdentitiesOnly=yes -oPasswordAuthentication=no ' \
-            '-oStrictHostKeyChecking=no ' \
-            '%s "%s@%s:\\"%s\\""' \
-            % (openSSH.DoubleQuote(openSSH.scp),
-               privateKeyFilePath,
-               openSSH.cipher,
-               openSSH.DoubleQuote(sshControlPath),
-               chunkFilePath,
-               username, hostname,
-               remoteChunkPath)
-        # logger.debug(scpCommandString)
-        scpUploadChunkProcess = subprocess.Popen(
-            scpCommandString,
-            shell=openSSH.preferToUseShellInSubprocess,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            startupinfo=defaultStartupInfo,
-            creationflags=defaultCreationFlags)
-        uploadModel.SetScpUploadProcess(scpUploadChunkProcess)
-        stdout, _ = scpUploadChunkProcess.communicate()
-        if scpUploadChunkProcess.returncode != 0:
-            raise ScpException(stdout,
-                               scpCommandString,
-                               scpUploadChunkProcess.returncode)
-
-        try:
-            os.unlink(chunkFile.name)
-        except:
-            logger.error(traceback.format_exc())
-
-        # Append chunk to remote datafile.
-        # FIXME: Investigate whether using an ampersand to put
-        # remote cat process in the background helps to make things
-        # more robust in the case of an interrupted connection.
-        # On Windows, we might need to escape the ampersand with a
-        # caret (^&)
-
-        if bytesUploaded > 0:
-            redirect = ">>"
-        else:
-            redirect = ">"
-        remoteCatCommand = \
-            "cat %s %s %s" % (openSSH.DoubleQuote(remoteChunkPath),
-                              redirect,
-                              openSSH.DoubleQuote(remoteFilePath))
-        catCommandString = \
-            "%s -i %s -c %s " \
-            "-oControlPath=%s " \
-            "-oIdentitiesOnly=yes -oPasswordAuthentication=no " \
-            "-oStrictHostKeyChecking=no " \
-            "%s@%s %s" \
-            % (openSSH.DoubleQuote(openSSH.ssh), privateKeyFilePath,
-               openSSH.cipher,
-               openSSH.DoubleQuote(sshControlPath),
-               username, hostname,
-               openSSH.DoubleQuote(remoteCatCommand))
-        # logger.debug(catCommandString)
-        appendChunkProcess = subprocess.Popen(
-            catCommandString,
-            shell=openSSH.preferToUseShellInSubprocess,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            startupinfo=defaultStartupInfo,
-            creationflags=defaultCreationFlags)
-        stdout, _ = appendChunkProcess.communicate()
-        if appendChunkProcess.returncode != 0:
-            raise SshException(stdout, appendChunkProcess.returncode)
-
-        bytesUploaded += bytesTransferred
-        ProgressCallback(None, bytesUploaded, fileSize)
-
-        if foldersController.IsShuttingDown() or uploadModel.Canceled():
-            logger.debug("UploadFileFromPosixSystem 2: Aborting upload for "
-                         "%s" % filePath)
-            return
-
-    remoteRemoveChunkCommand = \
-        "/bin/rm -f %s" % openSSH.DoubleQuote(remoteChunkPath)
-    rmCommandString = \
+    remoteCatCommand = \
+        "cat %s %s" % (redirect, openSSH.DoubleQuote(remoteFilePath))
+    catCommandString = \
         "%s -i %s -c %s " \
         "-oControlPath=%s " \
         "-oIdentitiesOnly=yes -oPasswordAuthentication=no " \
         "-oStrictHostKeyChecking=no " \
         "%s@%s %s" \
-        % (openSSH.DoubleQuote(openSSH.ssh),
-           privateKeyFilePath, openSSH.cipher,
+        % (openSSH.DoubleQuote(openSSH.ssh), privateKeyFilePath,
+           openSSH.cipher,
            openSSH.DoubleQuote(sshControlPath),
            username, hostname,
-           openSSH.DoubleQuote(remoteRemoveChunkCommand))
-    # logger.debug(rmCommandString)
-    removeRemoteChunkProcess = \
-        subprocess.Popen(rmCommandString,
-                         shell=openSSH.preferToUseShellInSubprocess,
-                         stdout=subprocess.PIPE,
-                         stderr=subprocess.STDOUT,
-                         startupinfo=defaultStartupInfo,
-                         creationflags=defaultCreationFlags)
-    stdout, _ = removeRemoteChunkProcess.communicate()
-    if removeRemoteChunkProcess.returncode != 0:
-        raise SshException(stdout, removeRemoteChunkProcess.returncode)
+           openSSH.DoubleQuote(remoteCatCommand))
+    logger.debug(catCommandString)
+    appendProcess = subprocess.Popen(
+        catCommandString,
+        shell=openSSH.preferToUseShellInSubprocess,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        startupinfo=defaultStartupInfo,
+        creationflags=defaultCreationFlags)
+    uploadModel.SetScpUploadProcess(appendProcess)
+
+    try:
+        with open(filePath, 'rb') as fp:
+            fp.seek(bytesUploaded)
+            for chunk in iter(lambda: fp.read(chunkSize), b''):
+                if foldersController.IsShuttingDown() or \
+                        uploadModel.Canceled():
+                    logger.debug("UploadFileFromPosixSystem 1: "
+                                 "Aborting upload for %s" % filePath)
+                    appendProcess.stdin.close()
+                    appendProcess.wait()
+                    return
+                foldersController.bandwidthLimiter.Consume(
+                    len(chunk), abortCheck=AbortCheck)
+                appendProcess.stdin.write(chunk)
+                bytesUploaded += len(chunk)
+                ProgressCallback(None, bytesUploaded, fileSize)
+        appendProcess.stdin.close()
+    except IOError:
+        # Most likely a broken pipe, because the SSH connection has been
+        # interrupted.  The caller can retry the upload, but it will
+        # need to check how much has already been uploaded to staging.
+        uploadModel.SetBytesUploadedToStaging(None)
+        stagingDirectoryCache.ForgetDirectory(remoteDir)
+        if appendProcess.poll() is None:
+            appendProcess.terminate()
+        appendProcess.wait()
+        raise
+    stdout = appendProcess.stdout.read()
+    appendProcess.wait()
+    if appendProcess.returncode != 0:
+        uploadModel.SetBytesUploadedToStaging(None)
+        stagingDirectoryCache.ForgetDirectory(remoteDir)
+        raise SshException(stdout, appendProcess.returncode)
+
+    if foldersController.IsShuttingDown() or uploadModel.Canceled():
+        logger.debug("UploadFileFromPosixSystem 2: Aborting upload for "
+                     "%s" % filePath)
+        return
 
 
 def UploadSmallFileFromWindows(filePath, fileSize, username,
@@ -821,6 +891,10 @@ def UploadSmallFileFromWindows(filePath, fileSize, username,
     The CAT method provides progress updates, but the SCP method doesn't.
     See class SmallFileUploadMethod
     """
+
+    def AbortCheck():
+        return foldersController.IsShuttingDown() or uploadModel.Canceled()
+
     remoteRemoveDatafileCommand = \
         "/bin/rm -f %s" % openSSH.DoubleQuote(remoteFilePath)
     rmCommandString = \
@@ -846,32 +920,19 @@ def UploadSmallFileFromWindows(filePath, fileSize, username,
     bytesUploaded = 0
 
     remoteDir = os.path.dirname(remoteFilePath)
-    quotedRemoteDir = openSSH.DoubleQuote(remoteDir)
-    mkdirCmdAndArgs = \
-        [openSSH.DoubleQuote(openSSH.ssh),
-         "-n",
-         "-c", openSSH.cipher,
-         "-i", openSSH.DoubleQuote(privateKeyFilePath),
-         "-oIdentitiesOnly=yes",
-         "-oPasswordAuthentication=no",
-         "-oStrictHostKeyChecking=no",
-         "-l", username,
-         hostname,
-         openSSH.DoubleQuote("mkdir -p %s" % quotedRemoteDir)]
-    mkdirCmdString = " ".join(mkdirCmdAndArgs)
-    logger.debug(mkdirCmdString)
-    mkdirProcess = \
-        subprocess.Popen(mkdirCmdString,
-                         shell=openSSH.preferToUseShellInSubprocess,
-                         stdout=subprocess.PIPE,
-                         stderr=subprocess.STDOUT,
-                         startupinfo=defaultStartupInfo,
-                         creationflags=defaultCreationFlags)
-    stdout, _ = mkdirProcess.communicate()
-    if mkdirProcess.returncode != 0:
-        raise SshException(stdout, mkdirProcess.returncode)
+    stagingDirectoryCache = \
+        foldersController.GetStagingDirectoryCache(username,
+                                                   privateKeyFilePath,
+                                                   hostname)
+    stagingDirectoryCache.MakeDirectory(remoteDir)
 
     if uploadMethod == SmallFileUploadMethod.SCP:
+        # scp sends the whole file at once, so we wait for the whole
+        # file's bandwidth allowance before starting.
+        foldersController.bandwidthLimiter.Consume(
+            fileSize, abortCheck=AbortCheck)
+        if AbortCheck():
+            return
         scpCommandString = \
             '%s -i %s -c %s ' \
             '-oPasswordAuthentication=no -oStrictHostKeyChecking=no ' \
@@ -931,6 +992,8 @@ def UploadSmallFileFromWindows(filePath, fileSize, username,
                 logger.debug("UploadSmallFileFromWindows 1: "
                              "Aborting upload for %s" % filePath)
                 return
+            foldersController.bandwidthLimiter.Consume(
+                len(chunk), abortCheck=AbortCheck)
             # Append chunk to remote datafile.
             appendChunkProcess.stdin.write(chunk)
 
@@ -967,33 +1030,19 @@ def UploadLargeFileFromWindows(filePath, fileSize, username,
     and then append the chunk onto the remote (partial) datafile.
     """
 
+    def AbortCheck():
+        return foldersController.IsShuttingDown() or uploadModel.Canceled()
+
     remoteDir = os.path.dirname(remoteFilePath)
-    quotedRemoteDir = openSSH.DoubleQuote(remoteDir)
-    mkdirCmdAndArgs = \
-        [openSSH.DoubleQuote(openSSH.ssh),
-         "-n",
-         "-c", openSSH.cipher,
-         "-i", openSSH.DoubleQuote(privateKeyFilePath),
-         "-oIdentitiesOnly=yes",
-         "-oPasswordAuthentication=no",
-         "-oStrictHostKeyChecking=no",
-         "-l", username,
-         hostname,
-         openSSH.DoubleQuote("mkdir -p %s" % quotedRemoteDir)]
-    mkdirCmdString = " ".join(mkdirCmdAndArgs)
-    logger.debug(mkdirCmdString)
-    mkdirProcess = \
-        subprocess.Popen(mkdirCmdString,
-                         shell=openSSH.preferToUseShellInSubprocess,
-                         stdout=subprocess.PIPE,
-                         stderr=subprocess.STDOUT,
-                         startupinfo=defaultStartupInfo,
-                         creationflags=defaultCreationFlags)
-    stdout, _ = mkdirProcess.communicate()
-    if mkdirProcess.returncode != 0:
-        raise SshException(stdout, mkdirProcess.returncode)
+    stagingDirectoryCache = \
+        foldersController.GetStagingDirectoryCache(username,
+                                                   privateKeyFilePath,
+                                                   hostname)
+    stagingDirectoryCache.MakeDirectory(remoteDir)
 
     remoteChunkPath = remoteFilePath + ".chunk"
+    # The chunk file is removed at the end of the upload run.
+    stagingDirectoryCache.AddChunkFile(remoteChunkPath)
 
     # logger.warning("Assuming that the remote shell is Bash.")
 
@@ -1037,6 +1086,10 @@ def UploadLargeFileFromWindows(filePath, fileSize, username,
                     count *= 2
                 for i in range(count):
                     smallChunk = datafile.read(smallChunkSize)
+                    # Each chunk is sent at once by scp, so its
+                    # bandwidth allowance is used while it's extracted.
+                    foldersController.bandwidthLimiter.Consume(
+                        len(smallChunk), abortCheck=AbortCheck)
                     chunkFile.write(smallChunk)
                     bytesTransferred += len(smallChunk)
                     del smallChunk
@@ -1221,7 +1274,8 @@ class SshControlMasterPool():
     use larger chunk sizes (see UploadLargeFileFromWindows).
     """
 
-    def __init__(self, username, privateKeyFilePath, hostname):
+    def __init__(self, username, privateKeyFilePath, hostname,
+                 maxConnections=5):
         if sys.platform.startswith("win"):
             raise NotImplementedError("-oControlMaster is not implemented "
                                       "in MinGW or Cygwin builds of OpenSSH.")
@@ -1230,10 +1284,18 @@ class SshControlMasterPool():
         self.hostname = hostname
         # self.maxConnections should be less than
         # MaxSessions in staging server's sshd_config
-        self.maxConnections = 5
+        self.maxConnections = maxConnections
         self.sshControlMasterProcesses = []
         self.timeout = 1
 
+    def SetMaxConnections(self, maxConnections):
+        """
+        Existing connections beyond the new maximum are left running
+        (and can still be used), but no new connections are made until
+        there are fewer than maxConnections.
+        """
+        self.maxConnections = maxConnections
+
     def GetSshControlMasterProcess(self):
         for sshControlMasterProcess in self.sshControlMasterProcesses:
             if sshControlMasterProcess.Check():
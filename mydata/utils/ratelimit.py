@@ -0,0 +1,107 @@
+"""
+mydata/utils/ratelimit.py
+
+The purpose of this module is to allow MyData to share a network link
+with other software (e.g. instrument acquisition software), by capping
+the total rate at which MyData uploads data, rather than only running
+MyData outside of working hours.
+
+BandwidthLimiter is a token bucket, shared by all of the upload worker
+threads and all of the upload methods (streaming to staging over SSH,
+SCP and HTTP POST).  Before sending a block of data, an upload calls
+Consume with the size of the block, which returns once the block can be
+sent without exceeding the current maximum rate.  Optionally, reading
+data files to calculate their MD5 checksums can be limited too (see
+ConsumeDiskRead).
+
+The maximum rate depends on the time of day: one rate applies between
+the timer's "from" and "to" times in MyData's settings (e.g. 20 MB/s
+from 7:00 AM to 7:00 PM), and another rate applies outside of that
+window (e.g. unlimited overnight).  A rate of 0 means unlimited.
+"""
+import threading
+import time
+from datetime import datetime
+
+
+class BandwidthLimiter():
+    def __init__(self, settingsModel):
+        self.timerFromTime = settingsModel.GetTimerFromTime()
+        self.timerToTime = settingsModel.GetTimerToTime()
+        self.rateInTimerWindow = \
+            settingsModel.GetMaxUploadRateInTimerWindow() * 1024 * 1024
+        self.rateOutsideTimerWindow = \
+            settingsModel.GetMaxUploadRateOutsideTimerWindow() * 1024 * 1024
+        self.limitDiskReads = settingsModel.LimitChecksumReadRate()
+
+        self.lock = threading.Lock()
+        self.rate = None
+        self.rateCheckedTime = 0
+        self.tokens = 0.0
+        self.lastRefillTime = time.time()
+        self.UpdateRate()
+
+    def IsWithinTimerWindow(self, now=None):
+        if now is None:
+            now = datetime.time(datetime.now())
+        # The timer's times are only precise to the minute, so e.g.
+        # 11:59:30 PM is within a window ending at 11:59 PM.
+        now = now.replace(second=0, microsecond=0)
+        if self.timerFromTime <= self.timerToTime:
+            return self.timerFromTime <= now <= self.timerToTime
+        # The window spans midnight, e.g. 7:00 PM to 7:00 AM.
+        return now >= self.timerFromTime or now <= self.timerToTime
+
+    def GetRate(self):
+        """
+        Returns the current maximum rate in bytes per second, or 0 if the
+        rate is unlimited.
+        """
+        if self.IsWithinTimerWindow():
+            return self.rateInTimerWindow
+        return self.rateOutsideTimerWindow
+
+    def UpdateRate(self):
+        """
+        Should be called with self.lock acquired (except from __init__).
+        The bucket holds up to one second's worth of tokens, so uploads
+        can't burst far above the maximum rate.
+        """
+        rate = self.GetRate()
+        if rate != self.rate:
+            self.rate = rate
+            self.tokens = min(self.tokens, float(rate))
+        self.rateCheckedTime = time.time()
+
+    def Consume(self, numBytes, abortCheck=None):
+        """
+        Waits until numBytes can be sent without exceeding the current
+        maximum rate.  Blocks larger than the bucket are allowed, by
+        letting the bucket go into debt, which the next uploads must wait
+        for.  If abortCheck is provided, it is called while waiting, and
+        Consume returns early if it returns True.
+        """
+        with self.lock:
+            now = time.time()
+            if now - self.rateCheckedTime >= 1:
+                self.UpdateRate()
+            if self.rate <= 0:
+                return
+            self.tokens = min(float(self.rate),
+                              self.tokens +
+                              (now - self.lastRefillTime) * self.rate)
+            self.lastRefillTime = now
+            self.tokens -= numBytes
+            wait = 0
+            if self.tokens < 0:
+                wait = -self.tokens / self.rate
+        while wait > 0:
+            if abortCheck and abortCheck():
+                return
+            interval = min(wait, 0.5)  # FIXME: magic number
+            time.sleep(interval)
+            wait -= interval
+
+    def ConsumeDiskRead(self, numBytes, abortCheck=None):
+        if self.limitDiskReads:
+            self.Consume(numBytes, abortCheck)
@@ -0,0 +1,93 @@
+"""
+mydata/utils/retry.py
+
+The purpose of this module is to retry uploads which failed because of a
+transient error (e.g. a connection reset, a 5xx response from MyTardis
+or an SCP error), rather than leaving them failed until the next time
+the data directory is scanned.
+
+RetryQueue holds failed upload tasks until they are due to be retried,
+separately from the uploads queues, so that a flapping server doesn't
+hold up new uploads.  A single thread waits for the next task to become
+due, and then hands it to putTask (e.g. FoldersController.RequeueUpload)
+to be queued for an upload worker again.
+
+The delay before each retry grows exponentially with the number of
+attempts so far, up to maxDelay, with random jitter, so that uploads
+which failed at the same time don't all retry at the same time.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+import traceback
+
+from mydata.logs import logger
+
+
+class RetryQueue():
+    def __init__(self, putTask, baseDelay, maxDelay=600):
+        """
+        baseDelay and maxDelay are in seconds.
+        """
+        self.putTask = putTask
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.heap = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.Run,
+                                       name="UploadRetryThread")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def GetDelay(self, attempt):
+        """
+        Returns a delay between half and all of baseDelay * 2^attempt
+        (or maxDelay, if that's smaller).
+        """
+        delay = min(self.maxDelay, self.baseDelay * 2 ** attempt)
+        return delay / 2.0 + random.uniform(0, delay / 2.0)
+
+    def Put(self, task, delay):
+        with self.condition:
+            heapq.heappush(self.heap,
+                           (time.time() + delay, self.sequence.next(), task))
+            self.condition.notify()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def Run(self):
+        while True:
+            dueTasks = []
+            with self.condition:
+                while not self.stopped:
+                    now = time.time()
+                    if len(self.heap) > 0 and self.heap[0][0] <= now:
+                        break
+                    if len(self.heap) > 0:
+                        self.condition.wait(self.heap[0][0] - now)
+                    else:
+                        self.condition.wait()
+                if self.stopped:
+                    return
+                while len(self.heap) > 0 and self.heap[0][0] <= time.time():
+                    dueTasks.append(heapq.heappop(self.heap)[2])
+            for task in dueTasks:
+                try:
+                    self.putTask(task)
+                except:
+                    logger.error(traceback.format_exc())
+
+    def Stop(self):
+        """
+        Tasks which are still waiting to be retried are discarded.
+        """
+        with self.condition:
+            self.stopped = True
+            self.heap = []
+            self.condition.notifyAll()
+        self.thread.join()
@@ -0,0 +1,186 @@
+"""
+mydata/utils/scheduler.py
+
+The purpose of this module is to allow the order in which data files are
+verified and uploaded to be chosen in MyData's settings, rather than
+always processing data files in the order in which the folders were
+scanned.  With a plain FIFO queue, one folder containing a few very large
+data files can hold back every small data file queued after it.
+
+PriorityTaskQueue is a drop-in replacement for Queue.Queue, holding
+VerifyDatafileRunnable or UploadDatafileRunnable tasks (anything with
+folderModel and dataFileIndex attributes), which returns tasks according
+to one of the policies in SchedulingPolicy:
+
+FIFO - the order in which tasks were queued (MyData's original behaviour).
+Smallest First - the task with the smallest data file.
+Oldest First - the task with the oldest data file modified time.
+Round Robin Across Owners - one task from each dataset owner in turn.
+Fair Share Per User Folder - the user (or group) folder which has been
+    given the fewest bytes so far (divided by its weight), so that a user
+    folder with a large backlog can't take all of the upload workers.
+
+None (used by FoldersController to shut down worker threads) is always
+returned after any tasks which are still queued, as it would be with a
+FIFO queue.
+"""
+import collections
+import heapq
+import itertools
+import Queue
+
+from mydata.logs import logger
+
+
+class SchedulingPolicy():
+    FIFO = "FIFO"
+    SMALLEST_FIRST = "Smallest First"
+    OLDEST_FIRST = "Oldest First"
+    OWNER_ROUND_ROBIN = "Round Robin Across Owners"
+    USER_FOLDER_FAIR_SHARE = "Fair Share Per User Folder"
+
+    POLICIES = [FIFO, SMALLEST_FIRST, OLDEST_FIRST, OWNER_ROUND_ROBIN,
+                USER_FOLDER_FAIR_SHARE]
+
+
+def ParseWeights(weightsString):
+    """
+    Parses a string like "alice: 2, bob: 0.5" into a dictionary of
+    weights, keyed by user (or group) folder name.
+    """
+    weights = {}
+    for item in weightsString.split(","):
+        if item.strip() == "":
+            continue
+        try:
+            name, weight = item.rsplit(":", 1)
+            weight = float(weight)
+            if weight <= 0:
+                raise ValueError("Weight must be positive.")
+            weights[name.strip()] = weight
+        except ValueError:
+            logger.warning("Ignoring invalid scheduling weight: %s"
+                           % item.strip())
+    return weights
+
+
+def GetOwnerName(folderModel):
+    owner = folderModel.GetOwner()
+    if owner is not None:
+        return owner.GetUsername()
+    return folderModel.GetGroupFolderName()
+
+
+def GetUserFolderName(folderModel):
+    if folderModel.GetUserFolderName() is not None:
+        return folderModel.GetUserFolderName()
+    return folderModel.GetGroupFolderName()
+
+
+class PriorityTaskQueue(Queue.Queue):
+    """
+    Queue.Queue calls _init, _qsize, _put and _get with its mutex
+    acquired, so they don't need any locking of their own.
+    """
+    def __init__(self, policy=SchedulingPolicy.FIFO, weights=None,
+                 maxsize=0):
+        if policy not in SchedulingPolicy.POLICIES:
+            logger.warning("Unknown scheduling policy \"%s\", using %s."
+                           % (policy, SchedulingPolicy.FIFO))
+            policy = SchedulingPolicy.FIFO
+        self.policy = policy
+        self.weights = weights or {}
+        Queue.Queue.__init__(self, maxsize)
+
+    def GetPolicy(self):
+        return self.policy
+
+    def _init(self, maxsize):
+        self.sequence = itertools.count()
+        self.numTasks = 0
+        self.sentinels = collections.deque()
+        # Used by FIFO, Smallest First and Oldest First:
+        self.heap = []
+        # Used by Round Robin Across Owners and Fair Share Per User
+        # Folder, which keep a FIFO queue of tasks for each group:
+        self.groupTasks = {}
+        self.activeGroups = collections.deque()
+        self.bytesServed = {}
+        self.virtualTime = 0.0
+
+    def _qsize(self, len=len):
+        return self.numTasks + len(self.sentinels)
+
+    def _put(self, task):
+        if task is None:
+            self.sentinels.append(task)
+            return
+        self.numTasks += 1
+        folderModel = task.folderModel
+        dataFileIndex = task.dataFileIndex
+        if self.policy == SchedulingPolicy.OWNER_ROUND_ROBIN:
+            self.PutInGroup(GetOwnerName(folderModel), task)
+        elif self.policy == SchedulingPolicy.USER_FOLDER_FAIR_SHARE:
+            self.PutInGroup(GetUserFolderName(folderModel), task)
+        else:
+            if self.policy == SchedulingPolicy.SMALLEST_FIRST:
+                key = folderModel.GetDataFileSize(dataFileIndex)
+            elif self.policy == SchedulingPolicy.OLDEST_FIRST:
+                key = folderModel.GetDataFileModifiedTime(dataFileIndex)
+            else:
+                key = 0
+            heapq.heappush(self.heap, (key, self.sequence.next(), task))
+
+    def _get(self):
+        if self.numTasks == 0:
+            return self.sentinels.popleft()
+        self.numTasks -= 1
+        if self.policy == SchedulingPolicy.OWNER_ROUND_ROBIN:
+            group = self.activeGroups.popleft()
+            task = self.groupTasks[group].popleft()
+            if len(self.groupTasks[group]) > 0:
+                self.activeGroups.append(group)
+            else:
+                del self.groupTasks[group]
+            return task
+        elif self.policy == SchedulingPolicy.USER_FOLDER_FAIR_SHARE:
+            group = min(self.activeGroups,
+                        key=lambda group: self.bytesServed[group])
+            task = self.groupTasks[group].popleft()
+            if len(self.groupTasks[group]) == 0:
+                del self.groupTasks[group]
+                self.activeGroups.remove(group)
+            self.virtualTime = self.bytesServed[group]
+            # Count at least one byte for empty files, so that a user
+            # folder with many empty files still takes its turn.
+            size = max(1, task.folderModel.GetDataFileSize(
+                task.dataFileIndex))
+            self.bytesServed[group] += \
+                float(size) / self.weights.get(group, 1.0)
+            return task
+        else:
+            return heapq.heappop(self.heap)[2]
+
+    def GetTaskNoWait(self):
+        """
+        Returns the next task without waiting, or None if there are no
+        tasks (not counting sentinels) in the queue.  This allows a worker
+        to take tasks from another worker pool's queue when its own queue
+        is empty, without taking a sentinel intended for that pool.
+        """
+        with self.mutex:
+            if self.numTasks == 0:
+                return None
+            task = self._get()
+            self.not_full.notify()
+            return task
+
+    def PutInGroup(self, group, task):
+        if group not in self.groupTasks:
+            self.groupTasks[group] = collections.deque()
+            self.activeGroups.append(group)
+            # A user folder which has been idle doesn't get to catch up
+            # on the bytes it wasn't given while it had nothing queued.
+            self.bytesServed[group] = \
+                max(self.bytesServed.get(group, 0.0), self.virtualTime)
+        self.groupTasks[group].append(task)
@@ -0,0 +1,198 @@
+"""
+mydata/utils/watcher.py
+
+The purpose of this module is to provide an event-driven alternative to
+re-scanning the whole data directory every time MyData looks for new
+data.  When the "watch_data_directory" setting is enabled, MyData keeps
+its upload and verification worker threads running after the initial
+scan, and uses inotify (via pyinotify) to find out about data files as
+soon as they have been written into (or moved into) the data directory.
+
+New data files in known dataset folders are added to the existing
+FolderModel and queued for verification, once they haven't been modified
+for settleTime seconds (because UploadDatafileRunnable.Prepare won't
+upload a data file which was modified more recently than that, in case it
+is still being written).  Data files which are still being modified are
+simply checked again later, without holding up any uploads.  New dataset folders are
+imported following the same folder structure rules as
+FoldersModel.ScanForUserFolders and FoldersModel.ScanForGroupFolders.
+
+pyinotify is only available on Linux.  On other platforms (or if
+pyinotify isn't installed), MyData falls back to its usual scheduled
+scans.
+"""
+import os
+import threading
+import time
+import Queue
+import traceback
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+from mydata.logs import logger
+
+
+class DataDirectoryWatcher():
+    def __init__(self, settingsModel, foldersModel, foldersController):
+        self.settingsModel = settingsModel
+        self.foldersModel = foldersModel
+        self.foldersController = foldersController
+        self.watchManager = None
+        self.notifier = None
+        self.mask = None
+        # Paths reported by inotify are processed by a separate thread,
+        # so that MyTardis lookups don't hold up the notifier thread,
+        # which could otherwise allow the kernel's event queue to
+        # overflow.
+        self.pathsQueue = Queue.Queue()
+        self.processPathsThread = None
+        self.running = threading.Event()
+        # Data files waiting until they haven't been modified for
+        # settleTime seconds, keyed by path, with the time at which to
+        # check them again.  Only used by the processPathsThread.
+        self.pendingDataFiles = {}
+        self.settleTime = 30  # FIXME: magic number (seconds)
+
+    @staticmethod
+    def IsSupported():
+        return pyinotify is not None
+
+    def IsRunning(self):
+        return self.running.isSet()
+
+    def Start(self):
+        dataDir = self.settingsModel.GetDataDirectory()
+        logger.info("Watching %s for new data files." % dataDir)
+        self.watchManager = pyinotify.WatchManager()
+        self.mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO | \
+            pyinotify.IN_CREATE
+        self.notifier = \
+            pyinotify.ThreadedNotifier(self.watchManager,
+                                       default_proc_fun=self.OnEvent)
+        self.notifier.name = "DataDirectoryWatcherNotifierThread"
+        self.notifier.daemon = True
+        self.watchManager.add_watch(dataDir, self.mask, rec=True,
+                                    auto_add=True)
+        self.running.set()
+        self.processPathsThread = \
+            threading.Thread(target=self.ProcessPaths,
+                             name="DataDirectoryWatcherThread")
+        self.processPathsThread.daemon = True
+        self.processPathsThread.start()
+        self.notifier.start()
+
+    def Stop(self):
+        if not self.IsRunning():
+            return
+        logger.info("Stopping data directory watcher.")
+        self.running.clear()
+        self.notifier.stop()
+        self.pathsQueue.put(None)
+        self.processPathsThread.join()
+
+    def OnEvent(self, event):
+        """
+        Called from pyinotify's notifier thread.
+        """
+        if event.mask & pyinotify.IN_Q_OVERFLOW:
+            logger.warning("Some data directory events were lost, because "
+                           "the inotify event queue overflowed.  Refresh "
+                           "MyData to scan the whole data directory.")
+            return
+        if event.dir:
+            # Files may have been written into a new directory before
+            # its watch was added, so the directory is scanned too.
+            if event.mask & (pyinotify.IN_CREATE | pyinotify.IN_MOVED_TO):
+                self.pathsQueue.put(event.pathname)
+        elif event.mask & (pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO):
+            self.pathsQueue.put(event.pathname)
+
+    def ProcessPaths(self):
+        while True:
+            timeout = None
+            if self.pendingDataFiles:
+                timeout = max(0, min(self.pendingDataFiles.values()) -
+                              time.time())
+            try:
+                path = self.pathsQueue.get(True, timeout)
+            except Queue.Empty:
+                self.ProcessPendingDataFiles()
+                continue
+            if path is None or not self.IsRunning():
+                return
+            try:
+                if os.path.isdir(path):
+                    # pyinotify's auto_add only covers newly created
+                    # directories, not directories moved in from
+                    # elsewhere.
+                    self.watchManager.add_watch(path, self.mask, rec=True,
+                                                auto_add=True)
+                    for dirPath, _, fileNames in os.walk(path):
+                        for fileName in sorted(fileNames):
+                            self.pendingDataFiles[
+                                os.path.join(dirPath, fileName)] = 0
+                else:
+                    self.pendingDataFiles[path] = 0
+            except:
+                logger.error(traceback.format_exc())
+            self.ProcessPendingDataFiles()
+
+    def ProcessPendingDataFiles(self):
+        """
+        Processes the pending data files which are due to be checked, if
+        they haven't been modified for settleTime seconds.  Otherwise,
+        they are checked again settleTime seconds after they were last
+        modified.  Data files which no longer exist are forgotten.
+        """
+        now = time.time()
+        for path, checkTime in self.pendingDataFiles.items():
+            if checkTime > now or not self.IsRunning():
+                continue
+            del self.pendingDataFiles[path]
+            try:
+                modifiedTime = os.path.getmtime(path)
+            except OSError:
+                continue
+            if now - modifiedTime <= self.settleTime:
+                self.pendingDataFiles[path] = \
+                    modifiedTime + self.settleTime + 1
+                continue
+            try:
+                self.ProcessDataFile(path)
+            except:
+                logger.error(traceback.format_exc())
+
+    def ProcessDataFile(self, dataFilePath):
+        if not os.path.isfile(dataFilePath) or not self.IsRunning():
+            return
+        folderModel = self.foldersModel.GetFolderModelForPath(dataFilePath)
+        if folderModel is None:
+            folderModel = \
+                self.foldersModel.ImportDatasetFolderForPath(dataFilePath)
+            if folderModel is None:
+                logger.debug("Ignoring %s, because it isn't in a dataset "
+                             "folder." % dataFilePath)
+                return
+            # The new FolderModel has scanned its own data files, so
+            # they can be verified together.
+            self.foldersController.StartUploadsForFolder(folderModel)
+            return
+        dataFileIndex = folderModel.GetDataFileIndex(dataFilePath)
+        if dataFileIndex is not None:
+            # Avoid re-verifying files which haven't changed, e.g. files
+            # which were opened for writing but not modified, or which
+            # were already picked up while scanning a new directory.
+            statResult = os.stat(dataFilePath)
+            if statResult.st_size == \
+                    folderModel.GetDataFileSize(dataFileIndex) and \
+                    statResult.st_mtime == \
+                    folderModel.GetDataFileModifiedTime(dataFileIndex) and \
+                    statResult.st_ino == \
+                    folderModel.GetDataFileInode(dataFileIndex):
+                return
+        logger.debug("Found new or modified data file: " + dataFilePath)
+        dataFileIndex = folderModel.AddDataFile(dataFilePath)
+        self.foldersController.VerifyDatafile(folderModel, dataFileIndex)
@@ -58,7 +58,7 @@ for icon_files_path in ("media/Aha-Soft/png-normal/icons16x16",
             resourceFile = (icon_files_path, [icon_file_path])
             resourceFiles.append(resourceFile)
 
-install_requires = ['wxPython', 'appdirs', 'lxml', 'poster', 'psutil',
+install_requires = ['wxPython', 'appdirs', 'lxml', 'psutil',
                     'requests', 'validate_email']
 
 if sys.platform.startswith("darwin"):